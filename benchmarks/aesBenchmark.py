@@ -0,0 +1,39 @@
+"""
+aesBenchmark.py
+====================================
+
+Compare the AES-256-CTR cipher backends on bulk keystore encryption.
+Run from the repository root with: python -m benchmarks.aesBenchmark [numKeys]
+
+"""
+import sys
+import time
+from Crypto.Random import get_random_bytes
+
+from brambl.utils import CrypTools
+
+
+def run(numKeys=10000):
+    keys = [(get_random_bytes(32), get_random_bytes(32), int.from_bytes(get_random_bytes(16), 'big')) for i in range(numKeys)]
+    outputs = {}
+    timings = {}
+    for name in sorted(CrypTools.cipherBackends):
+        backend = CrypTools.getCipherBackend(name)
+        start = time.perf_counter()
+        outputs[name] = [backend.encrypt(privateKey, derivedKey, iv) for privateKey, derivedKey, iv in keys]
+        timings[name] = time.perf_counter() - start
+    # every backend must produce the same keystore ciphertexts
+    reference = next(iter(outputs.values()))
+    for name, ciphertexts in outputs.items():
+        if ciphertexts != reference:
+            raise Exception('Cipher backend ' + name + ' produced a different ciphertext')
+    return timings
+
+
+if __name__ == '__main__':
+    numKeys = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    timings = run(numKeys)
+    for name, seconds in timings.items():
+        print('%-8s %8d keystores in %7.3fs  %10.0f keystores/s' % (name, numKeys, seconds, numKeys / seconds))
+    if 'native' in timings and 'pyaes' in timings:
+        print('native speedup: %.1fx' % (timings['pyaes'] / timings['native']))
@@ -0,0 +1,44 @@
+"""
+base58Benchmark.py
+====================================
+
+Compare the internal base58 codec with the `base58` package on keys (32 bytes) and signatures (64 bytes).
+Run from the repository root with: python -m benchmarks.base58Benchmark [numValues]
+
+"""
+import os
+import sys
+import time
+import base58
+
+from brambl.utils import Base58
+
+
+def timed(function, values):
+    start = time.perf_counter()
+    result = function(values)
+    return result, time.perf_counter() - start
+
+
+def run(numValues=100000):
+    timings = {}
+    for size in (32, 64):
+        values = [os.urandom(size) for i in range(numValues)]
+        reference, timings['package encode %d' % size] = timed(lambda vs: [base58.b58encode(v) for v in vs], values)
+        encoded, timings['Base58 encode %d' % size] = timed(Base58.encodeMany, values)
+        referenceDecoded, timings['package decode %d' % size] = timed(lambda vs: [base58.b58decode(v) for v in vs], reference)
+        decoded, timings['Base58 decode %d' % size] = timed(Base58.decodeMany, encoded)
+        # the codec must be byte for byte compatible with the package
+        if encoded != reference or decoded != values or referenceDecoded != values:
+            raise Exception('Base58 output differs from the base58 package')
+    return timings
+
+
+if __name__ == '__main__':
+    numValues = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    timings = run(numValues)
+    for name, seconds in timings.items():
+        print('%-18s %8d values in %7.3fs  %10.0f values/s' % (name, numValues, seconds, numValues / seconds))
+    for size in (32, 64):
+        for operation in ('encode', 'decode'):
+            print('%s %d speedup: %.1fx' % (operation, size, timings['package %s %d' % (operation, size)] / timings['Base58 %s %d' % (operation, size)]))
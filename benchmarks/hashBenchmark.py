@@ -0,0 +1,41 @@
+"""
+hashBenchmark.py
+====================================
+
+Compare hashing many short messages one call at a time with `Hash.string` against one `Hash.strings` call.
+Run from the repository root with: python -m benchmarks.hashBenchmark [numMessages]
+
+"""
+import os
+import sys
+import time
+
+from brambl.utils import Hash
+
+
+def run(numMessages=200000, encodings=('hex', 'base64', 'base58')):
+    messages = [os.urandom(12).hex() for i in range(numMessages)]
+    timings = {}
+    for encoding in encodings:
+        start = time.perf_counter()
+        single = [Hash.string(message, encoding) for message in messages]
+        timings[encoding + ' string'] = time.perf_counter() - start
+        start = time.perf_counter()
+        batch = Hash.strings(messages, encoding)
+        timings[encoding + ' strings'] = time.perf_counter() - start
+        # both paths must produce the same digests
+        if batch != single:
+            raise Exception('Hash.strings produced a different digest with the ' + encoding + ' encoding')
+    start = time.perf_counter()
+    Hash.strings(messages, 'raw')
+    timings['raw strings'] = time.perf_counter() - start
+    return timings
+
+
+if __name__ == '__main__':
+    numMessages = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    timings = run(numMessages)
+    for name, seconds in timings.items():
+        print('%-16s %8d messages in %7.3fs  %10.0f messages/s' % (name, numMessages, seconds, numMessages / seconds))
+    for encoding in ('hex', 'base64', 'base58'):
+        print('%-6s speedup: %.1fx' % (encoding, timings[encoding + ' string'] / timings[encoding + ' strings']))
@@ -0,0 +1,304 @@
+"""
+microBenchmarks.py
+====================================
+
+Benchmark suite for the crypto, hashing and encoding hot paths: key derivation, keystore encryption,
+MACs, signing and verification, `addSigToTx`, `Hash.string`/`Hash.file` and base58 encoding.
+
+Every benchmark reports the best time per operation over several repeats. Times are also given relative
+to a pure Python calibration loop run on the same machine, and a baseline is compared on those relative
+times, so a baseline recorded on one machine remains meaningful on another.
+
+Run from the repository root with:
+    python -m benchmarks.microBenchmarks [--profile ci|full] [--only NAME] [--output results.json]
+                                         [--baseline benchmarks/baseline.json] [--tolerance 0.5] [--save-baseline]
+
+The 'ci' profile runs in seconds with a reduced scrypt cost, the 'full' profile uses the Bifrost key
+derivation parameters and larger files and batches. The exit status is 1 if a benchmark regressed by
+more than the tolerance against the baseline.
+
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from brambl import Brambl
+from brambl.modules import KeyManager
+from brambl.utils import Base58
+from brambl.utils import CrypTools
+from brambl.utils import Hash
+
+baselinePath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+profiles = {
+    'ci': {
+        'repeat': 5,
+        'minTime': 0.05,
+        'scryptN': 2 ** 14,
+        'batch': 100,
+        'fileSizes': [1024, 1024 ** 2],
+        'messages': 1000
+    },
+    'full': {
+        'repeat': 7,
+        'minTime': 0.5,
+        'scryptN': 2 ** 18,
+        'batch': 1000,
+        'fileSizes': [1024, 1024 ** 2, 64 * 1024 ** 2],
+        'messages': 100000
+    }
+}
+
+
+def sizeLabel(size):
+    for unit, scale in (('MB', 1024 ** 2), ('KB', 1024)):
+        if size >= scale:
+            return '%d%s' % (size // scale, unit)
+    return '%dB' % size
+
+
+def measure(function, items, repeat, minTime):
+    """
+    Time a function, calling it as many times per repeat as needed to run for at least minTime
+
+    :param function: function to time, called without arguments
+    :param items: number of operations made by one call
+    :param repeat: number of repeats
+    :param minTime: minimum duration (in seconds) of a repeat
+    :type function: function
+    :type items: number
+    :type repeat: number
+    :type minTime: number
+    :return: best and median seconds per operation
+    :rtype: tuple
+
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= minTime:
+            break
+        number = max(number * 2, int(number * minTime / max(elapsed, 1e-9) * 1.2))
+    timings = [elapsed / number]
+    for i in range(repeat - 1):
+        start = time.perf_counter()
+        for j in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    timings.sort()
+    return timings[0] / items, timings[len(timings) // 2] / items
+
+
+def calibrate(repeat = 3, minTime = 0.01):
+    # seconds taken by a fixed pure Python workload, used to normalize timings between machines
+    def workload():
+        table = {}
+        for i in range(20000):
+            table[i % 997] = table.get(i % 997, 0) + i * 3
+        return sum(table.values())
+    return measure(workload, 1, repeat, minTime)[0]
+
+
+def makeKey(password, constants, directory):
+    # create a keyfile with the given scrypt parameters and open it
+    keyStorage = KeyManager.generateKeyStorage(password, constants)
+    path = KeyManager.writeKeyStorage(keyStorage, directory)
+    return KeyManager.KeyManager(password, {'keyPath': path, 'constants': constants})
+
+
+def makePrototype(key, numBoxes = 4):
+    # prototype transaction shaped like a Bifrost 'transferAssetsPrototype' response
+    publicKey = key.pk.decode('utf-8') if isinstance(key.pk, bytes) else key.pk
+    rawTx = {
+        'txType': 'AssetTransfer',
+        'txHash': Base58.encode(os.urandom(32)).decode('utf-8'),
+        'timestamp': int(time.time() * 1000),
+        'fee': '0',
+        'data': 'benchmark transfer',
+        'from': [[publicKey, str(i)] for i in range(numBoxes)],
+        'to': [[publicKey, '10'] for i in range(numBoxes)],
+        'signatures': {},
+        'newBoxes': [Base58.encode(os.urandom(32)).decode('utf-8') for i in range(numBoxes)],
+        'boxesToRemove': [Base58.encode(os.urandom(32)).decode('utf-8') for i in range(numBoxes)],
+        'minting': False
+    }
+    messageToSign = Base58.encode(os.urandom(64 + 32 * numBoxes)).decode('utf-8')
+    return json.dumps({'jsonrpc': '2.0', 'id': '1', 'result': {'formattedTx': rawTx, 'rawTx': rawTx, 'messageToSign': messageToSign}})
+
+
+def benchmarks(profile, directory):
+    """
+    Build the benchmarks of a profile
+
+    :param profile: profile settings (see `profiles`)
+    :param directory: scratch directory for keyfiles and hashed files
+    :type profile: dictionary
+    :type directory: string
+    :return: (name, function, operations per call) triples
+    :rtype: list
+
+    """
+    batch = profile['batch']
+    scryptParams = dict(KeyManager.defaultOptions['scrypt'], n = profile['scryptN'])
+    constants = dict(KeyManager.defaultOptions, scrypt = scryptParams)
+    password = 'benchmark password'
+    salt = os.urandom(32)
+    key = makeKey(password, constants, directory)
+    privateKeys = [os.urandom(32) for i in range(batch)]
+    derivedKey = KeyManager.deriveKey(password, salt, scryptParams)
+    iv = os.urandom(16)
+    ciphertexts = [KeyManager.encrypt(privateKey, derivedKey, iv, 'aes-256-ctr') for privateKey in privateKeys]
+    messages = [os.urandom(96 + i % 64) for i in range(batch)]
+    signatures = [key.sign(message) for message in messages]
+    textMessages = ['transaction message %d' % i for i in range(batch)]
+    triples = [(key.pk, text, key.sign(text.encode('utf-8'))) for text in textMessages]
+    prototype = makePrototype(key)
+    hashMessages = [os.urandom(32).hex() for i in range(profile['messages'])]
+
+    def deriveUncached():
+        KeyManager.derivedKeyCache.clear()
+        KeyManager.deriveKey(password, salt, scryptParams)
+
+    suite = [
+        ('keyManager.deriveKey n=%d' % profile['scryptN'], deriveUncached, 1),
+        ('keyManager.deriveKey cached', lambda: KeyManager.deriveKey(password, salt, scryptParams), 1),
+        ('keyManager.encrypt x%d' % batch, lambda: [KeyManager.encrypt(privateKey, derivedKey, iv, 'aes-256-ctr') for privateKey in privateKeys], batch),
+        ('keyManager.decrypt x%d' % batch, lambda: [KeyManager.decrypt(ciphertext, derivedKey, iv, 'aes-256-ctr') for ciphertext in ciphertexts], batch),
+        ('keyManager.getMAC x%d' % batch, lambda: [KeyManager.getMAC(derivedKey, ciphertext) for ciphertext in ciphertexts], batch),
+        ('keyManager.sign x%d' % batch, lambda: [key.sign(message) for message in messages], batch),
+        ('keyManager.verify x%d' % batch, lambda: [key.verify(publicKey, text, signature) for publicKey, text, signature in triples], batch),
+        ('crypTools.sigverifyMany x%d' % batch, lambda: CrypTools.sigverifyMany(triples), batch),
+        ('brambl.addSigToTx', lambda: Brambl.signPrototype(prototype, key), 1),
+        ('hash.string', lambda: [Hash.string(message, 'base58') for message in hashMessages], len(hashMessages)),
+        ('hash.strings x%d' % len(hashMessages), lambda: Hash.strings(hashMessages, 'base58'), len(hashMessages))
+    ]
+    for size in profile['fileSizes']:
+        path = os.path.join(directory, 'file-%d' % size)
+        with open(path, 'wb') as file:
+            file.write(os.urandom(size))
+        suite.append(('hash.file %s' % sizeLabel(size), lambda path = path: Hash.file(path, 'base58'), 1))
+    for size in (32, 65, 1024):
+        data = os.urandom(size)
+        encoded = Base58.encode(data)
+        suite.append(('base58.encode %dB' % size, lambda data = data: Base58.encode(data), 1))
+        suite.append(('base58.decode %dB' % size, lambda encoded = encoded: Base58.decode(encoded), 1))
+    suite.append(('base58.encodeMany 65B x%d' % batch, lambda: Base58.encodeMany(signatures), batch))
+    return suite
+
+
+def run(profileName = 'ci', only = None):
+    """
+    Run the benchmarks of a profile
+
+    :param profileName: 'ci' or 'full'
+    :param only: run only the benchmarks whose name contains this string, defaults to all
+    :type profileName: string
+    :type only: string
+    :return: results with the profile, machine description, fastest calibration time and the 'seconds' (best),
+        'median', 'opsPerSecond' and 'relative' (best / calibration time measured around it) of every benchmark
+    :rtype: dictionary
+
+    """
+    profile = profiles[profileName]
+    directory = tempfile.mkdtemp(prefix = 'brambl-benchmarks-')
+    try:
+        suite = benchmarks(profile, directory)
+        results = {}
+        calibrations = []
+        for name, function, items in suite:
+            if only and only not in name:
+                continue
+            # the speed of shared or throttled machines drifts, so every benchmark is normalized by a calibration run next to it
+            calibration = min(calibrate(), calibrate())
+            best, median = measure(function, items, profile['repeat'], profile['minTime'])
+            calibration = min(calibration, calibrate())
+            calibrations.append(calibration)
+            results[name] = {
+                'seconds': best,
+                'median': median,
+                'opsPerSecond': 1 / best,
+                'relative': best / calibration
+            }
+    finally:
+        shutil.rmtree(directory, ignore_errors = True)
+    return {
+        'profile': profileName,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'calibration': min(calibrations) if calibrations else None,
+        'results': results
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a baseline on their relative times
+
+    :param results: output of `run`
+    :param baseline: output of `run` stored as the baseline
+    :param tolerance: allowed slowdown, as a fraction of the baseline time (0.5 allows 50% slower)
+    :type results: dictionary
+    :type baseline: dictionary
+    :type tolerance: number
+    :return: (name, ratio of the relative time to the baseline, regressed) for every benchmark in both
+    :rtype: list
+
+    """
+    comparisons = []
+    for name, result in results['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        ratio = result['relative'] / reference['relative']
+        comparisons.append((name, ratio, ratio > 1 + tolerance))
+    return comparisons
+
+
+def main(args = None):
+    parser = argparse.ArgumentParser(prog = 'python -m benchmarks.microBenchmarks', description = 'Benchmark the crypto, hashing and encoding hot paths of brambl')
+    parser.add_argument('--profile', choices = sorted(profiles), default = 'ci')
+    parser.add_argument('--only', help = 'run only the benchmarks whose name contains this string')
+    parser.add_argument('--output', help = 'write the results as JSON to this file')
+    parser.add_argument('--baseline', help = 'compare with the results stored in this file')
+    parser.add_argument('--tolerance', type = float, default = 0.5, help = 'allowed slowdown against the baseline, defaults to 0.5 (50%%)')
+    parser.add_argument('--save-baseline', action = 'store_true', help = 'store the results as the baseline of the suite (%s)' % baselinePath)
+    options = parser.parse_args(args)
+
+    results = run(options.profile, options.only)
+    print('%-36s %14s %14s %14s' % ('benchmark (%s profile)' % options.profile, 'best', 'median', 'ops/s'))
+    for name, result in results['results'].items():
+        print('%-36s %12.3fus %12.3fus %14.0f' % (name, result['seconds'] * 1e6, result['median'] * 1e6, result['opsPerSecond']))
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent = 2)
+    if options.save_baseline:
+        with open(baselinePath, 'w') as file:
+            json.dump(results, file, indent = 2)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get('profile') != results['profile']:
+            print('warning: the baseline was recorded with the %s profile' % baseline.get('profile'))
+        if baseline.get('python') != results['python']:
+            print('warning: the baseline was recorded with Python %s, timings are not comparable across interpreters' % baseline.get('python'))
+        comparisons = compare(results, baseline, options.tolerance)
+        print()
+        print('%-36s %14s' % ('against baseline', 'time ratio'))
+        for name, ratio, regressed in comparisons:
+            print('%-36s %13.2fx%s' % (name, ratio, '  REGRESSION' if regressed else ''))
+        if any(regressed for name, ratio, regressed in comparisons):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
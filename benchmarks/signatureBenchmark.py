@@ -0,0 +1,54 @@
+"""
+signatureBenchmark.py
+====================================
+
+Measure curve25519 verifications per second for batch sizes from 1 to 100k, comparing
+`KeyManager.verify` called once per signature with the batch verifier.
+Run from the repository root with: python -m benchmarks.signatureBenchmark [maxBatchSize]
+
+"""
+import os
+import sys
+import time
+import base58
+import axolotl_curve25519 as curve
+
+from brambl.modules import KeyManager
+from brambl.utils import CrypTools
+
+
+def makeTriples(n):
+    privateKey = curve.generatePrivateKey(os.urandom(32))
+    publicKey = base58.b58encode(curve.generatePublicKey(privateKey))
+    triples = []
+    for i in range(n):
+        message = 'message %d' % i
+        triples.append((publicKey, message, curve.calculateSignature(os.urandom(64), privateKey, message.encode('utf-8'))))
+    return triples
+
+
+def run(maxBatchSize=100000, workers=None):
+    triples = makeTriples(maxBatchSize)
+    key = KeyManager.KeyManager.__new__(KeyManager.KeyManager)
+    results = []
+    batchSize = 1
+    while batchSize <= maxBatchSize:
+        batch = triples[:batchSize]
+        start = time.perf_counter()
+        single = [key.verify(publicKey, message, signature) for publicKey, message, signature in batch]
+        singleSeconds = time.perf_counter() - start
+        start = time.perf_counter()
+        verified = CrypTools.sigverifyMany(batch, workers)
+        batchSeconds = time.perf_counter() - start
+        if not all(single) or not all(verified):
+            raise Exception('A valid signature failed to verify')
+        results.append((batchSize, batchSize / singleSeconds, batchSize / batchSeconds))
+        batchSize *= 10
+    return results
+
+
+if __name__ == '__main__':
+    maxBatchSize = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print('%10s %18s %18s' % ('batch', 'verify (sig/s)', 'verifyMany (sig/s)'))
+    for batchSize, single, batch in run(maxBatchSize):
+        print('%10d %18.0f %18.0f' % (batchSize, single, batch))
@@ -4,24 +4,80 @@ Brambl.py
 The core module
 """
 #D Dependencies
-import base58
 import asyncio
+import contextvars
 import json
 
 # Primary sub-modules
 from .modules import Requests
+from .modules import AsyncRequests
 from .modules import KeyManager
 
 # Utilities
 from .utils import Hash
 from .utils import CrypTools
+from .utils import Base58
+from .utils import Tracing
 
 # Libraries
 from .lib import polling
+from .lib import pipeline
 
 # Constants defininitions
 validTxMethods = ['createAssetsPrototype','transferAssetsPrototype','transferTargetAssetsPrototype']
 
+def getSignatures(keys, txBytes):
+    """
+    Sign a transaction message with every key and format the signatures as Bifrost expects them,
+    a map from encoded proposition to encoded signature (both prefixed with the proposition type)
+
+    :param keys: unlocked key manager objects
+    :param txBytes: decoded messageToSign of the transaction
+    :type keys: list
+    :type txBytes: bytes
+    :return: signatures of the transaction
+    :rtype: dictionary
+
+    """
+    prefix = KeyManager.propositionPrefix
+    def sign(key):
+        return Base58.encode(prefix + key.sign(txBytes)).decode('utf-8')
+
+    signatures = [sign(key) for key in keys]
+    return {key.proposition: signature for key, signature in zip(keys, signatures)}
+
+def signPrototype(prototypeTx, userKeys):
+    """
+    Add the signatures of one or more unlocked keys to a prototype transaction (see `Brambl.addSigToTx`)
+
+    :param prototypeTx: An unsigned transaction JSON object (may already be decoded)
+    :param userKeys: A keyManager object containing the user's key (may be a list)
+    :type prototypeTx: JSON or dictionary
+    :type userKeys: List or `KeyManager` instance
+    :return: transaction object
+    :rtype: JSON
+
+    """
+    # incase a single given is given not as an array
+    keys = []
+    if type(userKeys) != type(['list']):
+        keys.append(userKeys)
+    else:
+        keys = userKeys
+
+    # add signatures of all given key files to the formatted transaction
+    with Tracing.span('brambl.decodePrototype'):
+        if isinstance(prototypeTx, (str, bytes)):
+            prototypeTx = json.loads(prototypeTx)
+        if 'result' in prototypeTx:
+            prototypeTx = prototypeTx['result']
+        tempDic = dict(prototypeTx['rawTx'])
+        txBytes = Base58.decode(prototypeTx['messageToSign'])
+
+    tempDic['signatures'] = getSignatures(keys, txBytes)
+    with Tracing.span('brambl.encodeTx'):
+        return json.dumps(tempDic)
+
 class Brambl():
     """
     Each sub-module may be initialized in one of three ways
@@ -100,18 +156,38 @@ class Brambl():
         # Import utilities
         self.utils = Hash
     
-    def Requests(testURL="http://localhost:9085/", apiKey="topl_the_world!"):
+    def Requests(testURL="http://localhost:9085/", apiKey="topl_the_world!", decode=False):
         """
         Method for creating a separate Requests instance
 
         :param testURL: Chain provider location, defaults to "http://localhost:9085/" 
         :param apiKey: Access key for authorizing requests to the client API, defaults to "topl_the_world!"
+        :param decode: return decoded results instead of JSON strings (see `Responses`), defaults to False
         :type testURL: string
         :type apiKey: string
+        :type decode: boolean
         :return: `Requests` object
         :rtype: instance of `Requests`
         """
-        return Requests.Requests(testURL,apiKey)
+        return Requests.Requests(testURL,apiKey,decode=decode)
+
+    def AsyncRequests(testURL="http://localhost:9085/", apiKey="topl_the_world!", concurrency=100, decode=False):
+        """
+        Method for creating a separate non-blocking AsyncRequests instance. It may be passed to `Brambl`
+        as params['Requests']['instance'] so that transactions never block the event loop.
+
+        :param testURL: Chain provider location, defaults to "http://localhost:9085/" 
+        :param apiKey: Access key for authorizing requests to the client API, defaults to "topl_the_world!"
+        :param concurrency: maximum number of requests in flight at once, defaults to 100
+        :param decode: return decoded results instead of JSON strings (see `Responses`), defaults to False
+        :type testURL: string
+        :type apiKey: string
+        :type concurrency: number
+        :type decode: boolean
+        :return: `AsyncRequests` object
+        :rtype: instance of `AsyncRequests`
+        """
+        return AsyncRequests.AsyncRequests(testURL,apiKey,concurrency,decode=decode)
         
 
 
@@ -132,42 +208,21 @@ class Brambl():
 
     async def addSigToTx(self, prototypeTx, userKeys):
         """
-        Add a signature to a prototype transaction using the an unlocked key manager object
+        Add a signature to a prototype transaction using the an unlocked key manager object. Signing runs
+        in the default executor of the event loop so other coroutines are not held up meanwhile.
 
-        :param prototypeTx: An unsigned transaction JSON object
+        :param prototypeTx: An unsigned transaction JSON object (may already be decoded)
         :param userKeys: A keyManager object containing the user's key (may be a list)
-        :type arg1: JSON
-        :type arg1: List or `KeyManager` instance
+        :type prototypeTx: JSON or dictionary
+        :type userKeys: List or `KeyManager` instance
         :return: transaction object
         :rtype: JSON
 
         """
-
-        # function for generating a signature in the correct format
-        def getSig(keys, txBytes):
-            fromEntries = {}
-            for key in keys:
-                prop_01 = bytes.fromhex("01")
-                prop = b''.join([prop_01, base58.b58decode(key.pk)])
-                sig = b''.join([prop_01, key.sign(txBytes)])
-                fromEntries[base58.b58encode(prop).decode('utf-8')] = base58.b58encode(sig).decode('utf-8')
-            return fromEntries
-
-        # incase a single given is given not as an array
-        keys = []
-        if type(userKeys) != type(['list']):
-            keys.append(userKeys)
-        else:
-            keys = userKeys
-
-        # add signatures of all given key files to the formatted transaction
-        prototypeTxDic = json.loads(prototypeTx)
-        tempDic = {}
-        for key in prototypeTxDic['result']['rawTx']:
-            tempDic[key] = prototypeTxDic['result']['rawTx'][key]
-
-        tempDic['signatures'] = getSig(keys, base58.b58decode(prototypeTxDic['result']['messageToSign']))
-        return json.dumps(tempDic)
+        with Tracing.span('brambl.addSigToTx', keys = len(userKeys) if isinstance(userKeys, list) else 1):
+            # signing spans are attached to this span by running in a copy of the current context
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(None, context.run, signPrototype, prototypeTx, userKeys)
     
     
     async def signAndBroadcast(self, prototypeTx):
@@ -180,8 +235,9 @@ class Brambl():
 
         """
         #may return dictionary?
-        formattedTx = self.addSigToTx(prototypeTx,self.keyManager)
-        return self.requests.broadcastTx({'tx':formattedTx})
+        with Tracing.span('brambl.signAndBroadcast'):
+            formattedTx = await self.addSigToTx(prototypeTx,self.keyManager)
+            return await AsyncRequests.awaitRequest(self.requests, 'broadcastTx', {'tx':formattedTx})
 
     
     async def transaction(self,method,params):
@@ -199,12 +255,47 @@ class Brambl():
         if method not in validTxMethods:
             raise Exception('Invalid transaction method')
 
-        if method == 'createAssetsPrototype':
-            return await self.signAndBroadcast(self.requests.createAssetsPrototype(params))
-        elif method == 'transferAssetsPrototype':
-            return await self.signAndBroadcast(self.requests.transferAssetsPrototype(params))
-        elif method == 'transferTargetAssetsPrototype':
-            return await self.signAndBroadcast(self.requests.transferTargetAssetsPrototype(params))
+        with Tracing.span('brambl.transaction', method = method):
+            return await self.signAndBroadcast(await AsyncRequests.awaitRequest(self.requests, method, params))
+
+    async def transactionStream(self, transactions, prototypeConcurrency=50, broadcastConcurrency=50, signWorkers=1, maxInFlight=1000):
+        """
+        Create, sign and broadcast many transactions as a pipeline. Prototypes are requested concurrently,
+        signed on a worker thread off the event loop and broadcast with bounded concurrency, so that many transactions
+        are in progress at every stage at once. Results are yielded in the order transactions complete.
+
+        Example:
+            async for result in brambl.transactionStream([('transferAssetsPrototype', params) for params in transfers]):
+                print(result['index'], result.get('response') or result['error'])
+
+        :param transactions: (method, params) pairs as given to `transaction`
+        :param prototypeConcurrency: maximum number of prototype requests in flight
+        :param broadcastConcurrency: maximum number of broadcastTx requests in flight
+        :param signWorkers: number of signing threads. Signing holds the GIL, so more than one thread does not sign
+            faster, the thread only keeps signing off the event loop
+        :param maxInFlight: maximum number of transactions in progress at once
+        :type transactions: iterable or async iterator
+        :type prototypeConcurrency: number
+        :type broadcastConcurrency: number
+        :type signWorkers: number
+        :type maxInFlight: number
+        :return: for every transaction, its 'index', 'method' and 'params' along with either the broadcastTx
+            'response' or the 'error' raised and the 'stage' ('prototype', 'sign' or 'broadcast') it was raised in
+        :rtype: async generator of dictionaries
+
+        """
+        keyManager = self.keyManager
+        txPipeline = pipeline.TransactionPipeline(
+            self.requests,
+            lambda prototypeTx: signPrototype(prototypeTx, keyManager),
+            validTxMethods,
+            prototypeConcurrency,
+            broadcastConcurrency,
+            signWorkers,
+            maxInFlight
+        )
+        async for result in txPipeline.run(transactions):
+            yield result
 
     async def pollTx(self, txId,options={ 'timeout': 90, 'interval': 3, 'maxFailedQueries': 10 }):
         """
@@ -229,4 +320,26 @@ class Brambl():
 
         """
         temp = polling.pollingTx(self.requests,txId,options)
-        return temp.combined()
+        return await temp.combined()
+
+    async def pollTxs(self, txIds, options={ 'timeout': 90, 'interval': 3, 'maxFailedQueries': 10 }):
+        """
+        Poll the chain provider for many transactions at once. All transactions are followed by a single
+        `TxWatcher`, so each polling interval costs one batched 'getTransactionById' request (and one batched
+        'getTransactionFromMempool' request for those still pending) no matter how many transactions are watched.
+
+        :param txIds: The unique transaction IDs to look for
+        :param options: Optional parameters in dictionary to control the polling behavior (see `pollTx`)
+        :type txIds: list
+        :type options: dictionary
+        :return: the polling result of every transaction, in order. Failed polls are given as the raised exception.
+        :rtype: list
+
+        """
+        options = dict(polling.defaultOptions, **options)
+        watcher = polling.TxWatcher(self.requests, options['interval'])
+        try:
+            responses = await asyncio.gather(*[watcher.watch(txId, options['timeout'], options['maxFailedQueries']) for txId in txIds], return_exceptions=True)
+        finally:
+            await watcher.close()
+        return [r if isinstance(r, Exception) else json.dumps(r) for r in responses]
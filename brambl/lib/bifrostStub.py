@@ -0,0 +1,643 @@
+"""
+bifrostStub.py
+====================================
+
+Local stand-in for the Brambl layer json-rpc interface of a Bifrost node, to test and load-test the
+client stack repeatably without a running chain. It answers every route used by `Requests` (wallet/,
+asset/, nodeView/ and debug/), including JSON-RPC 2.0 batches, with payloads shaped like those of
+Bifrost: prototypes to sign, transactions moving from the mempool into blocks, balances and boxes.
+
+Latency, injected errors and payload sizes are configurable. The stub runs in-process on a background
+thread, or as a separate process with:
+    python -m brambl.lib.bifrostStub --port 9085 --latency 0.01 --error-rate 0.01
+
+Example:
+    with BifrostStub(latency = 0.005) as stub:
+        requests = Requests.Requests(stub.url)
+        print(requests.chainInfo())
+
+"""
+# Dependencies
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import axolotl_curve25519 as curve
+
+from ..modules import KeyManager
+from ..utils import Base58
+
+# json-rpc method -> route it is served on
+routes = {
+    'balances': 'wallet/',
+    'listOpenKeyfiles': 'wallet/',
+    'generateKeyfile': 'wallet/',
+    'lockKeyfile': 'wallet/',
+    'unlockKeyfile': 'wallet/',
+    'signTx': 'wallet/',
+    'broadcastTx': 'wallet/',
+    'transferPolys': 'wallet/',
+    'transferArbits': 'wallet/',
+    'createAssets': 'asset/',
+    'createAssetsPrototype': 'asset/',
+    'transferAssets': 'asset/',
+    'transferAssetsPrototype': 'asset/',
+    'transferTargetAssets': 'asset/',
+    'transferTargetAssetsPrototype': 'asset/',
+    'transactionById': 'nodeView/',
+    'transactionFromMempool': 'nodeView/',
+    'mempool': 'nodeView/',
+    'blockById': 'nodeView/',
+    'info': 'debug/',
+    'delay': 'debug/',
+    'myBlocks': 'debug/',
+    'generators': 'debug/'
+}
+
+# prototype methods -> type of the transaction they create
+prototypeTypes = {
+    'createAssetsPrototype': 'AssetCreation',
+    'transferAssetsPrototype': 'AssetTransfer',
+    'transferTargetAssetsPrototype': 'AssetTransfer'
+}
+
+# methods creating a transaction signed by the keyfiles of the node -> type of the transaction
+nodeSignedTypes = {
+    'transferPolys': 'PolyTransfer',
+    'transferArbits': 'ArbitTransfer',
+    'createAssets': 'AssetCreation',
+    'transferAssets': 'AssetTransfer',
+    'transferTargetAssets': 'AssetTransfer'
+}
+
+
+class StubError(Exception):
+    """
+    json-rpc error returned by the stub in place of a result
+
+    :param code: json-rpc error code
+    :param message: error message
+    :type code: number
+    :type message: string
+
+    """
+    def __init__(self, code, message):
+        self.code = code
+        self.message = message
+        Exception.__init__(self, message)
+
+
+class StubChain():
+    """
+    In-memory chain state of the stub: open keyfiles, the mempool, blocks and the transactions they confirm.
+    Transactions broadcast (or created by the node) wait in the mempool until the next block is forged,
+    every blockInterval seconds or when `forge` is called.
+
+    :param mempoolSize: number of synthetic transactions initially in the mempool, defaults to 0
+    :param blocks: number of synthetic blocks initially in the chain, defaults to 10
+    :param blockTxs: number of synthetic transactions in every initial block, defaults to 10
+    :param txBoxes: number of boxes spent and created by every transaction, defaults to 2
+    :param dataSize: length of the data string of synthetic transactions, defaults to 0
+    :param balanceBoxes: number of boxes of every type returned per key by 'balances', defaults to 2
+    :param blockInterval: seconds between forged blocks, None to forge only when `forge` is called, defaults to 1
+    :param verifySignatures: check the signatures of broadcast prototype transactions, defaults to False
+    :param seed: seed of the generated ids and payloads, defaults to a random seed
+    :type mempoolSize: number
+    :type blocks: number
+    :type blockTxs: number
+    :type txBoxes: number
+    :type dataSize: number
+    :type balanceBoxes: number
+    :type blockInterval: number
+    :type verifySignatures: boolean
+    :type seed: number
+    :return: `StubChain` object
+    :rtype: instance of `StubChain`
+
+    """
+    def __init__(self, mempoolSize = 0, blocks = 10, blockTxs = 10, txBoxes = 2, dataSize = 0, balanceBoxes = 2, blockInterval = 1, verifySignatures = False, seed = None):
+        self.random = random.Random(seed)
+        self.txBoxes = txBoxes
+        self.dataSize = dataSize
+        self.balanceBoxes = balanceBoxes
+        self.blockInterval = blockInterval
+        self.verifySignatures = verifySignatures
+        self.lock = threading.Lock()
+        self.keyfiles = {self.newId(): 'unlocked' for i in range(2)}
+        self.mempool = {}
+        self.transactions = {}
+        self.blocks = {}
+        self.blockIds = []
+        # txHash -> message to sign of prototypes not broadcast yet
+        self.messages = {}
+        self.txCount = 0
+        self.forged = 0
+        for i in range(blocks):
+            self.addBlock([self.newTx(self.random.choice(list(prototypeTypes.values()))) for j in range(blockTxs)])
+        for i in range(mempoolSize):
+            tx = self.newTx('PolyTransfer')
+            self.mempool[tx['txHash']] = tx
+        self.nextBlock = None if blockInterval is None else time.monotonic() + blockInterval
+
+    def newId(self):
+        return Base58.encode(self.random.getrandbits(256).to_bytes(32, 'big')).decode('utf-8')
+
+    def newTx(self, txType, params = None):
+        params = params or {}
+        sender = params.get('sender') or [params.get('issuer') or self.newId()]
+        if isinstance(sender, str):
+            sender = [sender]
+        recipient = params.get('recipient') or self.newId()
+        tx = {
+            'txType': txType,
+            'txHash': self.newId(),
+            'timestamp': int(time.time() * 1000),
+            'signatures': {},
+            'newBoxes': [self.newId() for i in range(self.txBoxes)],
+            'data': params.get('data', 'x' * self.dataSize),
+            'fee': str(params.get('fee', 0)),
+            'boxesToRemove': [self.newId() for i in range(self.txBoxes)],
+            'from': [[sender[i % len(sender)], str(self.random.getrandbits(63))] for i in range(self.txBoxes)],
+            'to': [[recipient, str(params.get('amount', self.random.randint(1, 1000)))]] + [[sender[0], str(self.random.randint(0, 1000))] for i in range(self.txBoxes - 1)]
+        }
+        if txType.startswith('Asset'):
+            tx['issuer'] = params.get('issuer') or sender[0]
+            tx['assetCode'] = params.get('assetCode', 'asset')
+            tx['minting'] = txType == 'AssetCreation'
+        return tx
+
+    def addBlock(self, txs):
+        # forge a block confirming txs
+        parentId = self.blockIds[-1] if self.blockIds else None
+        blockId = self.newId()
+        height = len(self.blockIds) + 1
+        for tx in txs:
+            tx['blockNumber'] = height
+            tx['blockHash'] = blockId
+            self.transactions[tx['txHash']] = tx
+        self.blocks[blockId] = {
+            'id': blockId,
+            'parentId': parentId,
+            'timestamp': int(time.time() * 1000),
+            'generatorBox': {'type': 'ArbitBox', 'id': self.newId(), 'proposition': self.newId(), 'value': str(self.random.randint(1, 10 ** 6))},
+            'signature': Base58.encode(self.random.getrandbits(512).to_bytes(64, 'big')).decode('utf-8'),
+            'txs': txs,
+            'height': height,
+            'version': 1,
+            'blockSize': len(json.dumps(txs))
+        }
+        self.blockIds.append(blockId)
+        self.txCount += len(txs)
+        return blockId
+
+    def forge(self):
+        """
+        Forge a block confirming every transaction of the mempool
+
+        :return: id of the new block
+        :rtype: string
+
+        """
+        with self.lock:
+            return self.forgeLocked()
+
+    def forgeLocked(self):
+        txs = list(self.mempool.values())
+        self.mempool.clear()
+        self.forged += 1
+        return self.addBlock(txs)
+
+    def tick(self):
+        # forge the blocks due since the last request
+        if self.nextBlock is None:
+            return
+        now = time.monotonic()
+        if now >= self.nextBlock:
+            self.forgeLocked()
+            self.nextBlock = now + self.blockInterval
+
+    def call(self, method, params):
+        """
+        Answer a json-rpc method
+
+        :param method: json-rpc method
+        :param params: request parameters
+        :type method: string
+        :type params: dictionary
+        :return: json-rpc result
+        :rtype: JSON value
+        :raises StubError: with the error Bifrost would return
+
+        """
+        handler = getattr(self, 'rpc_' + method, None)
+        if handler is None:
+            raise StubError(-32601, 'Method not found: ' + str(method))
+        if not isinstance(params, dict):
+            raise StubError(-32602, 'Invalid params')
+        with self.lock:
+            self.tick()
+            try:
+                return handler(params)
+            except (KeyError, TypeError, ValueError) as e:
+                raise StubError(-32602, 'Invalid params: %s' % e)
+
+    # wallet/
+
+    def rpc_balances(self, params):
+        result = {}
+        for publicKey in params['publicKeys']:
+            boxes = {}
+            for boxType in ('Poly', 'Arbit', 'Asset'):
+                boxes[boxType] = [{'id': self.newId(), 'type': boxType + 'Box', 'proposition': publicKey, 'nonce': str(self.random.getrandbits(63)),
+                                   'value': str(self.random.randint(1, 10 ** 6))} for i in range(self.balanceBoxes)]
+            result[publicKey] = {
+                'Balances': {'Polys': str(sum(int(box['value']) for box in boxes['Poly'])), 'Arbits': str(sum(int(box['value']) for box in boxes['Arbit']))},
+                'Boxes': boxes
+            }
+        return result
+
+    def rpc_listOpenKeyfiles(self, params):
+        return [publicKey for publicKey, state in self.keyfiles.items() if state == 'unlocked']
+
+    def rpc_generateKeyfile(self, params):
+        if not params['password']:
+            raise StubError(-32602, 'A password must be provided')
+        publicKey = self.newId()
+        self.keyfiles[publicKey] = 'unlocked'
+        return {'publicKey': publicKey}
+
+    def keyfile(self, params, state):
+        publicKey = params['publicKey']
+        if publicKey not in self.keyfiles:
+            raise StubError(500, 'Unable to find keyfile for ' + publicKey)
+        self.keyfiles[publicKey] = state
+        return {publicKey: state}
+
+    def rpc_lockKeyfile(self, params):
+        return self.keyfile(params, 'locked')
+
+    def rpc_unlockKeyfile(self, params):
+        return self.keyfile(params, 'unlocked')
+
+    def rpc_signTx(self, params):
+        tx = self.readTx(params['tx'])
+        tx['signatures'] = dict(tx.get('signatures') or {}, **{
+            publicKey: Base58.encode(KeyManager.propositionPrefix + self.random.getrandbits(512).to_bytes(64, 'big')).decode('utf-8')
+            for publicKey in params.get('signingKeys', [])
+        })
+        return {'tx': tx}
+
+    def rpc_broadcastTx(self, params):
+        tx = self.readTx(params['tx'])
+        txHash = tx.get('txHash')
+        if not txHash:
+            raise StubError(-32602, 'The transaction has no txHash')
+        if txHash in self.mempool or txHash in self.transactions:
+            raise StubError(500, 'Transaction %s was already broadcast' % txHash)
+        if not tx.get('signatures'):
+            raise StubError(500, 'The transaction is not signed')
+        if self.verifySignatures:
+            self.verify(tx)
+        self.messages.pop(txHash, None)
+        self.mempool[txHash] = tx
+        return tx
+
+    def verify(self, tx):
+        # check every signature against the message to sign of its prototype
+        message = self.messages.get(tx['txHash'])
+        if message is None:
+            raise StubError(500, 'No prototype was created for transaction ' + tx['txHash'])
+        for proposition, signature in tx['signatures'].items():
+            publicKey = Base58.decode(proposition)[1:]
+            if curve.verifySignature(publicKey, message, Base58.decode(signature)[1:]) != 0:
+                raise StubError(500, 'Invalid signature for proposition ' + proposition)
+
+    def readTx(self, tx):
+        if isinstance(tx, str):
+            tx = json.loads(tx)
+        if not isinstance(tx, dict):
+            raise StubError(-32602, 'Invalid transaction')
+        return dict(tx)
+
+    def createTx(self, method, params):
+        tx = self.newTx(nodeSignedTypes[method], params)
+        # signed by a keyfile of the node
+        tx['signatures'] = {self.newId(): Base58.encode(KeyManager.propositionPrefix + self.random.getrandbits(512).to_bytes(64, 'big')).decode('utf-8')}
+        self.mempool[tx['txHash']] = tx
+        return tx
+
+    def rpc_transferPolys(self, params):
+        return self.createTx('transferPolys', params)
+
+    def rpc_transferArbits(self, params):
+        return self.createTx('transferArbits', params)
+
+    # asset/
+
+    def rpc_createAssets(self, params):
+        return self.createTx('createAssets', params)
+
+    def rpc_transferAssets(self, params):
+        return self.createTx('transferAssets', params)
+
+    def rpc_transferTargetAssets(self, params):
+        return self.createTx('transferTargetAssets', params)
+
+    def prototype(self, method, params):
+        tx = self.newTx(prototypeTypes[method], params)
+        if method == 'transferTargetAssetsPrototype':
+            tx['boxesToRemove'] = [params['assetId']] + tx['boxesToRemove'][1:]
+        message = hashlib.blake2b(json.dumps(tx, sort_keys = True).encode('utf-8'), digest_size = 32).digest()
+        message += b''.join(Base58.decode(boxId) for boxId in tx['boxesToRemove'])
+        self.messages[tx['txHash']] = message
+        return {'formattedTx': tx, 'rawTx': tx, 'messageToSign': Base58.encode(message).decode('utf-8')}
+
+    def rpc_createAssetsPrototype(self, params):
+        return self.prototype('createAssetsPrototype', params)
+
+    def rpc_transferAssetsPrototype(self, params):
+        return self.prototype('transferAssetsPrototype', params)
+
+    def rpc_transferTargetAssetsPrototype(self, params):
+        return self.prototype('transferTargetAssetsPrototype', params)
+
+    # nodeView/
+
+    def rpc_transactionById(self, params):
+        tx = self.transactions.get(params['transactionId'])
+        if tx is None:
+            raise StubError(500, 'Unable to find confirmed transaction')
+        return tx
+
+    def rpc_transactionFromMempool(self, params):
+        tx = self.mempool.get(params['transactionId'])
+        if tx is None:
+            raise StubError(500, 'Unable to retrieve transaction')
+        return tx
+
+    def rpc_mempool(self, params):
+        return list(self.mempool.values())
+
+    def rpc_blockById(self, params):
+        block = self.blocks.get(params['blockId'])
+        if block is None:
+            raise StubError(500, 'Unable to find block')
+        return block
+
+    # debug/
+
+    def rpc_info(self, params):
+        bestBlockId = self.blockIds[-1] if self.blockIds else None
+        bestBlock = dict(self.blocks[bestBlockId], txs = []) if bestBlockId else None
+        return {
+            'height': len(self.blockIds),
+            'score': len(self.blockIds) * 1000,
+            'bestBlockId': bestBlockId,
+            'bestBlock': bestBlock,
+            'stateVersion': bestBlockId,
+            'txCount': self.txCount
+        }
+
+    def rpc_delay(self, params):
+        if params['blockId'] not in self.blocks:
+            raise StubError(500, 'Unable to find block')
+        return {'delay': '%d milliseconds' % int((self.blockInterval or 1) * 1000 * max(1, int(params['numBlocks'])))}
+
+    def rpc_myBlocks(self, params):
+        return {'pubkeys': list(self.keyfiles), 'count': self.forged}
+
+    def rpc_generators(self, params):
+        return {publicKey: 0 for publicKey in self.keyfiles}
+
+    def counts(self):
+        """
+        :return: number of transactions in the mempool ('mempool'), confirmed ('confirmed') and of blocks ('blocks')
+        :rtype: dictionary
+
+        """
+        with self.lock:
+            return {'mempool': len(self.mempool), 'confirmed': len(self.transactions), 'blocks': len(self.blockIds)}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP handler of a `BifrostStub`, bound to its stub by a subclass created in `BifrostStub.__init__`
+    protocol_version = 'HTTP/1.1'
+    stub = None
+
+    def do_POST(self):
+        stub = self.stub
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        stub.wait()
+        if stub.apiKey is not None and self.headers.get('x-api-key') != stub.apiKey:
+            return self.reply(403, b'Provided API key is not correct')
+        if stub.injectHttpError():
+            return self.reply(503, b'Service unavailable')
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return self.replyJson(stub.error(None, -32700, 'Parse error'))
+        route = self.path.lstrip('/')
+        if isinstance(request, list):
+            if not request:
+                return self.replyJson(stub.error(None, -32600, 'Invalid Request'))
+            return self.replyJson([stub.answer(route, item) for item in request])
+        self.replyJson(stub.answer(route, request))
+
+    def replyJson(self, response):
+        self.reply(200, json.dumps(response).encode('utf-8'), 'application/json')
+
+    def reply(self, status, content, contentType = 'text/plain'):
+        self.send_response(status)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class BifrostStub():
+    """
+    json-rpc server standing in for a Bifrost node
+
+    :param host: interface to listen on, defaults to '127.0.0.1'
+    :param port: port to listen on, defaults to 0 (any free port, see `url`)
+    :param latency: seconds every HTTP request waits before being answered, defaults to 0
+    :param jitter: maximum random seconds added to the latency, defaults to 0
+    :param errorRate: fraction of json-rpc requests answered with an injected json-rpc error, defaults to 0
+    :param httpErrorRate: fraction of HTTP requests answered with a 503 status, defaults to 0
+    :param apiKey: api key required in the x-api-key header, defaults to accepting any key
+    :param chain: chain state served, defaults to a new `StubChain` created with chainOptions
+    :param chainOptions: keyword arguments of `StubChain` (payload sizes, block interval, seed...)
+    :type host: string
+    :type port: number
+    :type latency: number
+    :type jitter: number
+    :type errorRate: number
+    :type httpErrorRate: number
+    :type apiKey: string
+    :type chain: `StubChain` instance
+    :return: `BifrostStub` object
+    :rtype: instance of `BifrostStub`
+
+    """
+    def __init__(self, host = '127.0.0.1', port = 0, latency = 0, jitter = 0, errorRate = 0, httpErrorRate = 0, apiKey = None, chain = None, **chainOptions):
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        self.httpErrorRate = httpErrorRate
+        self.apiKey = apiKey
+        self.chain = chain if chain is not None else StubChain(**chainOptions)
+        self.random = random.Random(chainOptions.get('seed'))
+        self.lock = threading.Lock()
+        self.requestCounts = {}
+        self.errorCounts = {}
+        self.server = ThreadingHTTPServer((host, port), type('BoundStubHandler', (StubHandler,), {'stub': self}))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        """
+        Chain provider location to give to `Requests`
+
+        """
+        host, port = self.server.server_address[:2]
+        return 'http://%s:%d/' % (host, port)
+
+    def start(self):
+        """
+        Serve requests on a background thread
+
+        :return: the stub
+        :rtype: `BifrostStub` instance
+
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+            self.thread.start()
+        return self
+
+    def serveForever(self):
+        """
+        Serve requests on the calling thread until `stop` is called
+
+        """
+        self.server.serve_forever()
+
+    def stop(self):
+        """
+        Stop serving and close the listening socket
+
+        """
+        if self.thread is not None:
+            self.server.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def wait(self):
+        delay = self.latency
+        if self.jitter:
+            with self.lock:
+                delay += self.random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def injectHttpError(self):
+        if not self.httpErrorRate:
+            return False
+        with self.lock:
+            return self.random.random() < self.httpErrorRate
+
+    def error(self, id, code, message):
+        return {'jsonrpc': '2.0', 'id': id, 'error': {'code': code, 'message': message}}
+
+    def answer(self, route, request):
+        """
+        Answer one json-rpc request object
+
+        :param route: route the request was posted to (i.e. 'wallet/')
+        :param request: json-rpc request object
+        :type route: string
+        :type request: dictionary
+        :return: json-rpc response object
+        :rtype: dictionary
+
+        """
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            return self.error(None, -32600, 'Invalid Request')
+        id = request.get('id')
+        method = request['method']
+        with self.lock:
+            self.requestCounts[method] = self.requestCounts.get(method, 0) + 1
+            injected = self.errorRate and self.random.random() < self.errorRate
+            if injected:
+                self.errorCounts[method] = self.errorCounts.get(method, 0) + 1
+        if routes.get(method) != route:
+            return self.error(id, -32601, 'Method not found: %s%s' % (route, method))
+        if injected:
+            return self.error(id, -32603, 'Injected error')
+        try:
+            return {'jsonrpc': '2.0', 'id': id, 'result': self.chain.call(method, request.get('params', {}))}
+        except StubError as e:
+            return self.error(id, e.code, e.message)
+
+    def stats(self):
+        """
+        :return: number of json-rpc requests ('requests') and injected errors ('errors') by method, and the chain counts (see `StubChain.counts`)
+        :rtype: dictionary
+
+        """
+        with self.lock:
+            stats = {'requests': dict(self.requestCounts), 'errors': dict(self.errorCounts)}
+        stats.update(self.chain.counts())
+        return stats
+
+
+def main(args = None):
+    parser = argparse.ArgumentParser(prog = 'python -m brambl.lib.bifrostStub', description = 'Serve a local stand-in for the Bifrost json-rpc interface')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 9085)
+    parser.add_argument('--latency', type = float, default = 0, help = 'seconds every request waits before being answered')
+    parser.add_argument('--jitter', type = float, default = 0, help = 'maximum random seconds added to the latency')
+    parser.add_argument('--error-rate', type = float, default = 0, help = 'fraction of json-rpc requests answered with an error')
+    parser.add_argument('--http-error-rate', type = float, default = 0, help = 'fraction of HTTP requests answered with a 503 status')
+    parser.add_argument('--api-key', help = 'api key required in the x-api-key header')
+    parser.add_argument('--mempool-size', type = int, default = 0, help = 'synthetic transactions initially in the mempool')
+    parser.add_argument('--blocks', type = int, default = 10, help = 'synthetic blocks initially in the chain')
+    parser.add_argument('--block-txs', type = int, default = 10, help = 'transactions in every synthetic block')
+    parser.add_argument('--tx-boxes', type = int, default = 2, help = 'boxes spent and created by every transaction')
+    parser.add_argument('--data-size', type = int, default = 0, help = 'length of the data string of synthetic transactions')
+    parser.add_argument('--balance-boxes', type = int, default = 2, help = 'boxes of every type returned per key by balances')
+    parser.add_argument('--block-interval', type = float, default = 1, help = 'seconds between forged blocks, 0 forges a block on every request')
+    parser.add_argument('--verify-signatures', action = 'store_true', help = 'check the signatures of broadcast transactions')
+    parser.add_argument('--seed', type = int, help = 'seed of the generated ids and payloads')
+    options = parser.parse_args(args)
+
+    stub = BifrostStub(options.host, options.port, options.latency, options.jitter, options.error_rate, options.http_error_rate, options.api_key,
+                       mempoolSize = options.mempool_size, blocks = options.blocks, blockTxs = options.block_txs, txBoxes = options.tx_boxes,
+                       dataSize = options.data_size, balanceBoxes = options.balance_boxes, blockInterval = options.block_interval,
+                       verifySignatures = options.verify_signatures, seed = options.seed)
+    print('Bifrost stub listening on ' + stub.url, flush = True)
+    try:
+        stub.serveForever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
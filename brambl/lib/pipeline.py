@@ -0,0 +1,133 @@
+"""
+pipeline.py
+====================================
+
+Pipelined transaction engine used by `Brambl.transactionStream`. Every transaction goes through
+three stages (prototype request, signing, broadcast) and each stage runs with its own bound on
+concurrency, so that thousands of transactions can be in progress at once.
+
+"""
+# Dependencies
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from ..modules.AsyncRequests import awaitRequest
+from ..modules import Responses
+from ..utils import Tracing
+
+
+async def iterate(source):
+    # accept both iterables and async iterators of transactions
+    if hasattr(source, '__aiter__'):
+        async for item in source:
+            yield item
+    else:
+        for item in source:
+            yield item
+
+def checkResponse(response, message):
+    # raise the json-rpc error of a decoded response, with message if the node gave none
+    if isinstance(response, dict) and 'error' in response:
+        raise Exception(response['error'].get('message', message))
+    return response
+
+
+class TransactionPipeline():
+    """
+    Request, sign and broadcast a stream of transactions.
+
+    :param requests: chain provider interface
+    :param signer: function turning a decoded prototype transaction into a signed transaction JSON object
+    :param validMethods: names of the prototype methods that may be requested
+    :param prototypeConcurrency: maximum number of prototype requests in flight
+    :param broadcastConcurrency: maximum number of broadcastTx requests in flight
+    :param signWorkers: number of signing threads. Signing holds the GIL, so more than one thread does not sign
+        faster, the thread only keeps signing off the event loop
+    :param maxInFlight: maximum number of transactions in progress at once
+    :type requests: `Requests` or `AsyncRequests` instance
+    :type signer: function
+    :type validMethods: list
+    :type prototypeConcurrency: number
+    :type broadcastConcurrency: number
+    :type signWorkers: number
+    :type maxInFlight: number
+    :return: `TransactionPipeline` object
+    :rtype: instance of `TransactionPipeline`
+
+    """
+    def __init__(self, requests, signer, validMethods, prototypeConcurrency = 50, broadcastConcurrency = 50, signWorkers = 1, maxInFlight = 1000):
+        self.requests = requests
+        self.signer = signer
+        self.validMethods = validMethods
+        self.prototypeConcurrency = prototypeConcurrency
+        self.broadcastConcurrency = broadcastConcurrency
+        self.signWorkers = signWorkers
+        self.maxInFlight = maxInFlight
+
+    async def run(self, transactions):
+        """
+        Run every transaction through the pipeline
+
+        :param transactions: (method, params) pairs
+        :type transactions: iterable or async iterator
+        :return: result of every transaction, in completion order (see `Brambl.transactionStream`)
+        :rtype: async generator of dictionaries
+
+        """
+        prototypeSlots = asyncio.Semaphore(self.prototypeConcurrency)
+        broadcastSlots = asyncio.Semaphore(self.broadcastConcurrency)
+        signPool = ThreadPoolExecutor(max_workers = self.signWorkers)
+        source = iterate(transactions).__aiter__()
+        pending = set()
+        exhausted = False
+        index = 0
+        try:
+            while not exhausted or pending:
+                while not exhausted and len(pending) < self.maxInFlight:
+                    try:
+                        method, params = await source.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.ensure_future(self.process(index, method, params, prototypeSlots, broadcastSlots, signPool)))
+                    index += 1
+                if pending:
+                    done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            signPool.shutdown(wait = False)
+
+    async def process(self, index, method, params, prototypeSlots, broadcastSlots, signPool):
+        result = {'index': index, 'method': method, 'params': params}
+        stage = 'prototype'
+        with Tracing.span('pipeline.transaction', index = index, method = method) as span:
+            try:
+                if method not in self.validMethods:
+                    raise Exception('Invalid transaction method')
+                async with prototypeSlots:
+                    prototypeTx = await awaitRequest(self.requests, method, params)
+                # in decoded mode the prototype arrives decoded and errors have already been raised
+                if isinstance(prototypeTx, (str, bytes)):
+                    prototypeTx = checkResponse(Responses.loads(prototypeTx), 'Prototype request failed')
+
+                stage = 'sign'
+                # signing spans are attached to this transaction by running the signer in a copy of its context
+                context = contextvars.copy_context()
+                formattedTx = await asyncio.get_running_loop().run_in_executor(signPool, context.run, self.signer, prototypeTx)
+
+                stage = 'broadcast'
+                async with broadcastSlots:
+                    response = await awaitRequest(self.requests, 'broadcastTx', {'tx': formattedTx})
+                if isinstance(response, (str, bytes)):
+                    checkResponse(Responses.loads(response), 'Broadcast request failed')
+                result['response'] = response
+            except Exception as e:
+                result['error'] = e
+                result['stage'] = stage
+                span.setAttribute('error', '%s: %s' % (type(e).__name__, e))
+                span.setAttribute('stage', stage)
+        return result
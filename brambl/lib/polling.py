@@ -0,0 +1,227 @@
+"""
+polling.py
+====================================
+
+Polling engine used by `Brambl.pollTx` to wait for transactions to be included in a block.
+A single `TxWatcher` can follow any number of pending transactions: on every tick all of them
+are looked up together with one json-rpc batch instead of one polling loop per transaction.
+
+"""
+# Dependencies
+import asyncio
+import json
+
+from ..modules.AsyncRequests import AsyncRequests
+
+# Default polling behavior, see `Brambl.pollTx`
+defaultOptions = {
+    'timeout': 90,
+    'interval': 3,
+    'maxFailedQueries': 10
+}
+
+
+def isFound(response):
+    """
+    Check whether a json-rpc response holds a transaction
+
+    :param response: decoded json-rpc response object
+    :type response: dictionary
+    :return: True if the response holds a result and no error
+    :rtype: boolean
+
+    """
+    return 'error' not in response and response.get('result') is not None
+
+
+class TxWatcher():
+    """
+    Watch many pending transactions with one polling loop.
+
+    Every `interval` seconds all watched transactions are looked up with a single batch of
+    'getTransactionById', which only finds confirmed transactions. The ones still unconfirmed are then
+    looked up with a single batch of 'getTransactionFromMempool'. A transaction stops being watched when
+    it is confirmed, when its timeout expires or after `maxFailedQueries` consecutive ticks in which it
+    could not be found in the mempool either.
+
+    :param requests: chain provider interface used for the lookups
+    :param interval: The interval (in seconds) between attempts, defaults to 3
+    :param maxBatchSize: maximum number of lookups in one json-rpc batch, defaults to the limit of `requests`
+    :type requests: `Requests` or `AsyncRequests` instance
+    :type interval: number
+    :type maxBatchSize: number
+    :return: `TxWatcher` object
+    :rtype: instance of `TxWatcher`
+
+    """
+    def __init__(self, requests, interval = defaultOptions['interval'], maxBatchSize = None):
+        self.requests = requests
+        self.interval = interval
+        self.maxBatchSize = maxBatchSize
+        self.pending = {}
+        self.task = None
+
+    def __len__(self):
+        return len(self.pending)
+
+    def watch(self, txId, timeout = defaultOptions['timeout'], maxFailedQueries = defaultOptions['maxFailedQueries']):
+        """
+        Start watching a transaction. Watching a transaction that is already pending returns the same future.
+
+        :param txId: The unique transaction ID to look for
+        :param timeout: The timeout (in seconds) before the polling operation is stopped
+        :param maxFailedQueries: The maximum number of consecutive failures (to find the unconfirmed transaction) before giving up
+        :type txId: string
+        :type timeout: number
+        :type maxFailedQueries: number
+        :return: future resolved with the decoded 'getTransactionById' response once the transaction is confirmed
+        :rtype: `asyncio.Future`
+
+        """
+        if txId in self.pending:
+            return self.pending[txId]['future']
+        loop = asyncio.get_running_loop()
+        self.pending[txId] = {
+            'future': loop.create_future(),
+            'timer': loop.call_later(timeout, self.reject, txId, 'Request timed out, transaction was not included in a block before expiration'),
+            'failedQueries': 0,
+            'maxFailedQueries': maxFailedQueries
+        }
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self.run())
+        return self.pending[txId]['future']
+
+    def unwatch(self, txId):
+        """
+        Stop watching a transaction, cancelling its future
+
+        :param txId: The unique transaction ID to stop looking for
+        :type txId: string
+
+        """
+        entry = self.pending.pop(txId, None)
+        if entry is not None:
+            entry['timer'].cancel()
+            entry['future'].cancel()
+
+    async def close(self):
+        """
+        Stop the polling loop and cancel every pending future
+
+        """
+        for txId in list(self.pending):
+            self.unwatch(txId)
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while self.pending:
+            start = loop.time()
+            await self.tick()
+            if self.pending:
+                await asyncio.sleep(max(0, self.interval - (loop.time() - start)))
+
+    async def tick(self):
+        """
+        Run one polling round over every watched transaction
+
+        """
+        txIds = list(self.pending)
+        responses = await self.lookup('getTransactionById', txIds)
+        unconfirmed = []
+        for txId, response in zip(txIds, responses):
+            if txId not in self.pending:
+                continue
+            if response is not None and isFound(response):
+                entry = self.pending.pop(txId)
+                entry['timer'].cancel()
+                if not entry['future'].done():
+                    entry['future'].set_result(response)
+            else:
+                unconfirmed.append(txId)
+
+        responses = await self.lookup('getTransactionFromMempool', unconfirmed)
+        for txId, response in zip(unconfirmed, responses):
+            entry = self.pending.get(txId)
+            if entry is None:
+                continue
+            if response is not None and isFound(response):
+                entry['failedQueries'] = 0
+            else:
+                entry['failedQueries'] += 1
+                if entry['failedQueries'] >= entry['maxFailedQueries']:
+                    self.reject(txId, 'Unable to find the transaction in the mempool')
+
+    async def lookup(self, methodName, txIds):
+        """
+        Look up many transactions with a single json-rpc batch. A failed request counts as a
+        failed lookup for every transaction in it.
+
+        :param methodName: either 'getTransactionById' or 'getTransactionFromMempool'
+        :param txIds: The unique transaction IDs to look for
+        :type methodName: string
+        :type txIds: list
+        :return: decoded json-rpc response of every lookup (None if the request failed)
+        :rtype: list
+
+        """
+        if not txIds:
+            return []
+        batch = self.requests.batch(self.maxBatchSize)
+        for txId in txIds:
+            getattr(batch, methodName)({'transactionId': txId})
+        try:
+            if isinstance(self.requests, AsyncRequests):
+                return await batch.execute()
+            return await asyncio.get_running_loop().run_in_executor(None, batch.execute)
+        except Exception:
+            return [None] * len(txIds)
+
+    def reject(self, txId, message):
+        entry = self.pending.pop(txId, None)
+        if entry is None:
+            return
+        entry['timer'].cancel()
+        if not entry['future'].done():
+            entry['future'].set_exception(Exception(message))
+
+
+class pollingTx():
+    """
+    Poll the chain provider for a single transaction
+
+    :param requests: chain provider interface used for the lookups
+    :param txId: The unique transaction ID to look for
+    :param options: Optional parameters in dictionary to control the polling behavior (see `Brambl.pollTx`)
+    :type requests: `Requests` or `AsyncRequests` instance
+    :type txId: string
+    :type options: dictionary
+    :return: `pollingTx` object
+    :rtype: instance of `pollingTx`
+
+    """
+    def __init__(self, requests, txId, options = defaultOptions):
+        self.requests = requests
+        self.txId = txId
+        self.options = dict(defaultOptions, **(options or {}))
+
+    async def combined(self):
+        """
+        Poll until the transaction is confirmed, first checking confirmed transactions and then the mempool
+
+        :return: 'getTransactionById' response of the confirmed transaction
+        :rtype: JSON
+
+        """
+        watcher = TxWatcher(self.requests, self.options['interval'])
+        try:
+            response = await watcher.watch(self.txId, self.options['timeout'], self.options['maxFailedQueries'])
+        finally:
+            await watcher.close()
+        return json.dumps(response)
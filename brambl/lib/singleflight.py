@@ -0,0 +1,126 @@
+"""
+singleflight.py
+====================================
+
+Coalescing of identical concurrent calls, used by `Requests` and `AsyncRequests` when created with
+coalesce=True. While a call is in flight, identical calls wait for it and share its result instead
+of being sent again, so a polling spike of N identical queries reaches the node once.
+
+"""
+# Dependencies
+import asyncio
+import threading
+
+
+class Flight():
+    """
+    A call in progress and, once it completes, its outcome
+
+    """
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight():
+    """
+    Coalesce identical calls made concurrently from several threads. The first caller of a key runs
+    the call, callers arriving while it runs block until it completes and receive the same result
+    (or exception). A call made after it completes runs again.
+
+    :return: `SingleFlight` object
+    :rtype: instance of `SingleFlight`
+
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.calls = 0
+        self.shared = 0
+
+    def __len__(self):
+        return len(self.flights)
+
+    def do(self, key, function, *args):
+        """
+        Run function(*args) unless an identical call is already in flight, and return its result
+
+        :param key: identity of the call
+        :param function: function making the call
+        :type key: hashable
+        :type function: function
+        :return: result of the call
+
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = function(*args)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+
+class AsyncSingleFlight():
+    """
+    Coalesce identical calls made concurrently from several coroutines. The call runs as its own task,
+    so cancelling one of the waiting coroutines does not cancel the call for the others.
+
+    :return: `AsyncSingleFlight` object
+    :rtype: instance of `AsyncSingleFlight`
+
+    """
+    def __init__(self):
+        self.flights = {}
+        self.calls = 0
+        self.shared = 0
+
+    def __len__(self):
+        return len(self.flights)
+
+    async def do(self, key, function, *args):
+        """
+        Await function(*args) unless an identical call is already in flight, and return its result
+
+        :param key: identity of the call
+        :param function: coroutine function making the call
+        :type key: hashable
+        :type function: coroutine function
+        :return: result of the call
+
+        """
+        task = self.flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(function(*args))
+            self.flights[key] = task
+            self.calls += 1
+            task.add_done_callback(lambda done: self.finish(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def finish(self, key, task):
+        if self.flights.get(key) is task:
+            del self.flights[key]
+        # the outcome counts as retrieved even if every waiting coroutine was cancelled
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,427 @@
+"""
+loadgen.py
+====================================
+
+Load generator driving a Bifrost node (or the local `bifrostStub`) with a weighted mix of json-rpc
+requests, to size node capacity. Run with:
+    python -m brambl.loadgen --url http://localhost:9085/ --rate 200 --duration 30
+    python -m brambl.loadgen --stub --concurrency 50 --duration 10 --mix balances=1,mempool=1 --json report.json
+
+Two modes are available. With --rate, requests are started on a fixed schedule whatever the response
+times (open loop), and latency is measured from the scheduled start so queueing in the client is
+counted. With --concurrency, that many workers each send their next request as soon as the previous
+one completes (closed loop).
+
+The mix weights the operations 'balances', 'transactionById', 'mempool', 'blockById' and 'transaction'
+(a 'transferAssetsPrototype' request, signing and 'broadcastTx'). Transactions are signed with the key
+given by --keyfile, or with a new key. The report gives the requests, errors, throughput and
+p50/p95/p99 latency of every operation, as text or JSON.
+
+"""
+# Dependencies
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from .Brambl import signPrototype
+from .modules import AsyncRequests
+from .modules import KeyManager
+from .modules import Responses
+from .utils.Tracing import percentile
+
+defaultMix = {
+    'balances': 3,
+    'transactionById': 3,
+    'mempool': 1,
+    'blockById': 2,
+    'transaction': 1
+}
+
+
+def parseMix(text):
+    """
+    Parse a request mix given as comma separated operation=weight pairs
+
+    :param text: request mix (i.e. 'balances=3,mempool=1')
+    :type text: string
+    :return: operation -> weight
+    :rtype: dictionary
+
+    """
+    mix = {}
+    for item in text.split(','):
+        name, separator, weight = item.strip().partition('=')
+        if name not in defaultMix:
+            raise Exception('Unknown operation in the request mix: ' + name)
+        try:
+            mix[name] = float(weight) if separator else 1.0
+        except ValueError:
+            raise Exception('Invalid weight for ' + name + ': ' + weight)
+        if mix[name] < 0:
+            raise Exception('Invalid weight for ' + name + ': ' + weight)
+    if not any(mix.values()):
+        raise Exception('The request mix must give a positive weight to at least one operation')
+    return mix
+
+
+class Recorder():
+    """
+    Latencies and errors of the requests of one operation
+
+    """
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.messages = {}
+
+    def success(self, latency):
+        self.latencies.append(latency)
+
+    def failure(self, latency, message):
+        self.latencies.append(latency)
+        self.errors += 1
+        self.messages[message] = self.messages.get(message, 0) + 1
+
+    def summary(self, elapsed):
+        """
+        :param elapsed: duration of the run in seconds
+        :type elapsed: number
+        :return: 'requests', 'errors', 'errorRate', 'throughput' (requests per second), latency 'mean', 'p50', 'p95', 'p99' and 'max' in seconds,
+            and the most frequent error 'messages'
+        :rtype: dictionary
+
+        """
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        summary = {
+            'requests': count,
+            'errors': self.errors,
+            'errorRate': self.errors / count if count else 0.0,
+            'throughput': count / elapsed if elapsed > 0 else 0.0,
+            'mean': sum(latencies) / count if count else None,
+            'p50': percentile(latencies, 0.5) if count else None,
+            'p95': percentile(latencies, 0.95) if count else None,
+            'p99': percentile(latencies, 0.99) if count else None,
+            'max': latencies[-1] if count else None
+        }
+        summary['messages'] = dict(sorted(self.messages.items(), key = lambda item: -item[1])[:5])
+        return summary
+
+
+class LoadGenerator():
+    """
+    Send a weighted mix of requests to a chain provider and record their latency and errors
+
+    :param requests: chain provider interface
+    :param mix: operation -> weight, defaults to `defaultMix`
+    :param keyManager: unlocked key signing the transactions of the 'transaction' operation, defaults to a new key
+    :param publicKeys: public keys queried by 'balances', defaults to the open keyfiles of the node
+    :param seed: seed of the operation choices, defaults to a random seed
+    :type requests: `AsyncRequests` instance
+    :type mix: dictionary
+    :type keyManager: `KeyManager` instance
+    :type publicKeys: list
+    :type seed: number
+    :return: `LoadGenerator` object
+    :rtype: instance of `LoadGenerator`
+
+    """
+    def __init__(self, requests, mix = None, keyManager = None, publicKeys = None, seed = None):
+        self.requests = requests
+        self.mix = {name: weight for name, weight in (mix or defaultMix).items() if weight > 0}
+        self.keyManager = keyManager
+        self.publicKeys = list(publicKeys or [])
+        self.random = random.Random(seed)
+        self.names = list(self.mix)
+        self.weights = [self.mix[name] for name in self.names]
+        self.recorders = {name: Recorder() for name in self.names}
+        self.blockIds = []
+        self.txIds = []
+        self.operations = {
+            'balances': self.balances,
+            'transactionById': self.transactionById,
+            'mempool': self.mempool,
+            'blockById': self.blockById,
+            'transaction': self.transaction
+        }
+
+    async def setup(self, maxBlocks = 20):
+        """
+        Collect the block ids, transaction ids and public keys queried by the mix, walking back from the
+        best block of the chain
+
+        :param maxBlocks: number of recent blocks to collect, defaults to 20
+        :type maxBlocks: number
+
+        """
+        if 'transaction' in self.mix and self.keyManager is None:
+            self.keyManager = KeyManager.KeyManager('loadgen')
+        if not self.publicKeys:
+            self.publicKeys = self.result(await self.requests.listOpenKeyfiles()) or []
+        if not self.publicKeys and self.keyManager is not None:
+            self.publicKeys = [self.publicKey()]
+        blockId = (self.result(await self.requests.chainInfo()) or {}).get('bestBlockId')
+        while blockId and len(self.blockIds) < maxBlocks:
+            block = self.result(await self.requests.getBlockById({'blockId': blockId}))
+            if not block:
+                break
+            self.blockIds.append(blockId)
+            self.txIds.extend(tx['txHash'] for tx in block.get('txs') or [] if 'txHash' in tx)
+            blockId = block.get('parentId')
+        if ('balances' in self.mix and not self.publicKeys) or ('blockById' in self.mix and not self.blockIds):
+            raise Exception('The chain provider returned no public keys or blocks to query')
+
+    def result(self, body):
+        # result of a json-rpc response body, None if it holds an error
+        response = Responses.loads(body)
+        if not isinstance(response, dict) or 'error' in response:
+            return None
+        return response.get('result')
+
+    def publicKey(self):
+        publicKey = self.keyManager.pk
+        return publicKey.decode('utf-8') if isinstance(publicKey, bytes) else publicKey
+
+    def check(self, body):
+        # raise the json-rpc error of a response body, if any
+        response = Responses.loads(body)
+        if isinstance(response, dict) and 'error' in response:
+            raise Responses.BramblRpcError(response['error'], response.get('id'))
+        return response
+
+    async def balances(self):
+        self.check(await self.requests.getBalancesByKey({'publicKeys': [self.random.choice(self.publicKeys)]}))
+
+    async def transactionById(self):
+        # ids of transactions unknown to the node are answered with an error
+        txId = self.random.choice(self.txIds) if self.txIds else 'unknown'
+        self.check(await self.requests.getTransactionById({'transactionId': txId}))
+
+    async def mempool(self):
+        self.check(await self.requests.getMempool())
+
+    async def blockById(self):
+        self.check(await self.requests.getBlockById({'blockId': self.random.choice(self.blockIds)}))
+
+    async def transaction(self):
+        publicKey = self.publicKey()
+        params = {'issuer': publicKey, 'assetCode': 'loadgen', 'recipient': publicKey, 'sender': [publicKey], 'amount': 1, 'fee': 0, 'data': ''}
+        prototype = self.check(await self.requests.transferAssetsPrototype(params))
+        # signing is CPU bound, so it runs off the event loop to keep the other requests on schedule
+        formattedTx = await asyncio.get_running_loop().run_in_executor(None, signPrototype, prototype, self.keyManager)
+        self.check(await self.requests.broadcastTx({'tx': formattedTx}))
+
+    async def fire(self, name, start):
+        # run one operation and record its latency from start
+        try:
+            await self.operations[name]()
+        except Exception as e:
+            self.recorders[name].failure(time.perf_counter() - start, '%s: %s' % (type(e).__name__, e))
+        else:
+            self.recorders[name].success(time.perf_counter() - start)
+
+    def choose(self):
+        return self.random.choices(self.names, self.weights)[0]
+
+    async def runRate(self, rate, duration):
+        """
+        Start requests at a fixed rate for duration seconds, then wait for the requests in flight
+
+        :param rate: requests started per second
+        :param duration: seconds to start requests for
+        :type rate: number
+        :type duration: number
+        :return: seconds from the first request to the last response
+        :rtype: number
+
+        """
+        start = time.perf_counter()
+        tasks = set()
+        sent = 0
+        while True:
+            scheduled = start + sent / rate
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(self.fire(self.choose(), scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            sent += 1
+        if tasks:
+            await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+    async def runConcurrency(self, concurrency, duration):
+        """
+        Keep concurrency requests in flight for duration seconds, then wait for the requests in flight
+
+        :param concurrency: number of requests in flight
+        :param duration: seconds to start requests for
+        :type concurrency: number
+        :type duration: number
+        :return: seconds from the first request to the last response
+        :rtype: number
+
+        """
+        start = time.perf_counter()
+        deadline = start + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                await self.fire(self.choose(), time.perf_counter())
+
+        await asyncio.gather(*[worker() for i in range(concurrency)])
+        return time.perf_counter() - start
+
+    def report(self, elapsed):
+        """
+        :param elapsed: duration of the run in seconds
+        :type elapsed: number
+        :return: summary (see `Recorder.summary`) of every operation ('methods') and of all of them ('total')
+        :rtype: dictionary
+
+        """
+        total = Recorder()
+        for recorder in self.recorders.values():
+            total.latencies.extend(recorder.latencies)
+            total.errors += recorder.errors
+            for message, count in recorder.messages.items():
+                total.messages[message] = total.messages.get(message, 0) + count
+        return {
+            'elapsed': elapsed,
+            'methods': {name: recorder.summary(elapsed) for name, recorder in self.recorders.items()},
+            'total': total.summary(elapsed)
+        }
+
+
+def formatReport(report):
+    """
+    Format a load generator report as a text table
+
+    :param report: report built by `run`
+    :type report: dictionary
+    :return: report text
+    :rtype: string
+
+    """
+    def milliseconds(value):
+        return '%9.1f' % (value * 1000) if value is not None else '%9s' % '-'
+
+    lines = ['%s against %s for %.1fs' % (report['mode'], report['url'], report['elapsed']), '']
+    lines.append('%-16s %9s %8s %7s %9s %9s %9s %9s %9s' % ('operation', 'requests', 'errors', 'error%', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms'))
+    rows = list(report['methods'].items()) + [('total', report['total'])]
+    for name, summary in rows:
+        lines.append('%-16s %9d %8d %6.2f%% %9.1f %s %s %s %s' % (
+            name, summary['requests'], summary['errors'], summary['errorRate'] * 100, summary['throughput'],
+            milliseconds(summary['p50']), milliseconds(summary['p95']), milliseconds(summary['p99']), milliseconds(summary['max'])))
+    if report['total']['messages']:
+        lines.append('')
+        lines.append('most frequent errors:')
+        for message, count in report['total']['messages'].items():
+            lines.append('%8d  %s' % (count, message))
+    return '\n'.join(lines)
+
+
+async def run(url, duration, rate = None, concurrency = None, mix = None, apiKey = 'topl_the_world!', connections = 100, keyManager = None, publicKeys = None, seed = None):
+    """
+    Drive a chain provider with a request mix and report the results
+
+    :param url: chain provider location
+    :param duration: seconds to send requests for
+    :param rate: requests started per second (open loop), exclusive with concurrency
+    :param concurrency: number of requests kept in flight (closed loop), exclusive with rate
+    :param mix: operation -> weight, defaults to `defaultMix`
+    :param apiKey: access key of the chain provider, defaults to "topl_the_world!"
+    :param connections: maximum number of connections (and requests in flight), defaults to 100
+    :param keyManager: unlocked key signing transactions, defaults to a new key
+    :param publicKeys: public keys queried by 'balances', defaults to the open keyfiles of the node
+    :param seed: seed of the operation choices, defaults to a random seed
+    :type url: string
+    :type duration: number
+    :type rate: number
+    :type concurrency: number
+    :type mix: dictionary
+    :type apiKey: string
+    :type connections: number
+    :type keyManager: `KeyManager` instance
+    :type publicKeys: list
+    :type seed: number
+    :return: report with the 'mode', 'url', 'duration', 'mix' and the summaries of `LoadGenerator.report`
+    :rtype: dictionary
+
+    """
+    if (rate is None) == (concurrency is None):
+        raise Exception('Either a rate or a concurrency must be given')
+    async with AsyncRequests.AsyncRequests(url, apiKey, concurrency = connections, poolMaxSize = connections, maxRetries = 0) as requests:
+        generator = LoadGenerator(requests, mix, keyManager, publicKeys, seed)
+        await generator.setup()
+        if rate is not None:
+            elapsed = await generator.runRate(rate, duration)
+            mode = 'rate %g/s' % rate
+        else:
+            elapsed = await generator.runConcurrency(concurrency, duration)
+            mode = 'concurrency %d' % concurrency
+    report = generator.report(elapsed)
+    report.update({'mode': mode, 'url': url, 'duration': duration, 'mix': generator.mix})
+    return report
+
+
+def main(args = None):
+    parser = argparse.ArgumentParser(prog = 'python -m brambl.loadgen', description = 'Drive a Bifrost node with a weighted mix of json-rpc requests')
+    parser.add_argument('--url', default = 'http://localhost:9085/', help = 'chain provider location')
+    parser.add_argument('--api-key', default = 'topl_the_world!')
+    parser.add_argument('--stub', action = 'store_true', help = 'start a local bifrostStub in this process and drive it instead of --url')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--rate', type = float, help = 'requests started per second (open loop)')
+    group.add_argument('--concurrency', type = int, help = 'requests kept in flight (closed loop), defaults to 10 if no rate is given')
+    parser.add_argument('--duration', type = float, default = 10, help = 'seconds to send requests for')
+    parser.add_argument('--mix', default = ','.join('%s=%d' % item for item in defaultMix.items()), help = 'weighted operations, defaults to %(default)s')
+    parser.add_argument('--connections', type = int, default = 100, help = 'maximum number of connections to the node')
+    parser.add_argument('--keyfile', help = 'keyfile signing the transactions, defaults to a new key')
+    parser.add_argument('--password', default = 'loadgen', help = 'password of the keyfile')
+    parser.add_argument('--public-key', action = 'append', dest = 'publicKeys', help = 'public key queried by balances (may be repeated), defaults to the open keyfiles of the node')
+    parser.add_argument('--seed', type = int, help = 'seed of the operation choices')
+    parser.add_argument('--json', help = "write the report as JSON to this file, '-' for standard output")
+    options = parser.parse_args(args)
+
+    if options.rate is not None and options.rate <= 0:
+        parser.error('the rate must be positive')
+    if options.rate is None and options.concurrency is None:
+        options.concurrency = 10
+    try:
+        mix = parseMix(options.mix)
+    except Exception as e:
+        parser.error(str(e))
+    keyManager = None
+    if options.keyfile:
+        keyManager = KeyManager.KeyManager(options.password, {'keyPath': options.keyfile, 'constants': KeyManager.defaultOptions})
+
+    stub = None
+    url = options.url
+    if options.stub:
+        from .lib.bifrostStub import BifrostStub
+        stub = BifrostStub(apiKey = options.api_key).start()
+        url = stub.url
+    try:
+        report = asyncio.run(run(url, options.duration, options.rate, options.concurrency, mix, options.api_key, options.connections, keyManager, options.publicKeys, options.seed))
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    if options.json == '-':
+        print(json.dumps(report, indent = 2))
+    else:
+        print(formatReport(report))
+        if options.json:
+            with open(options.json, 'w') as file:
+                json.dump(report, file, indent = 2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
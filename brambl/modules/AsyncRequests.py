@@ -0,0 +1,335 @@
+"""
+AsyncRequests.py
+====================================
+
+Non-blocking version of the `Requests` module for use inside an asyncio event loop.
+Every route available on `Requests` (wallet, asset, nodeView and debug) is available here
+with the same parameters, but returns a coroutine that must be awaited.
+
+"""
+# Dependencies
+import asyncio
+import contextvars
+import json
+import time
+import aiohttp
+
+from .Requests import Requests, batchChunks, splitBatchResponse, isReadOnly, gatewayStatuses
+from . import Responses
+from ..lib import singleflight
+from ..utils import Tracing
+
+
+async def AsyncBramblRequest(self, routeInfo, params):
+    """
+    Non-blocking counterpart of `BramblRequest`. Waits for a free concurrency slot, then posts
+    the json-rpc request over the shared connection pool of the `AsyncRequests` instance.
+
+    :param routeInfo: object containing data neccesary for making requests
+    :param routeInfo['route']: specified request route
+    :param routeInfo['method']: request method used
+    :param routeInfo['id']: request id
+    :param params: additional request parameters
+    :type routeInfo: dictionary
+    :type routeInfo['route']: string
+    :type routeInfo['method']: string
+    :type routeInfo['id']: string
+    :type params: dictionary
+    :return: JSON response from the node
+    :rtype: JSON
+
+    """
+    body = {
+        "jsonrpc": "2.0",
+        "id": routeInfo['id'],
+        "method": routeInfo['method'],
+        "params": params
+    }
+    return await AsyncBramblPost(self, routeInfo['route'], body)
+
+
+async def AsyncBramblPost(self, route, body):
+    """
+    Post a json-rpc request object (or batch array) to a route, retrying connection errors, and gateway
+    errors of read-only requests (see `Requests.retryPolicy`)
+
+    :param route: specified request route
+    :param body: formatted json-rpc request or list of requests
+    :type route: string
+    :type body: dictionary or list
+    :return: JSON response from the node
+    :rtype: JSON
+
+    """
+    metrics = self.metrics
+    readOnly = isReadOnly(body)
+    if metrics is None:
+        return await AsyncBramblSend(self, route, {'json': body}, readOnly)
+    # the body is serialized here so its size can be recorded
+    data = json.dumps(body).encode()
+    method = body['method'] if isinstance(body, dict) else 'batch'
+    start = time.perf_counter()
+    try:
+        text = await AsyncBramblSend(self, route, {'data': data}, readOnly)
+    except Exception:
+        metrics.record(route, method, time.perf_counter() - start, len(data), 0, True)
+        raise
+    metrics.record(route, method, time.perf_counter() - start, len(data), len(text.encode()))
+    return text
+
+
+async def AsyncBramblSend(self, route, payload, readOnly):
+    # post the payload (json or data keyword of aiohttp) with retries, waiting for a free concurrency slot for every attempt;
+    # gateway errors are only retried for read-only requests, which cannot be applied twice
+    session = self.getSession()
+    semaphore = self.getSemaphore()
+    attempt = 0
+    while True:
+        try:
+            async with semaphore:
+                async with session.post(self.url+route, headers = self.headers, **payload) as response:
+                    if response.status not in gatewayStatuses or not readOnly or attempt >= self.maxRetries:
+                        if response.status != 200:
+                            raise Exception('A connection could not be established')
+                        return await response.text()
+        except aiohttp.ClientConnectorError:
+            if attempt >= self.maxRetries:
+                raise
+        # the slot is released during the backoff, so a retrying request does not hold back the others
+        await asyncio.sleep(self.backoffFactor * (2 ** attempt))
+        attempt += 1
+
+
+class AsyncRequests(Requests):
+    """
+    A class for sending non-blocking requests to the Brambl layer interface of the given chain provider
+
+    All requests made through one `AsyncRequests` instance share a single connection pool, and at most `concurrency`
+    requests are in flight at any time; further requests wait for a free slot instead of opening
+    new connections. The underlying HTTP session is created on first use inside the running event loop, and
+    recreated if the instance is later used from another event loop.
+
+    :param url: Chain provider location, defaults to "http://localhost:9085/"
+    :param apiKey: Access key for authorizing requests to the client API, defaults to "topl_the_world!"
+    :param concurrency: maximum number of requests in flight at once, defaults to 100
+    :param poolMaxSize: maximum number of connections kept open per host, defaults to 100
+    :param maxRetries: number of retries on connection errors, and on gateway errors of read-only methods, defaults to 3
+    :param backoffFactor: exponential backoff factor in seconds between retries, defaults to 0.3
+    :param maxBatchSize: maximum number of requests sent in one json-rpc batch, defaults to 100
+    :param decode: return decoded results (see `Responses`) instead of the raw json-rpc response, defaults to False
+    :param cache: cache for read-only responses, True for a `ResponseCache` with the default policies, defaults to no caching
+    :param coalesce: share one request between identical read-only calls made concurrently (see `singleflight`), defaults to False
+    :param metrics: per-method request metrics, True for a new `Metrics.RpcMetrics`, defaults to no metrics
+    :type url: string
+    :type apiKey: string
+    :type concurrency: number
+    :type poolMaxSize: number
+    :type maxRetries: number
+    :type backoffFactor: number
+    :type maxBatchSize: number
+    :type decode: boolean
+    :type cache: `ResponseCache` instance or boolean
+    :type coalesce: boolean
+    :type metrics: `Metrics.RpcMetrics` instance or boolean
+    :return: `AsyncRequests` object
+    :rtype: instance of `AsyncRequests`
+
+    """
+    def __init__(self, url = 'http://localhost:9085/', apiKey = 'topl_the_world!', concurrency = 100, poolMaxSize = 100, maxRetries = 3, backoffFactor = 0.3, maxBatchSize = 100, decode = False, cache = None, coalesce = False, metrics = None):
+        self.concurrency = concurrency
+        self.semaphore = None
+        self.loop = None
+        Requests.__init__(self, url, apiKey, poolConnections = 1, poolMaxSize = poolMaxSize, maxRetries = maxRetries, backoffFactor = backoffFactor, maxBatchSize = maxBatchSize, decode = decode, cache = cache, coalesce = coalesce, metrics = metrics)
+
+    def createSession(self):
+        # the aiohttp session must be created inside the running event loop, see getSession
+        return None
+
+    def createFlights(self):
+        # calls are coalesced between coroutines of the running event loop
+        return singleflight.AsyncSingleFlight()
+
+    def bindLoop(self):
+        # the session and semaphore belong to the event loop they were created in, so both are
+        # recreated when the instance is used from another loop (i.e. a later asyncio.run)
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.session = None
+            self.semaphore = None
+
+    def getSession(self):
+        """
+        Getter for the shared HTTP session, creating it on first use in the running event loop
+
+        :return: HTTP session bound to the running event loop
+        :rtype: `aiohttp.ClientSession`
+
+        """
+        self.bindLoop()
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit = self.poolMaxSize, limit_per_host = self.poolMaxSize)
+            self.session = aiohttp.ClientSession(connector = connector)
+        return self.session
+
+    def getSemaphore(self):
+        """
+        Getter for the semaphore limiting the number of requests in flight, creating it on first use in the running event loop
+
+        :return: semaphore with `concurrency` slots
+        :rtype: `asyncio.Semaphore`
+
+        """
+        self.bindLoop()
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self.semaphore
+
+    async def sendRequest(self, routeInfo, params):
+        """
+        Send a single json-rpc request without blocking the event loop and return the raw response body,
+        or its decoded result if the instance was created with decode=True. Responses of cached methods
+        are served from the cache when possible, and identical read-only calls are coalesced if the
+        instance was created with coalesce=True.
+
+        :param routeInfo: object containing the route, method and id of the request
+        :param params: body parameters passed to the specified json-rpc method
+        :type routeInfo: dictionary
+        :type params: dictionary
+        :return: json-rpc response from the chain
+        :rtype: JSON, or a result object (see `Responses.decodeResult`)
+        :raises Responses.BramblRpcError: in decoded mode, if the chain returns a json-rpc error
+
+        """
+        with Tracing.span('requests.sendRequest', route = routeInfo['route'], method = routeInfo['method']) as span:
+            key = self.cacheKey(routeInfo, params)
+            if key is not None:
+                body = self.cache.get(key, routeInfo['id'])
+                if body is not None:
+                    span.setAttribute('cached', True)
+                    return self.readResponse(routeInfo['method'], body)
+            flightKey = self.flightKey(routeInfo, params)
+            if flightKey is not None:
+                body = await self.flights.do(flightKey, self.fetchBody, routeInfo, params, key)
+            else:
+                body = await self.fetchBody(routeInfo, params, key)
+            return self.readResponse(routeInfo['method'], body)
+
+    async def fetchBody(self, routeInfo, params, key):
+        # send the request and store the response body under the cache key, if any
+        body = await AsyncBramblRequest(self, routeInfo, params)
+        if key is not None:
+            self.cache.put(key, body)
+        return body
+
+    async def sendStreamRequest(self, routeInfo, params, path, chunkSize = 65536):
+        """
+        Send a single json-rpc request and yield the elements of one array of its response as they are
+        received (see `Requests.sendStreamRequest`). The request holds a concurrency slot until the
+        response is fully read, and is not retried since elements may already have been yielded.
+
+        :param routeInfo: object containing the route, method and id of the request
+        :param params: body parameters passed to the specified json-rpc method
+        :param path: keys of the objects enclosing the array in the response
+        :param chunkSize: number of bytes read from the connection at a time, defaults to 64kb
+        :type routeInfo: dictionary
+        :type params: dictionary
+        :type path: list
+        :type chunkSize: number
+        :return: array elements of the json-rpc response
+        :rtype: async generator
+        :raises Responses.BramblRpcError: if the chain returns a json-rpc error
+
+        """
+        body = {
+            "jsonrpc": "2.0",
+            "id": routeInfo['id'],
+            "method": routeInfo['method'],
+            "params": params
+        }
+        metrics = self.metrics
+        start = time.perf_counter() if metrics is not None else 0
+        received = 0
+        failed = True
+        session = self.getSession()
+        try:
+            async with self.getSemaphore():
+                async with session.post(self.url+routeInfo['route'], json= body, headers = self.headers) as response:
+                    if response.status != 200:
+                        raise Exception('A connection could not be established')
+                    stream = Responses.ArrayStream(path)
+                    async for chunk in response.content.iter_chunked(chunkSize):
+                        received += len(chunk)
+                        for element in stream.feed(chunk):
+                            yield Responses.decodeElement(routeInfo['method'], element) if self.decode else element
+                    for element in stream.close():
+                        yield Responses.decodeElement(routeInfo['method'], element) if self.decode else element
+                    failed = False
+        finally:
+            if metrics is not None:
+                sent = len(json.dumps(body).encode())
+                metrics.record(routeInfo['route'], routeInfo['method'], time.perf_counter() - start, sent, received, failed)
+
+    async def sendBatch(self, calls, maxBatchSize):
+        """
+        Send queued calls as json-rpc batches, all batches concurrently, and split the responses back into per-call results
+
+        :param calls: queued calls, each an object with a 'route' and a json-rpc 'body' whose id is its index
+        :param maxBatchSize: maximum number of requests in a single batch
+        :type calls: list
+        :type maxBatchSize: number
+        :return: json-rpc response object (containing either 'result' or 'error') of every call, in call order
+        :rtype: list
+
+        """
+        results = [None] * len(calls)
+        chunks = batchChunks(calls, maxBatchSize)
+        responses = await asyncio.gather(*[AsyncBramblPost(self, route, bodies) for route, bodies in chunks])
+        for (route, bodies), response in zip(chunks, responses):
+            splitBatchResponse(bodies, Responses.loads(response), results)
+        return results
+
+    async def close(self):
+        """
+        Close all pooled connections. A new pool is opened if the instance is used again.
+
+        """
+        # a session left by another event loop can not be closed from this one
+        if self.session is not None and self.loop is asyncio.get_running_loop():
+            await self.session.close()
+        self.session = None
+
+    def __enter__(self):
+        # the session can only be closed from a coroutine, see `close`
+        raise Exception('AsyncRequests must be used with "async with", not "with"')
+
+    def __exit__(self, *args):
+        raise Exception('AsyncRequests must be used with "async with", not "with"')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+async def awaitRequest(requests, methodName, *args):
+    """
+    Call a route method on either a `Requests` or an `AsyncRequests` instance without blocking the event loop.
+    Blocking `Requests` calls are handed to the default executor of the running loop.
+
+    :param requests: chain provider interface
+    :param methodName: name of the route method to call (i.e. 'getTransactionById')
+    :param args: positional arguments passed to the route method
+    :type requests: `Requests` or `AsyncRequests` instance
+    :type methodName: string
+    :return: json-rpc response from the chain
+    :rtype: JSON
+
+    """
+    method = getattr(requests, methodName)
+    if isinstance(requests, AsyncRequests):
+        return await method(*args)
+    # the call runs in the context of the caller so its spans are attached to the current span (see `Tracing`)
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, lambda: context.run(method, *args))
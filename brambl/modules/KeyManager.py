@@ -11,18 +11,23 @@ https://github.com/Ethereumjs/keythereum
 import os
 import sys
 import datetime
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from Crypto.Hash import BLAKE2b
 from Crypto.Hash import keccak
 from Crypto.Random import get_random_bytes
 from Crypto.Protocol.KDF import scrypt
 import axolotl_curve25519 as curve
-import base58
 import json
 from binascii import hexlify
-import pyaes
 import jks
 from os import urandom
 
+from ..utils import CrypTools
+from ..utils import Base58
+from ..utils import Tracing
+
 
 
 # Default options for key generation as of 2020.08.01
@@ -46,6 +51,139 @@ defaultOptions = {
     }
 }
 
+# Derived key cache
+
+class DerivedKeyCache():
+    """
+    Bounded, process-local cache of keys derived with scrypt. Entries are keyed by a hash of the
+    password together with the salt and kdf parameters, so a key derived once (i.e. when a keyfile is
+    created) is not derived again when the same keyfile is opened. The password hash is keyed with a
+    random secret generated for this process only, and nothing is ever written to disk.
+
+    Least recently used entries are evicted once maxSize is exceeded. Evicted entries are overwritten
+    with zeros; copies already handed out to callers are not.
+
+    :param maxSize: maximum number of derived keys held, 0 disables the cache, defaults to 64
+    :type maxSize: number
+    :return: `DerivedKeyCache` object
+    :rtype: instance of `DerivedKeyCache`
+
+    """
+    def __init__(self, maxSize = 64):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.secret = get_random_bytes(32)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def cacheKey(self, password, salt, kdfParams):
+        """
+        Build the cache key for a derivation
+
+        :param password: User-supplied password.
+        :param salt: Randomly generated salt.
+        :param kdfParams: key-derivation parameters
+        :type password: string
+        :type salt: bytes
+        :type kdfParams: dictionary
+        :return: cache key
+        :rtype: tuple
+
+        """
+        if isinstance(password, str):
+            password = password.encode('utf-8')
+        blake = BLAKE2b.new(digest_bits=256, key=self.secret)
+        blake.update(password)
+        return (blake.digest(), bytes(salt), kdfParams['dkLen'], kdfParams['n'], kdfParams['r'], kdfParams['p'])
+
+    def get(self, key):
+        """
+        Look up a derived key
+
+        :param key: cache key built by `cacheKey`
+        :type key: tuple
+        :return: copy of the derived key, or None if it is not cached
+        :rtype: bytes
+
+        """
+        with self.lock:
+            derivedKey = self.entries.get(key)
+            if derivedKey is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return bytes(derivedKey)
+
+    def put(self, key, derivedKey):
+        """
+        Store a derived key, evicting the least recently used entries if the cache is full
+
+        :param key: cache key built by `cacheKey`
+        :param derivedKey: Secret key derived from password
+        :type key: tuple
+        :type derivedKey: bytes
+
+        """
+        if self.maxSize <= 0:
+            return
+        with self.lock:
+            if key in self.entries:
+                zeroize(self.entries.pop(key))
+            self.entries[key] = bytearray(derivedKey)
+            while len(self.entries) > self.maxSize:
+                zeroize(self.entries.popitem(last=False)[1])
+
+    def evict(self, password, salt, kdfParams):
+        """
+        Remove and zero a single derived key
+
+        :param password: User-supplied password.
+        :param salt: Randomly generated salt.
+        :param kdfParams: key-derivation parameters
+        :type password: string
+        :type salt: bytes
+        :type kdfParams: dictionary
+
+        """
+        key = self.cacheKey(password, salt, kdfParams)
+        with self.lock:
+            derivedKey = self.entries.pop(key, None)
+            if derivedKey is not None:
+                zeroize(derivedKey)
+
+    def clear(self):
+        """
+        Remove and zero every derived key
+
+        """
+        with self.lock:
+            for derivedKey in self.entries.values():
+                zeroize(derivedKey)
+            self.entries.clear()
+
+
+def zeroize(buffer):
+    """
+    Overwrite a mutable buffer with zeros in place
+
+    :param buffer: buffer holding secret data
+    :type buffer: bytearray
+
+    """
+    buffer[:] = bytes(len(buffer))
+
+
+# Process wide cache used by deriveKey
+derivedKeyCache = DerivedKeyCache()
+
+# Type prefix of PublicKeyCurve25519 propositions and signatures
+propositionPrefix = bytes.fromhex("01")
+
 # Generic key methods
 
 
@@ -66,7 +204,7 @@ def str2pybuf(string,enc='base58'):#works
         string2 = bytes(string)
 
     if enc == 'base58':
-        return base58.b58decode(string)
+        return Base58.decode(string)
 
 
 def encrypt(plaintext,key,iv,algo):
@@ -87,9 +225,7 @@ def encrypt(plaintext,key,iv,algo):
     """
     iv = int(hexlify(iv).decode('utf-8'),16)
     if algo == 'aes-256-ctr':
-        key = bytearray(key)
-        aes = pyaes.AESModeOfOperationCTR(key,pyaes.Counter(iv))
-        ciphertext = aes.encrypt(plaintext)
+        ciphertext = CrypTools.getCipherBackend().encrypt(plaintext,key,iv)
         return ciphertext
 
 
@@ -111,8 +247,7 @@ def decrypt(ciphertext,key,iv,algo):
     """ 
     iv = int(hexlify(iv).decode('utf-8'),16)
     if algo == 'aes-256-ctr':
-        aes = pyaes.AESModeOfOperationCTR(key,pyaes.Counter(iv))
-        return aes.decrypt(ciphertext)
+        return CrypTools.getCipherBackend().decrypt(ciphertext,key,iv)
 
 def getMAC(derivedKey,ciphertext):
     """
@@ -171,6 +306,7 @@ def create(params):
 def deriveKey(password,salt,kdfParams):
     """
     Derive secret key from password with key derivation function.
+    Keys are served from `derivedKeyCache` when the same derivation was already made in this process.
 
     :param password: User-supplied password.
     :param salt: Randomly generated salt.
@@ -189,7 +325,14 @@ def deriveKey(password,salt,kdfParams):
     r = kdfParams['r']
     p = kdfParams['p']
 
-    return scrypt(password,salt,dkLen,N,r,p,num_keys=1)
+    with Tracing.span('keyManager.deriveKey', n = N, r = r, p = p) as span:
+        key = derivedKeyCache.cacheKey(password,salt,kdfParams)
+        derivedKey = derivedKeyCache.get(key)
+        span.setAttribute('cached', derivedKey is not None)
+        if derivedKey is None:
+            derivedKey = scrypt(password,salt,dkLen,N,r,p,num_keys=1)
+            derivedKeyCache.put(key,derivedKey)
+        return derivedKey
 
 
 def marshal(derivedKey,keyObject,salt,iv,algo):
@@ -214,14 +357,14 @@ def marshal(derivedKey,keyObject,salt,iv,algo):
     if algo == 'aes-256-ctr':
         ciphertext = encrypt(keyObject['privateKey'],derivedKey,iv, 'aes-256-ctr')
         keyStorage = {
-            'publicKeyId': base58.b58encode(keyObject['publicKey']),
+            'publicKeyId': Base58.encode(keyObject['publicKey']),
             'crypto': {
                 'cipher': algo,
-                'cipherText': base58.b58encode(ciphertext),
-                'cipherParams': {'iv': base58.b58encode(iv)},
-                'mac': base58.b58encode(getMAC(derivedKey,ciphertext)),
+                'cipherText': Base58.encode(ciphertext),
+                'cipherParams': {'iv': Base58.encode(iv)},
+                'mac': Base58.encode(getMAC(derivedKey,ciphertext)),
                 'kdf': 'scrypt',
-                'kdfSalt': base58.b58encode(salt)
+                'kdfSalt': Base58.encode(salt)
             }
         }
     return keyStorage
@@ -341,6 +484,38 @@ def string2Bytes(keyStorage):
     }
     return Bytes
 
+def writeKeyStorage(keyStorage,keyPath):
+    """
+    Write a keystore object to a new keyfile in a keystore folder
+
+    :param keyStorage: keystore object in the Bifrost compatible (string) format
+    :param keyPath: Path to keystore folder
+    :type keyStorage: dictionary
+    :type keyPath: string
+    :return: JSON filename
+    :rtype: string
+
+    """
+    outpath = os.path.join(keyPath,generateKeystoreFilename(keyStorage['publicKeyId']))
+    with open(outpath, 'w') as f:
+        f.write(json.dumps(keyStorage))
+    return outpath
+
+def generateKeyStorage(password,options):
+    """
+    Generate a new curve25519 key pair and encrypt it to a keystore object.
+    Module level so that it can be run in worker processes by `KeyManager.generateMany`.
+
+    :param password: password for encrypting the keyfile
+    :param options: encryption options
+    :type password: string
+    :type options: dictionary
+    :return: keystore object in the Bifrost compatible (string) format
+    :rtype: dictionary
+
+    """
+    return byte2String(dump(password, create(options), options))
+
 # Key Manager Class
 
 class KeyManager():
@@ -367,9 +542,14 @@ class KeyManager():
             self.isLocked = False
             self.password = password
             self.__keyStorage = keyStorage
+            self.propositionBytes = None
+            self.proposition = None
 
             if self.pk: #check if public key exists
                 self.__sk = recover(password, self.__keyStorage, self.constants['scrypt'])[0:32]
+                # PublicKeyCurve25519 proposition (type prefix 01 + public key) used when signing transactions
+                self.propositionBytes = propositionPrefix + Base58.decode(self.pk)
+                self.proposition = Base58.encode(self.propositionBytes).decode('utf-8')
 
         
         def generateKey(password):
@@ -416,9 +596,25 @@ class KeyManager():
         :rtype: boolean
 
         """
-        if curve.verifySignature(base58.b58decode(publicKey), message.encode('utf-8'), signature) == 0:#retunrs -1 if not verified 0 if verified
+        if curve.verifySignature(Base58.decode(publicKey), message.encode('utf-8'), signature) == 0:#retunrs -1 if not verified 0 if verified
             return True
-        return 'not verfied'
+        return False
+
+    @staticmethod
+    def verifyMany(triples, workers = None):
+        """
+        Check many signatures at once (see `CrypTools.sigverifyMany`). Large batches are verified
+        in parallel over a pool of worker processes.
+
+        :param triples: (publicKey, message, signature) triples. Public keys and signatures may be raw bytes or base58 encoded
+        :param workers: number of worker processes, defaults to the number of CPUs
+        :type triples: iterable
+        :type workers: number
+        :return: compact boolean array with one byte per triple, 1 if the signature is valid and 0 otherwise
+        :rtype: bytearray
+
+        """
+        return CrypTools.sigverifyMany(triples, workers)
 
   
     def getKeyStorage(self):
@@ -470,7 +666,8 @@ class KeyManager():
         """
         if self.isLocked:
             raise Exception('The key is currently locked. Please unlock and try again.')
-        return curve.calculateSignature(urandom(64), self.__sk, message)
+        with Tracing.span('keyManager.sign', size = len(message)):
+            return curve.calculateSignature(urandom(64), self.__sk, message)
 
     
     def exportToFile(self, _keyPath):
@@ -488,40 +685,267 @@ class KeyManager():
         except:
             keyPath = 'keyfiles'
 
-        outfile = generateKeystoreFilename(self.pk.decode('utf-8'))
-        JSON = json.dumps(self.getKeyStorage())
-        outpath = os.path.join(keyPath,outfile)
-
-        f = open(outpath, 'w')
-        f.write(JSON)
-        f.close()
-        return outpath
-
-
-
-
-
-
-
-
-
-
-
-
+        return writeKeyStorage(self.getKeyStorage(),keyPath)
 
+    @staticmethod
+    def generateMany(n, password, workers = None, keyPath = None, constants = defaultOptions):
+        """
+        Generate many keyfiles at once, spreading key generation and keystore encryption
+        (including the memory-hard scrypt derivation) over a pool of worker processes.
+        Keystores are streamed out in the order they are completed; at most two keys per
+        worker are in progress at any time so memory stays bounded for large n.
+
+        :param n: number of keys to generate
+        :param password: password for encrypting the keyfiles
+        :param workers: number of worker processes, defaults to the number of CPUs
+        :param keyPath: Path to a keystore folder to write the keyfiles to (optional)
+        :param constants: encryption options, defaults to `defaultOptions`
+        :type n: number
+        :type password: string
+        :type workers: number
+        :type keyPath: string
+        :type constants: dictionary
+        :return: keystore objects in the Bifrost compatible format, or the keyfile paths if keyPath is given
+        :rtype: generator
 
+        """
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            maxInFlight = 2 * workers
+            submitted = 0
+            inFlight = set()
+            while submitted < n or inFlight:
+                while submitted < n and len(inFlight) < maxInFlight:
+                    inFlight.add(pool.submit(generateKeyStorage, password, constants))
+                    submitted += 1
+                done, inFlight = wait(inFlight, return_when = FIRST_COMPLETED)
+                for future in done:
+                    keyStorage = future.result()
+                    if keyPath is not None:
+                        yield writeKeyStorage(keyStorage,keyPath)
+                    else:
+                        yield keyStorage
+
+
+# Keystore directory
+
+class KeystoreDirectory():
+    """
+    A directory of keyfiles with a persistent index from publicKeyId to keyfile, so that keyfiles can be
+    found without listing and parsing every file of the directory.
 
+    The index is stored in a subdirectory of the keystore (`indexDir`), so that writing it does not change the
+    modification time of the keystore directory, and records the modification time and size of every keyfile. On open, the directory is only rescanned if its modification time changed since the index
+    was written, and even then only new or changed keyfiles are parsed. Lookups check the modification time
+    and size of the keyfile they return, so an index entry is never trusted for a file that has changed.
 
+    :param keyPath: Path to keystore folder
+    :type keyPath: string
+    :return: `KeystoreDirectory` object
+    :rtype: instance of `KeystoreDirectory`
 
+    """
+    indexDir = '.keystore-index'
+    indexFile = 'index.json'
+    indexVersion = 1
+
+    def __init__(self, keyPath):
+        self.keyPath = keyPath
+        self.lock = threading.RLock()
+        self.files = {}
+        self.byKey = {}
+        self.dirMtime = None
+        self.dirty = False
+        self.loadIndex()
+        self.refresh()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.save()
+
+    def __len__(self):
+        self.checkDirectory()
+        return len(self.byKey)
+
+    def __contains__(self, publicKeyId):
+        return self.find(publicKeyId) is not None
+
+    def loadIndex(self):
+        try:
+            with open(os.path.join(self.keyPath, self.indexDir, self.indexFile)) as f:
+                index = json.loads(f.read())
+            if index['version'] != self.indexVersion:
+                return
+            self.files = {name: tuple(entry) for name, entry in index['files'].items()}
+            self.dirMtime = index['dirMtime']
+        except (OSError, ValueError, KeyError, TypeError):
+            # a missing or unreadable index is rebuilt from the directory
+            self.files = {}
+            self.dirMtime = None
+        self.byKey = {entry[0]: name for name, entry in self.files.items() if entry[0]}
+
+    def save(self):
+        """
+        Write the index to disk if it changed. The write is atomic, so a concurrent reader sees either the old or the new index.
 
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            indexDir = os.path.join(self.keyPath, self.indexDir)
+            if not os.path.isdir(indexDir):
+                upToDate = os.stat(self.keyPath).st_mtime_ns == self.dirMtime
+                os.mkdir(indexDir)
+                if upToDate:
+                    # creating the index directory does not change any keyfile
+                    self.dirMtime = os.stat(self.keyPath).st_mtime_ns
+            dirMtime = self.dirMtime
+            # a directory changed within the timestamp resolution of the filesystem may change again
+            # without its modification time moving, so such an index must be rescanned when opened
+            if dirMtime is not None and datetime.datetime.now().timestamp() - dirMtime / 1e9 < 2:
+                dirMtime = None
+            index = {'version': self.indexVersion, 'dirMtime': dirMtime, 'files': self.files}
+            tmpPath = os.path.join(indexDir, self.indexFile + '.tmp')
+            with open(tmpPath, 'w') as f:
+                f.write(json.dumps(index, separators=(',', ':')))
+            os.replace(tmpPath, os.path.join(indexDir, self.indexFile))
+            self.dirty = False
+
+    def checkDirectory(self):
+        # a directory's modification time changes whenever a file is added, removed or renamed
+        if os.stat(self.keyPath).st_mtime_ns != self.dirMtime:
+            self.refresh()
+
+    def refresh(self):
+        """
+        Bring the index up to date with the directory, parsing only keyfiles that are new or changed
 
-        
+        """
+        with self.lock:
+            dirMtime = os.stat(self.keyPath).st_mtime_ns
+            if dirMtime == self.dirMtime:
+                return
+            seen = set()
+            with os.scandir(self.keyPath) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.json') or not entry.is_file():
+                        continue
+                    seen.add(entry.name)
+                    stat = entry.stat()
+                    known = self.files.get(entry.name)
+                    if known is None or known[1] != stat.st_mtime_ns or known[2] != stat.st_size:
+                        self.indexKeyfile(entry.name, stat)
+            for name in set(self.files) - seen:
+                self.forget(name)
+            # the index records the directory's modification time, so it is written even if no keyfile changed
+            self.dirMtime = dirMtime
+            self.dirty = True
+        self.save()
+
+    def indexKeyfile(self, name, stat):
+        # parse a keyfile and record it, files that are not keystores are recorded without a key
+        try:
+            with open(os.path.join(self.keyPath, name)) as f:
+                publicKeyId = json.loads(f.read())['publicKeyId']
+        except (OSError, ValueError, KeyError, TypeError):
+            publicKeyId = None
+        self.forget(name)
+        self.files[name] = (publicKeyId, stat.st_mtime_ns, stat.st_size)
+        if publicKeyId:
+            self.byKey[publicKeyId] = name
+        self.dirty = True
+
+    def forget(self, name):
+        entry = self.files.pop(name, None)
+        if entry is not None and self.byKey.get(entry[0]) == name:
+            del self.byKey[entry[0]]
+        self.dirty = True
+
+    def find(self, publicKeyId):
+        """
+        Find the keyfile of a public key
 
+        :param publicKeyId: Base58 encoded public key
+        :type publicKeyId: string
+        :return: path to the keyfile, or None if there is no keyfile for this key
+        :rtype: string
 
+        """
+        if isinstance(publicKeyId, bytes):
+            publicKeyId = publicKeyId.decode('utf-8')
+        with self.lock:
+            for attempt in range(2):
+                name = self.byKey.get(publicKeyId)
+                if name is None:
+                    self.checkDirectory()
+                    name = self.byKey.get(publicKeyId)
+                    if name is None:
+                        return None
+                path = os.path.join(self.keyPath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # the keyfile was removed or renamed since it was indexed, rescan on the next attempt
+                    self.forget(name)
+                    self.dirMtime = None
+                    continue
+                entry = self.files[name]
+                if entry[1] != stat.st_mtime_ns or entry[2] != stat.st_size:
+                    self.indexKeyfile(name, stat)
+                    if self.files[name][0] != publicKeyId:
+                        continue
+                return path
+            return None
+
+    def list(self):
+        """
+        List the public keys of all keyfiles in the directory
 
+        :return: Base58 encoded public keys
+        :rtype: list
 
+        """
+        with self.lock:
+            self.checkDirectory()
+            return list(self.byKey)
 
+    def importKey(self, publicKeyId, password, constants = None):
+        """
+        Open the keyfile of a public key
 
+        :param publicKeyId: Base58 encoded public key
+        :param password: password for decrypting the keyfile
+        :param constants: encryption options of the keyfile, defaults to `defaultOptions`
+        :type publicKeyId: string
+        :type password: string
+        :type constants: dictionary
+        :return: `KeyManager` object
+        :rtype: instance of `KeyManager`
 
+        """
+        path = self.find(publicKeyId)
+        if path is None:
+            raise Exception('No keyfile found for this public key')
+        kwargs = {'keyPath': path}
+        if constants is not None:
+            kwargs['constants'] = constants
+        return KeyManager(password, kwargs)
+
+    def add(self, key):
+        """
+        Write a key to a new keyfile in the directory and add it to the index.
+        The index is written to disk by `save` (or when leaving a `with` block).
 
+        :param key: key to store
+        :type key: `KeyManager` instance or keystore object in the Bifrost compatible format
+        :return: path to the new keyfile
+        :rtype: string
 
+        """
+        keyStorage = key.getKeyStorage() if isinstance(key, KeyManager) else key
+        with self.lock:
+            path = writeKeyStorage(keyStorage, self.keyPath)
+            self.indexKeyfile(os.path.basename(path), os.stat(path))
+            return path
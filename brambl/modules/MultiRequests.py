@@ -0,0 +1,447 @@
+"""
+MultiRequests.py
+====================================
+
+Version of the `Requests` module spreading requests over several Bifrost nodes. Reads are load
+balanced over the healthy nodes, failing nodes are ejected and retried later, and writes go to a
+preferred node or to every node. Every route available on `Requests` is available with the same parameters.
+
+"""
+# Dependencies
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .Requests import Requests, BramblRequest, BramblBatchRequest, BramblStreamRequest, batchChunks, splitBatchResponse, readOnlyMethods
+from . import Responses
+from ..utils import Metrics
+
+# json-rpc methods answered from the keyfiles or blocks of the node itself, always sent to the preferred node
+nodeLocalMethods = frozenset(['listOpenKeyfiles', 'generateKeyfile', 'lockKeyfile', 'unlockKeyfile', 'signTx', 'myBlocks',
+                              'transferPolys', 'transferArbits', 'createAssets', 'transferAssets', 'transferTargetAssets'])
+
+# json-rpc methods that may be answered by any node
+balancedMethods = (readOnlyMethods - nodeLocalMethods) | frozenset(['createAssetsPrototype', 'transferAssetsPrototype', 'transferTargetAssetsPrototype'])
+
+# json-rpc methods sent according to the write mode
+writeMethods = frozenset(['broadcastTx'])
+
+# weight of the newest sample in the moving average of node latency
+latencySmoothing = 0.3
+
+
+class Node():
+    """
+    A chain provider of a `MultiRequests` instance, with the statistics used to pick nodes
+
+    :param url: Chain provider location
+    :param requests: instance sending the requests to this node
+    :param healthRequests: instance sending the health checks to this node, defaults to requests
+    :type url: string
+    :type requests: `Requests` instance
+    :type healthRequests: `Requests` instance
+    :return: `Node` object
+    :rtype: instance of `Node`
+
+    """
+    def __init__(self, url, requests, healthRequests = None):
+        self.url = url
+        self.requests = requests
+        self.healthRequests = healthRequests or requests
+        self.outstanding = 0
+        self.latency = None
+        self.failures = 0
+        self.ejectedUntil = 0
+        self.requestCount = 0
+        self.errorCount = 0
+
+    def available(self, now):
+        """
+        :param now: current `time.monotonic` time
+        :type now: number
+        :return: whether the node is not ejected
+        :rtype: boolean
+
+        """
+        return self.ejectedUntil <= now
+
+    def stats(self):
+        """
+        :return: snapshot of the statistics of the node
+        :rtype: dictionary
+
+        """
+        return {
+            'url': self.url,
+            'available': self.available(time.monotonic()),
+            'outstanding': self.outstanding,
+            'latency': self.latency,
+            'failures': self.failures,
+            'requests': self.requestCount,
+            'errors': self.errorCount
+        }
+
+
+class MultiRequests(Requests):
+    """
+    A class for sending requests to the Brambl layer interface of several chain providers
+
+    Read-only requests are spread over the available nodes, either to the node with the fewest requests
+    in flight ('leastOutstanding') or at random weighted by the inverse of the recent latency of each node
+    ('latency'). A request failing on a node is sent to the next available node, and a node failing
+    maxFailures requests in a row is ejected for ejectTime seconds. With healthInterval set, a background
+    thread queries 'chainInfo' on every node at that interval, ejecting unresponsive nodes and restoring
+    recovered ones; `checkHealth` runs a single round. A health check not answered within healthTimeout
+    seconds counts as a failure.
+
+    'broadcastTx' goes to the preferred node (falling back to the other nodes in order) with writeMode
+    'preferred', or to every available node at once with writeMode 'all'. Requests that depend on the keyfiles
+    or blocks of a node (keyfile management, signing, legacy transfer routes, myBlocks) always go to the
+    preferred node.
+
+    :param urls: Chain provider locations
+    :param apiKey: Access key for authorizing requests to the client API, defaults to "topl_the_world!"
+    :param strategy: node selection for reads, 'leastOutstanding' or 'latency', defaults to 'leastOutstanding'
+    :param writeMode: where writes are sent, 'preferred' or 'all', defaults to 'preferred'
+    :param preferred: index in urls of the preferred node, defaults to 0
+    :param healthInterval: interval (in seconds) between background health checks, defaults to no background checks
+    :param maxFailures: number of consecutive failures after which a node is ejected, defaults to 3
+    :param ejectTime: time (in seconds) a node stays ejected unless a health check restores it, defaults to 30
+    :param poolMaxSize: maximum number of connections kept alive (and open at once) per node, defaults to 10
+    :param maxRetries: number of retries on the same node, defaults to 0 since failed requests go to the next node
+    :param backoffFactor: exponential backoff factor in seconds between retries, defaults to 0.3
+    :param maxBatchSize: maximum number of requests sent in one json-rpc batch, defaults to 100
+    :param decode: return decoded results (see `Responses`) instead of the raw json-rpc response, defaults to False
+    :param cache: cache for read-only responses, True for a `ResponseCache` with the default policies, defaults to no caching
+    :param coalesce: share one request between identical read-only calls made concurrently, defaults to False
+    :param metrics: per-method request metrics shared by all nodes, True for a new `Metrics.RpcMetrics`, defaults to no metrics
+    :param timeout: seconds to wait for the connection to a node and for each read of its response, defaults to waiting indefinitely
+    :param healthTimeout: timeout (in seconds) of the health checks, defaults to 5
+    :type urls: list
+    :type apiKey: string
+    :type strategy: string
+    :type writeMode: string
+    :type preferred: number
+    :type healthInterval: number
+    :type maxFailures: number
+    :type ejectTime: number
+    :type poolMaxSize: number
+    :type maxRetries: number
+    :type backoffFactor: number
+    :type maxBatchSize: number
+    :type decode: boolean
+    :type cache: `ResponseCache` instance or boolean
+    :type coalesce: boolean
+    :type metrics: `Metrics.RpcMetrics` instance or boolean
+    :type timeout: number
+    :type healthTimeout: number
+    :return: `MultiRequests` object
+    :rtype: instance of `MultiRequests`
+
+    """
+    def __init__(self, urls, apiKey = 'topl_the_world!', strategy = 'leastOutstanding', writeMode = 'preferred', preferred = 0, healthInterval = None, maxFailures = 3, ejectTime = 30, poolMaxSize = 10, maxRetries = 0, backoffFactor = 0.3, maxBatchSize = 100, decode = False, cache = None, coalesce = False, metrics = None, timeout = None, healthTimeout = 5):
+        if not urls:
+            raise Exception('At least one chain provider url must be specified')
+        if strategy not in ('leastOutstanding', 'latency'):
+            raise Exception('Unknown node selection strategy: ' + str(strategy))
+        if writeMode not in ('preferred', 'all'):
+            raise Exception('Unknown write mode: ' + str(writeMode))
+        self.strategy = strategy
+        self.writeMode = writeMode
+        self.maxFailures = maxFailures
+        self.ejectTime = ejectTime
+        self.lock = threading.Lock()
+        if metrics is True:
+            metrics = Metrics.RpcMetrics()
+        self.nodes = [Node(url,
+                           Requests(url, apiKey, poolConnections = 1, poolMaxSize = poolMaxSize, maxRetries = maxRetries, backoffFactor = backoffFactor, metrics = metrics, timeout = timeout),
+                           Requests(url, apiKey, poolConnections = 1, poolMaxSize = 1, maxRetries = 0, timeout = healthTimeout))
+                      for url in urls]
+        self.preferred = self.nodes[preferred]
+        self.writePool = None
+        Requests.__init__(self, self.preferred.url, apiKey, poolConnections = 1, poolMaxSize = poolMaxSize, maxRetries = maxRetries, backoffFactor = backoffFactor, maxBatchSize = maxBatchSize, decode = decode, cache = cache, coalesce = coalesce, metrics = metrics, timeout = timeout)
+        self.healthInterval = healthInterval
+        self.stopped = threading.Event()
+        self.healthThread = None
+        if healthInterval:
+            self.healthThread = threading.Thread(target = self.runHealthChecks, daemon = True)
+            self.healthThread.start()
+
+    def createSession(self):
+        # every node has its own pooled session, see `Node.requests`
+        return None
+
+    def close(self):
+        """
+        Stop the health checks and close the pooled connections of every node
+
+        """
+        self.stopped.set()
+        if self.healthThread is not None:
+            self.healthThread.join()
+            self.healthThread = None
+        if self.writePool is not None:
+            self.writePool.shutdown(wait = True)
+            self.writePool = None
+        for node in self.nodes:
+            node.requests.close()
+            node.healthRequests.close()
+
+    def setUrl(self, url):
+        raise Exception('The chain providers of a MultiRequests instance are fixed, create a new instance instead')
+
+    def setApiKey(self, apiKey):
+        Requests.setApiKey(self, apiKey)
+        for node in self.nodes:
+            node.requests.setApiKey(apiKey)
+            node.healthRequests.setApiKey(apiKey)
+
+    def stats(self):
+        """
+        :return: statistics of every node, in the order of urls
+        :rtype: list
+
+        """
+        with self.lock:
+            return [node.stats() for node in self.nodes]
+
+    #
+    # Node selection
+    #
+
+    def choose(self, exclude = ()):
+        """
+        Pick the node for a read-only request
+
+        :param exclude: nodes already tried for this request
+        :type exclude: collection
+        :return: an available node, or if every node is ejected the node that is ejected the longest, None once every node was tried
+        :rtype: `Node`
+
+        """
+        now = time.monotonic()
+        candidates = [node for node in self.nodes if node not in exclude]
+        if not candidates:
+            return None
+        available = [node for node in candidates if node.available(now)]
+        if not available:
+            # every node is ejected, try the one that was ejected first instead of failing without sending anything
+            return min(candidates, key = lambda node: node.ejectedUntil)
+        if self.strategy == 'latency':
+            known = [node.latency for node in available if node.latency is not None]
+            # nodes without a latency sample yet are assumed as fast as the fastest node
+            default = min(known) if known else 1.0
+            weights = [1.0 / (max(node.latency if node.latency is not None else default, 1e-6) * (node.outstanding + 1)) for node in available]
+            return random.choices(available, weights)[0]
+        fewest = min(node.outstanding for node in available)
+        return random.choice([node for node in available if node.outstanding == fewest])
+
+    def ordered(self, first):
+        # first, then the other available nodes, then the ejected nodes
+        now = time.monotonic()
+        others = [node for node in self.nodes if node is not first]
+        return [first] + [node for node in others if node.available(now)] + [node for node in others if not node.available(now)]
+
+    def call(self, node, function, *args):
+        """
+        Run a request on a node, keeping the statistics used for selection and ejection
+
+        :param node: node the request is sent to
+        :param function: function sending the request, called with the `Requests` instance of the node first
+        :type node: `Node`
+        :type function: function
+        :return: result of function
+
+        """
+        with self.lock:
+            node.outstanding += 1
+            node.requestCount += 1
+        start = time.monotonic()
+        try:
+            result = function(node.requests, *args)
+        except Exception:
+            with self.lock:
+                node.outstanding -= 1
+                self.recordFailure(node)
+            raise
+        with self.lock:
+            node.outstanding -= 1
+            self.recordSuccess(node, time.monotonic() - start)
+        return result
+
+    def recordSuccess(self, node, latency):
+        node.failures = 0
+        node.ejectedUntil = 0
+        node.latency = latency if node.latency is None else (1 - latencySmoothing) * node.latency + latencySmoothing * latency
+
+    def recordFailure(self, node):
+        node.failures += 1
+        node.errorCount += 1
+        if node.failures >= self.maxFailures:
+            node.ejectedUntil = time.monotonic() + self.ejectTime
+
+    def balanced(self, function, *args):
+        # run a request on the chosen node, failing over to the other nodes
+        tried = []
+        error = None
+        while True:
+            node = self.choose(tried)
+            if node is None:
+                raise error
+            tried.append(node)
+            try:
+                return self.call(node, function, *args)
+            except Exception as e:
+                error = e
+
+    def inOrder(self, nodes, function, *args):
+        # run a request on the first node that answers
+        error = None
+        for node in nodes:
+            try:
+                return self.call(node, function, *args)
+            except Exception as e:
+                error = e
+        raise error
+
+    #
+    # Request delivery
+    #
+
+    def fetchBody(self, routeInfo, params, key):
+        method = routeInfo['method']
+        if method in writeMethods:
+            body = self.write(routeInfo, params)
+        elif method in balancedMethods:
+            body = self.balanced(self.fetchFrom, routeInfo, params)
+        else:
+            body = self.call(self.preferred, self.fetchFrom, routeInfo, params)
+        if key is not None:
+            self.cache.put(key, body)
+        return body
+
+    def fetchFrom(self, requests, routeInfo, params):
+        response = BramblRequest(requests, routeInfo, params)
+        return response.content if self.decode else response.text
+
+    def write(self, routeInfo, params):
+        """
+        Send a write according to the write mode
+
+        :param routeInfo: object containing the route, method and id of the request
+        :param params: body parameters passed to the specified json-rpc method
+        :type routeInfo: dictionary
+        :type params: dictionary
+        :return: response body of the preferred node, or with writeMode 'all' of the first node in urls order that answered
+        :rtype: JSON
+
+        """
+        if self.writeMode == 'preferred':
+            return self.inOrder(self.ordered(self.preferred), self.fetchFrom, routeInfo, params)
+        now = time.monotonic()
+        nodes = [node for node in self.nodes if node.available(now)] or list(self.nodes)
+        with self.lock:
+            if self.writePool is None:
+                self.writePool = ThreadPoolExecutor(max_workers = len(self.nodes))
+        futures = [self.writePool.submit(self.call, node, self.fetchFrom, routeInfo, params) for node in nodes]
+        error = None
+        body = None
+        for future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if body is None:
+                body = result
+        if body is None:
+            raise error
+        return body
+
+    def sendBatch(self, calls, maxBatchSize):
+        """
+        Send queued calls as json-rpc batches, each batch to a node chosen like a read-only request (see `Requests.sendBatch`)
+
+        :param calls: queued calls, each an object with a 'route' and a json-rpc 'body' whose id is its index
+        :param maxBatchSize: maximum number of requests in a single batch
+        :type calls: list
+        :type maxBatchSize: number
+        :return: json-rpc response object (containing either 'result' or 'error') of every call, in call order
+        :rtype: list
+
+        """
+        results = [None] * len(calls)
+        for route, bodies in batchChunks(calls, maxBatchSize):
+            if all(body['method'] in balancedMethods for body in bodies):
+                response = self.balanced(BramblBatchRequest, route, bodies)
+            else:
+                response = self.call(self.preferred, BramblBatchRequest, route, bodies)
+            splitBatchResponse(bodies, Responses.loads(response.content), results)
+        return results
+
+    def sendStreamRequest(self, routeInfo, params, path, chunkSize = 65536):
+        """
+        Send a single json-rpc request to a node chosen like a read-only request and yield the elements of
+        one array of its response as they are received (see `Requests.sendStreamRequest`). The request is
+        not sent to another node if it fails part way.
+
+        :param routeInfo: object containing the route, method and id of the request
+        :param params: body parameters passed to the specified json-rpc method
+        :param path: keys of the objects enclosing the array in the response
+        :param chunkSize: number of bytes read from the connection at a time, defaults to 64kb
+        :type routeInfo: dictionary
+        :type params: dictionary
+        :type path: list
+        :type chunkSize: number
+        :return: array elements of the json-rpc response
+        :rtype: generator
+
+        """
+        node = self.choose()
+        with self.lock:
+            node.outstanding += 1
+            node.requestCount += 1
+        start = time.monotonic()
+        completed = failed = False
+        try:
+            for element in BramblStreamRequest(node.requests, routeInfo, params, path, chunkSize):
+                yield Responses.decodeElement(routeInfo['method'], element) if self.decode else element
+            completed = True
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # a stream abandoned by the caller is no longer outstanding, but says nothing about the health of the node
+            with self.lock:
+                node.outstanding -= 1
+                if completed:
+                    self.recordSuccess(node, time.monotonic() - start)
+                elif failed:
+                    self.recordFailure(node)
+
+    #
+    # Health checks
+    #
+
+    def checkHealth(self):
+        """
+        Query 'chainInfo' on every node, restoring the nodes that answer and counting a failure for the others,
+        including the nodes not answering within healthTimeout
+
+        :return: whether each node answered, in the order of urls
+        :rtype: list
+
+        """
+        healthy = []
+        for node in self.nodes:
+            try:
+                self.call(node, lambda requests, healthRequests: healthRequests.chainInfo(), node.healthRequests)
+                healthy.append(True)
+            except Exception:
+                healthy.append(False)
+        return healthy
+
+    def runHealthChecks(self):
+        while not self.stopped.wait(self.healthInterval):
+            self.checkHealth()
@@ -13,6 +13,21 @@ import requests
 import asyncio
 import os
 import sys
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import Responses
+from . import ResponseCache
+from ..lib import singleflight
+from ..utils import Metrics
+from ..utils import Tracing
+
+# json-rpc methods that do not change the state of the node, whose identical concurrent calls may be coalesced
+readOnlyMethods = frozenset(['balances', 'listOpenKeyfiles', 'transactionById', 'transactionFromMempool', 'mempool', 'blockById', 'info', 'delay', 'myBlocks', 'generators'])
+
+# gateway errors, retried for read-only requests only (see `retryPolicy`)
+gatewayStatuses = frozenset([502, 503, 504])
 
 
 def BramblRequest(self,routeInfo, params): #obj is meant for the self of request,rename method
@@ -39,38 +54,430 @@ def BramblRequest(self,routeInfo, params): #obj is meant for the self of request
         "method": routeInfo['method'],
         "params": params
     }
-    response = requests.request('POST',self.url+routeInfo['route'], json= body, allow_redirects = True ,headers = self.headers)
+    response = postRequest(self, routeInfo['route'], routeInfo['method'], body)
     if response.status_code != 200:
         raise Exception('A connection could not be established')
         print(response.status_code())
     return response
 
+def BramblBatchRequest(self, route, bodies):
+    """
+    Send several formatted json-rpc requests to one route as a single JSON-RPC 2.0 batch
+
+    :param route: specified request route
+    :param bodies: formatted json-rpc request objects, each with a unique id
+    :type route: string
+    :type bodies: list
+    :return: JSON response from the node
+    :rtype: JSON
+
+    """
+    response = postRequest(self, route, 'batch', bodies)
+    if response.status_code != 200:
+        raise Exception('A connection could not be established')
+    return response
+
+def postRequest(self, route, method, body):
+    """
+    Post a json-rpc request object (or batch array) to a route, recording it in the metrics of the
+    instance if it has any
+
+    :param route: specified request route
+    :param method: json-rpc method recorded in the metrics, 'batch' for batches
+    :param body: formatted json-rpc request or list of requests
+    :type route: string
+    :type method: string
+    :type body: dictionary or list
+    :return: HTTP response from the node
+    :rtype: `requests.Response`
+
+    """
+    metrics = self.metrics
+    if metrics is None:
+        return postWithRetries(self, route, body)
+    start = time.perf_counter()
+    try:
+        response = postWithRetries(self, route, body)
+    except Exception:
+        metrics.record(route, method, time.perf_counter() - start, 0, 0, True)
+        raise
+    metrics.record(route, method, time.perf_counter() - start, len(response.request.body or b''), len(response.content), response.status_code != 200)
+    return response
+
+def isReadOnly(body):
+    """
+    :param body: formatted json-rpc request or list of requests
+    :type body: dictionary or list
+    :return: whether the request (or every request of the batch) leaves the state of the node unchanged
+    :rtype: boolean
+
+    """
+    if isinstance(body, list):
+        return all(item['method'] in readOnlyMethods for item in body)
+    return body['method'] in readOnlyMethods
+
+def postWithRetries(self, route, body, stream = False):
+    # post a request, retrying gateway errors only if the request leaves the state of the node unchanged
+    retries = self.maxRetries if isReadOnly(body) else 0
+    attempt = 0
+    while True:
+        response = self.session.post(self.url+route, json= body, allow_redirects = True ,headers = self.headers, stream = stream, timeout = self.timeout)
+        if response.status_code not in gatewayStatuses or attempt >= retries:
+            return response
+        response.close()
+        time.sleep(self.backoffFactor * (2 ** attempt))
+        attempt += 1
+
+def BramblStreamRequest(self, routeInfo, params, path, chunkSize):
+    """
+    Send a json-rpc request and yield the elements of one array of the response while the body is
+    still being received, so that large responses are never held in memory at once
+
+    :param routeInfo: object containing data neccesary for making requests
+    :param params: additional request parameters
+    :param path: keys of the objects enclosing the array in the response (see `Responses.ArrayStream`)
+    :param chunkSize: number of bytes read from the connection at a time
+    :type routeInfo: dictionary
+    :type params: dictionary
+    :type path: list
+    :type chunkSize: number
+    :return: decoded array elements
+    :rtype: generator
+
+    """
+    body = {
+        "jsonrpc": "2.0",
+        "id": routeInfo['id'],
+        "method": routeInfo['method'],
+        "params": params
+    }
+    metrics = self.metrics
+    start = time.perf_counter() if metrics is not None else 0
+    sent = received = 0
+    failed = True
+    try:
+        with postWithRetries(self, routeInfo['route'], body, stream = True) as response:
+            if metrics is not None:
+                sent = len(response.request.body or b'')
+            if response.status_code != 200:
+                raise Exception('A connection could not be established')
+            stream = Responses.ArrayStream(path)
+            for chunk in response.iter_content(chunkSize):
+                received += len(chunk)
+                for element in stream.feed(chunk):
+                    yield element
+            for element in stream.close():
+                yield element
+            failed = False
+    finally:
+        # the request is recorded once the whole body was read, or once the stream failed or was abandoned
+        if metrics is not None:
+            metrics.record(routeInfo['route'], routeInfo['method'], time.perf_counter() - start, sent, received, failed)
+
+def batchChunks(calls, maxBatchSize):
+    """
+    Group queued batch calls by route and split every group into batches of at most maxBatchSize requests
+
+    :param calls: queued calls, each an object with a 'route' and a json-rpc 'body'
+    :param maxBatchSize: maximum number of requests in a single batch
+    :type calls: list
+    :type maxBatchSize: number
+    :return: (route, bodies) pairs, one for each HTTP request to make
+    :rtype: list
+
+    """
+    routes = {}
+    for call in calls:
+        routes.setdefault(call['route'], []).append(call['body'])
+    chunks = []
+    for route, bodies in routes.items():
+        for start in range(0, len(bodies), maxBatchSize):
+            chunks.append((route, bodies[start:start + maxBatchSize]))
+    return chunks
+
+def splitBatchResponse(bodies, response, results):
+    """
+    Match the responses of a json-rpc batch back to the requests they answer. Requests the node did
+    not answer are given a json-rpc error object so that every call receives either a result or an error.
+
+    :param bodies: json-rpc requests sent in the batch, whose ids are the indices into results
+    :param response: decoded json-rpc batch response
+    :param results: per-call responses, filled in place
+    :type bodies: list
+    :type response: list or dictionary
+    :type results: list
+
+    """
+    if isinstance(response, dict):
+        # the whole batch was rejected with a single error object
+        for body in bodies:
+            results[int(body['id'])] = dict(response, id = body['id'])
+        return
+    for item in response:
+        try:
+            results[int(item['id'])] = item
+        except (KeyError, TypeError, ValueError, IndexError):
+            pass
+    for body in bodies:
+        if results[int(body['id'])] is None:
+            results[int(body['id'])] = {
+                'jsonrpc': '2.0',
+                'id': body['id'],
+                'error': {'code': -32603, 'message': 'No response was returned for this request'}
+            }
+
+def retryPolicy(maxRetries, backoffFactor):
+    """
+    Build the retry policy used by the pooled transport of `Requests`
+
+    Only connection errors are retried here, which is always safe since the request never reached the
+    node. Gateway errors (502, 503, 504) may be returned after the node applied the request, so they are
+    retried by `postWithRetries` for read-only methods only: retrying a transfer or keyfile creation could
+    apply it twice.
+
+    :param maxRetries: maximum number of retries for a single request
+    :param backoffFactor: exponential backoff factor in seconds (sleeps backoffFactor * 2^(retry - 1))
+    :type maxRetries: number
+    :type backoffFactor: number
+    :return: retry policy for the HTTP adapter
+    :rtype: `urllib3.util.retry.Retry`
+
+    """
+    options = {
+        'total': maxRetries,
+        'connect': maxRetries,
+        'read': 0,
+        'status': 0,
+        'backoff_factor': backoffFactor,
+        'raise_on_status': False
+    }
+    try:
+        return Retry(allowed_methods=frozenset(['POST']), **options)
+    except TypeError:
+        # urllib3 < 1.26 names this option method_whitelist
+        return Retry(method_whitelist=frozenset(['POST']), **options)
+
 class Requests():
     """
     A class for sending requests to the Brambl layer interface of the given chain provider
 
+    Every instance owns a pooled, keep-alive HTTP session so consecutive requests reuse the same
+    connections instead of paying a new TCP (and TLS) handshake per call. The session is safe to
+    share between threads; each thread checks a connection out of the pool for the duration of a request.
+
     :param url: Chain provider location, defaults to "http://localhost:9085/"
     :param apiKey: Access key for authorizing requests to the client API, defaults to "topl_the_world!"
+    :param poolConnections: number of per-host connection pools to keep, defaults to 10
+    :param poolMaxSize: maximum number of connections kept alive (and open at once) per host, defaults to 10
+    :param maxRetries: number of retries on connection errors, and on gateway errors of read-only methods, defaults to 3
+    :param backoffFactor: exponential backoff factor in seconds between retries, defaults to 0.3
+    :param maxBatchSize: maximum number of requests sent in one json-rpc batch, defaults to 100
+    :param decode: return decoded results (see `Responses`) instead of the raw json-rpc response, defaults to False
+    :param cache: cache for read-only responses, True for a `ResponseCache` with the default policies, defaults to no caching
+    :param coalesce: share one request between identical read-only calls made concurrently (see `singleflight`), defaults to False
+    :param metrics: per-method request metrics, True for a new `Metrics.RpcMetrics`, defaults to no metrics
+    :param timeout: seconds to wait for the connection and for each read of the response, defaults to waiting indefinitely
     :type url: string
     :type apiKey: string
+    :type poolConnections: number
+    :type poolMaxSize: number
+    :type maxRetries: number
+    :type backoffFactor: number
+    :type maxBatchSize: number
+    :type decode: boolean
+    :type cache: `ResponseCache` instance or boolean
+    :type coalesce: boolean
+    :type metrics: `Metrics.RpcMetrics` instance or boolean
+    :type timeout: number
     :return: `Requests` object
     :rtype: instance of `Requests`
 
     """
     #constructor function
-    def __init__(self,url = 'http://localhost:9085/', apiKey = 'topl_the_world!'):
+    def __init__(self,url = 'http://localhost:9085/', apiKey = 'topl_the_world!', poolConnections = 10, poolMaxSize = 10, maxRetries = 3, backoffFactor = 0.3, maxBatchSize = 100, decode = False, cache = None, coalesce = False, metrics = None, timeout = None):
         self.url = url
         self.apiKey = apiKey
         self.headers = {
             "Content-Type": "application/json",
              'x-api-key': self.apiKey
         }
+        self.poolConnections = poolConnections
+        self.poolMaxSize = poolMaxSize
+        self.maxRetries = maxRetries
+        self.backoffFactor = backoffFactor
+        self.maxBatchSize = maxBatchSize
+        self.decode = decode
+        if cache is True:
+            cache = ResponseCache.ResponseCache()
+        elif cache is False:
+            cache = None
+        self.cache = cache
+        self.flights = self.createFlights() if coalesce else None
+        if metrics is True:
+            metrics = Metrics.RpcMetrics()
+        elif metrics is False:
+            metrics = None
+        self.metrics = metrics
+        self.timeout = timeout
+        self.session = self.createSession()
+
+    def createSession(self):
+        """
+        Create the pooled keep-alive session used for every request of this instance
+
+        :return: HTTP session with a bounded connection pool and retry policy mounted
+        :rtype: `requests.Session`
+
+        """
+        adapter = HTTPAdapter(
+            pool_connections = self.poolConnections,
+            pool_maxsize = self.poolMaxSize,
+            max_retries = retryPolicy(self.maxRetries, self.backoffFactor),
+            pool_block = True # cap the number of open connections per host at poolMaxSize
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def createFlights(self):
+        """
+        Create the registry of requests in flight used to coalesce identical concurrent calls
+
+        :return: coalescer for calls made from several threads
+        :rtype: `singleflight.SingleFlight`
+
+        """
+        return singleflight.SingleFlight()
+
+    def close(self):
+        """
+        Close all pooled connections. New connections are opened if the instance is used again.
+
+        """
+        self.session.close()
+
+    def sendRequest(self, routeInfo, params):
+        """
+        Send a single json-rpc request and return the raw response body, or its decoded result if the
+        instance was created with decode=True. Responses of cached methods are served from the cache
+        when possible, and identical read-only calls are coalesced if the instance was created with
+        coalesce=True. Every route method goes through here, so subclasses may change how requests are
+        delivered by overriding this method.
+
+        :param routeInfo: object containing the route, method and id of the request
+        :param params: body parameters passed to the specified json-rpc method
+        :type routeInfo: dictionary
+        :type params: dictionary
+        :return: json-rpc response from the chain
+        :rtype: JSON, or a result object (see `Responses.decodeResult`)
+        :raises Responses.BramblRpcError: in decoded mode, if the chain returns a json-rpc error
+
+        """
+        with Tracing.span('requests.sendRequest', route = routeInfo['route'], method = routeInfo['method']) as span:
+            key = self.cacheKey(routeInfo, params)
+            if key is not None:
+                body = self.cache.get(key, routeInfo['id'])
+                if body is not None:
+                    span.setAttribute('cached', True)
+                    return self.readResponse(routeInfo['method'], body)
+            flightKey = self.flightKey(routeInfo, params)
+            if flightKey is not None:
+                body = self.flights.do(flightKey, self.fetchBody, routeInfo, params, key)
+            else:
+                body = self.fetchBody(routeInfo, params, key)
+            return self.readResponse(routeInfo['method'], body)
+
+    def fetchBody(self, routeInfo, params, key):
+        # send the request and store the response body under the cache key, if any
+        response = BramblRequest(self, routeInfo, params)
+        body = response.content if self.decode else response.text
+        if key is not None:
+            self.cache.put(key, body)
+        return body
+
+    def flightKey(self, routeInfo, params):
+        # identity of the request for coalescing, None if it must not be coalesced
+        if self.flights is None or routeInfo['method'] not in readOnlyMethods:
+            return None
+        return (self.url, routeInfo['route'], routeInfo['method'], json.dumps(params, sort_keys = True))
+
+    def cacheKey(self, routeInfo, params):
+        # cache key of the request, None if its method is not cached
+        if self.cache is None or not self.cache.caches(routeInfo['method']):
+            return None
+        return self.cache.cacheKey(self.url, routeInfo['method'], params)
+
+    def readResponse(self, method, body):
+        # decode a response body if the instance was created with decode=True
+        if self.decode:
+            return Responses.decodeResponse(method, body)
+        return body
+
+    def sendStreamRequest(self, routeInfo, params, path, chunkSize = 65536):
+        """
+        Send a single json-rpc request and yield the elements of one array of its response as they are
+        received. Elements are decoded to result objects if the instance was created with decode=True.
+
+        :param routeInfo: object containing the route, method and id of the request
+        :param params: body parameters passed to the specified json-rpc method
+        :param path: keys of the objects enclosing the array in the response
+        :param chunkSize: number of bytes read from the connection at a time, defaults to 64kb
+        :type routeInfo: dictionary
+        :type params: dictionary
+        :type path: list
+        :type chunkSize: number
+        :return: array elements of the json-rpc response
+        :rtype: generator
+        :raises Responses.BramblRpcError: if the chain returns a json-rpc error
+
+        """
+        for element in BramblStreamRequest(self, routeInfo, params, path, chunkSize):
+            yield Responses.decodeElement(routeInfo['method'], element) if self.decode else element
+
+    def batch(self, maxBatchSize = None):
+        """
+        Start a new json-rpc batch. Route methods called on the returned `Batch` are queued instead of
+        sent, and `execute` sends them as one JSON-RPC 2.0 array per route.
+
+        :param maxBatchSize: maximum number of requests in a single batch, defaults to the limit of this instance
+        :type maxBatchSize: number
+        :return: `Batch` object
+        :rtype: instance of `Batch`
+
+        """
+        return Batch(self, maxBatchSize or self.maxBatchSize)
+
+    def sendBatch(self, calls, maxBatchSize):
+        """
+        Send queued calls as json-rpc batches and split the responses back into per-call results
+
+        :param calls: queued calls, each an object with a 'route' and a json-rpc 'body' whose id is its index
+        :param maxBatchSize: maximum number of requests in a single batch
+        :type calls: list
+        :type maxBatchSize: number
+        :return: json-rpc response object (containing either 'result' or 'error') of every call, in call order
+        :rtype: list
+
+        """
+        results = [None] * len(calls)
+        for route, bodies in batchChunks(calls, maxBatchSize):
+            splitBatchResponse(bodies, Responses.loads(BramblBatchRequest(self, route, bodies).content), results)
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     #Allow setting a different url than the default from which to create and accet RPC connections
     def setUrl(self,url):
         self.url = url
 
     def setApiKey(self,apiKey):
-        self.headers['x-api-key'] = apiKey    
+        # replace rather than mutate so threads with a request in flight keep a consistent header set
+        self.headers = dict(self.headers, **{'x-api-key': apiKey})
     #
     # Wallet Api Routes
     #
@@ -94,7 +501,7 @@ class Requests():
         
         route = 'wallet/'
         method = 'balances'
-        return BramblRequest(self, {'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
   
     def listOpenKeyfiles(self, ID = '1'):
         """
@@ -109,7 +516,7 @@ class Requests():
         params = {}
         route = 'wallet/'
         method = 'listOpenKeyfiles'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
 
     def generateKeyfile(self,params, ID = '1'):
@@ -132,7 +539,7 @@ class Requests():
             raise Exception('A password must be provided to encrypt the keyfile')
         route = 'wallet/'
         method = 'generateKeyfile'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def lockKeyfile(self,params, ID = '1'):
         """
@@ -162,7 +569,7 @@ class Requests():
 
         route = 'wallet/'
         method = 'lockKeyfile'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def unlockKeyfile(self,params, ID = '1'):
         """
@@ -192,7 +599,7 @@ class Requests():
 
         route = 'wallet/'
         method = 'unlockKeyfile'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def signTransaction(self,params, ID = '1'):
         """
@@ -222,7 +629,7 @@ class Requests():
 
         route = 'wallet/'
         method = 'signTx'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def broadcastTx(self,params, ID = '1'):
         """
@@ -245,7 +652,7 @@ class Requests():
 
         route = 'wallet/'
         method = 'broadcastTx'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def transferPolys(self,params, ID = '1'):
         """
@@ -291,7 +698,7 @@ class Requests():
 
         route = 'wallet/'
         method = 'transferPolys'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def transferArbits(self,params, ID = '1'):
         """
@@ -336,7 +743,7 @@ class Requests():
 
         route = 'wallet/'
         method = 'transferArbits'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
     #Asset Api Routes
 
     def createAssets(self,params, ID = '1'):
@@ -394,7 +801,7 @@ class Requests():
         route = 'asset/'
         method = 'createAssets'
 
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def createAssetsPrototype(self,params, ID = '1'):
         """
@@ -451,7 +858,7 @@ class Requests():
         route = 'asset/'
         method = 'createAssetsPrototype'
 
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def transferAssets(self,params, ID = '1'):
         """
@@ -512,7 +919,7 @@ class Requests():
         route = 'asset/'
         method = 'transferAssets'
 
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def transferAssetsPrototype(self,params, ID = '1'):
         """
@@ -578,7 +985,7 @@ class Requests():
         route = 'asset/'
         method = 'transferAssetsPrototype'
 
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def transferTargetAssets(self,params, ID = '1'):
         """
@@ -628,7 +1035,7 @@ class Requests():
         route = 'asset/'
         method = 'transferTargetAssets'
 
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def transferTargetAssetsPrototype(self,params, ID = '1'):
         """
@@ -685,7 +1092,7 @@ class Requests():
         route = 'asset/'
         method = 'transferTargetAssetsPrototype'     
 
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     #NodeView Api Routes
  
@@ -710,7 +1117,7 @@ class Requests():
 
         route = 'nodeView/'
         method = 'transactionById'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
         
     def getTransactionFromMempool(self,params, ID = '1'):
         """
@@ -734,7 +1141,7 @@ class Requests():
 
         route = 'nodeView/'
         method = 'transactionFromMempool'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def getMempool(self, ID = '1'):
         """
@@ -749,7 +1156,7 @@ class Requests():
         params = {}
         route = 'nodeView/'
         method = 'mempool'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def getBlockById(self, params, ID = '1'):
         """
@@ -772,7 +1179,50 @@ class Requests():
         route = 'nodeView/'
         method = 'blockById'
         Id = '1'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
+
+    def streamMempool(self, ID = '1', chunkSize = 65536):
+        """
+        Get the transactions in the mempool one at a time while the response is received, so that memory
+        use stays bounded however large the mempool is
+
+        :param ID: identifying number for the json-rpc request, defaults to "1"
+        :param chunkSize: number of bytes read from the connection at a time, defaults to 64kb
+        :type ID: string
+        :type chunkSize: number
+        :return: transactions of the mempool
+        :rtype: generator (async generator for `AsyncRequests`)
+
+        """
+        params = {}
+        route = 'nodeView/'
+        method = 'mempool'
+        return self.sendStreamRequest({'route':route,'method': method,'id':ID},params,['result'],chunkSize)
+
+    def streamBlockTransactions(self, params, ID = '1', chunkSize = 65536):
+        """
+        Get the transactions of a block one at a time while the response is received, so that memory
+        use stays bounded however large the block is
+
+        :param params: body parameters passed to the specified json-rpc method
+        :param params['blockId']: Unique identifier of the block to retrieve
+        :param ID: identifying number for the json-rpc request, defaults to "1"
+        :param chunkSize: number of bytes read from the connection at a time, defaults to 64kb
+        :type params: dictionary
+        :type params['blockId']: string
+        :type ID: string
+        :type chunkSize: number
+        :return: transactions of the block
+        :rtype: generator (async generator for `AsyncRequests`)
+
+        """
+        if not params:
+            raise Exception('A parameter object must be specified')
+        if 'blockId' not in params:
+            raise Exception('A blockId must be specified')
+        route = 'nodeView/'
+        method = 'blockById'
+        return self.sendStreamRequest({'route':route,'method': method,'id':ID},params,['result','txs'],chunkSize)
 
     #Debug Api Routes
 
@@ -789,7 +1239,7 @@ class Requests():
         params = {}
         route = 'debug/'
         method = 'info'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def calcDelay(self,params, ID = '1'):
         """
@@ -814,7 +1264,7 @@ class Requests():
             raise Exception('A number of blocks must be specified')
         route = 'debug/'
         method = 'delay'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def myBlocks(self, ID = '1'):
         """
@@ -829,7 +1279,7 @@ class Requests():
         params = {}
         route = 'debug/'
         method = 'myBlocks'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
 
     def blockGenerators(self, ID = '1'):
         """
@@ -844,4 +1294,79 @@ class Requests():
         params = {}
         route = 'debug/'
         method = 'generators'
-        return BramblRequest(self,{'route':route,'method': method,'id':ID},params).text
+        return self.sendRequest({'route':route,'method': method,'id':ID},params)
+
+
+class Batch(Requests):
+    """
+    A queue of json-rpc requests sent together by `execute`. Every route method of `Requests` is available
+    and performs the same parameter checks, but returns the position of the call in the batch instead of
+    a response. Request ids are generated automatically, so the ID argument of the route methods is ignored.
+    `execute` returns the raw json-rpc response objects, whatever the decode mode of the instance the batch
+    was created from. A batch only queues calls: it holds no connections, can not be used in a `with` block
+    and can not start another batch.
+
+    Example:
+        batch = requests.batch()
+        for txId in txIds:
+            batch.getTransactionById({'transactionId': txId})
+        responses = batch.execute()
+
+    :param requests: instance used to send the batch
+    :param maxBatchSize: maximum number of requests in a single batch
+    :type requests: `Requests` instance
+    :type maxBatchSize: number
+    :return: `Batch` object
+    :rtype: instance of `Batch`
+
+    """
+    def __init__(self, requests, maxBatchSize):
+        self.requests = requests
+        self.url = requests.url
+        self.headers = requests.headers
+        self.maxBatchSize = maxBatchSize
+        self.calls = []
+
+    def __len__(self):
+        return len(self.calls)
+
+    def sendRequest(self, routeInfo, params):
+        index = len(self.calls)
+        self.calls.append({
+            'route': routeInfo['route'],
+            'body': {
+                "jsonrpc": "2.0",
+                "id": str(index),
+                "method": routeInfo['method'],
+                "params": params
+            }
+        })
+        return index
+
+    def sendStreamRequest(self, routeInfo, params, path, chunkSize = 65536):
+        raise Exception('Streaming requests can not be batched')
+
+    def batch(self, maxBatchSize = None):
+        raise Exception('Batches can not be nested')
+
+    def close(self):
+        raise Exception('A batch holds no connections, close the instance it was created from')
+
+    def __enter__(self):
+        raise Exception('A batch is sent with execute, not with a "with" block')
+
+    def __exit__(self, *args):
+        raise Exception('A batch is sent with execute, not with a "with" block')
+
+    def execute(self):
+        """
+        Send all queued requests, one json-rpc batch per route (split into batches of at most
+        maxBatchSize requests) and empty the queue.
+
+        :return: raw json-rpc response object (containing either 'result' or 'error') of every call, in call order
+        :rtype: list
+
+        """
+        calls = self.calls
+        self.calls = []
+        return self.requests.sendBatch(calls, self.maxBatchSize)
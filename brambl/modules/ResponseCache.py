@@ -0,0 +1,164 @@
+"""
+ResponseCache.py
+====================================
+
+Opt-in cache of read-only json-rpc responses, used by `Requests` and `AsyncRequests` when created with
+a cache. Blocks and confirmed transactions never change once returned by the chain provider, so they
+are kept until evicted, while chain information is only kept for a few seconds.
+
+"""
+# Dependencies
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from . import Responses
+
+# json-rpc method -> time to live in seconds, None keeps the response until it is evicted
+defaultPolicies = {
+    'blockById': None,
+    'transactionById': None,
+    'info': 2
+}
+
+
+class ResponseCache():
+    """
+    Bounded LRU cache of json-rpc response bodies keyed by (url, method, params). Only the methods listed
+    in `policies` are cached, and only responses holding a result: errors (i.e. a transaction that is not
+    confirmed yet) are never stored. A cache may be shared by several `Requests` instances: bodies are stored
+    as text whatever the decode mode of the instance that fetched them, and a hit is returned with the id of
+    the request it answers.
+
+    :param maxSize: maximum number of responses held, defaults to 1024
+    :param policies: json-rpc method -> time to live in seconds (None never expires), defaults to `defaultPolicies`
+    :type maxSize: number
+    :type policies: dictionary
+    :return: `ResponseCache` object
+    :rtype: instance of `ResponseCache`
+
+    """
+    def __init__(self, maxSize = 1024, policies = None):
+        self.maxSize = maxSize
+        self.policies = dict(defaultPolicies if policies is None else policies)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.methods = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def caches(self, method):
+        """
+        :param method: json-rpc method
+        :type method: string
+        :return: whether responses to the method are cached
+        :rtype: boolean
+
+        """
+        return method in self.policies and self.policies[method] != 0
+
+    def cacheKey(self, url, method, params):
+        """
+        Build the cache key for a request
+
+        :param url: chain provider location
+        :param method: json-rpc method
+        :param params: body parameters of the request
+        :type url: string
+        :type method: string
+        :type params: dictionary
+        :return: cache key
+        :rtype: tuple
+
+        """
+        return (url, method, json.dumps(params, sort_keys = True, separators = (',', ':')))
+
+    def get(self, key, requestId = None):
+        """
+        Look up a response, counting a hit or a miss for its method
+
+        :param key: cache key built by `cacheKey`
+        :param requestId: json-rpc id of the request, the response is returned with this id if given
+        :type key: tuple
+        :type requestId: string
+        :return: response body, or None if it is not cached or has expired
+        :rtype: JSON
+
+        """
+        with self.lock:
+            counters = self.methods.setdefault(key[1], {'hits': 0, 'misses': 0})
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                counters['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            counters['hits'] += 1
+        body, responseId = entry[1], entry[2]
+        if requestId is None or requestId == responseId:
+            return body
+        # the response was cached for a request with another id
+        return json.dumps(dict(Responses.loads(body), id = requestId))
+
+    def put(self, key, body):
+        """
+        Store a response if it holds a result, evicting the least recently used responses if the cache is full
+
+        :param key: cache key built by `cacheKey`
+        :param body: response body, as text or bytes
+        :type key: tuple
+        :type body: JSON
+
+        """
+        if self.maxSize <= 0:
+            return
+        try:
+            response = Responses.loads(body)
+        except ValueError:
+            return
+        if not isinstance(response, dict) or 'error' in response or response.get('result') is None:
+            return
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        ttl = self.policies.get(key[1])
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (expires, body, response.get('id'))
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last = False)
+
+    def clear(self):
+        """
+        Remove every response and reset the counters
+
+        """
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.methods = {}
+
+    def stats(self):
+        """
+        Snapshot of the cache counters
+
+        :return: total 'hits' and 'misses', the number of responses held ('size') and the hits and misses of every method ('methods')
+        :rtype: dictionary
+
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries),
+                'methods': {method: dict(counters) for method, counters in self.methods.items()}
+            }
@@ -0,0 +1,448 @@
+"""
+Responses.py
+====================================
+
+Decoding of json-rpc responses, used by `Requests` and `AsyncRequests` when created with decode=True.
+The response body is parsed once (with orjson when it is installed) and the result is returned as a
+lightweight object instead of a JSON string, while json-rpc errors are raised as `BramblRpcError`.
+
+"""
+# Dependencies
+import codecs
+import json
+import re
+
+# orjson is optional, the standard json module is used when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    loads = orjson.loads
+else:
+    loads = json.loads
+
+
+class BramblRpcError(Exception):
+    """
+    Error object returned by the chain provider in place of a json-rpc result
+
+    :param error: json-rpc error object
+    :param id: id of the request that failed
+    :type error: dictionary
+    :type id: string
+
+    """
+    def __init__(self, error, id = None):
+        if not isinstance(error, dict):
+            error = {'message': str(error)}
+        self.code = error.get('code')
+        self.message = error.get('message', 'Unknown json-rpc error')
+        self.data = error.get('data')
+        self.id = id
+        Exception.__init__(self, self.message)
+
+
+class Result():
+    """
+    Base of the decoded result objects. The fields listed in `fields` are available as attributes
+    (None when the chain provider did not return them) and the decoded JSON object stays available as
+    `raw`, which item access is delegated to.
+
+    """
+    __slots__ = ('raw',)
+    # attribute name -> key in the JSON object
+    fields = {}
+
+    def __init__(self, raw):
+        self.raw = raw
+        get = raw.get
+        for attribute, key in self.fields.items():
+            setattr(self, attribute, get(key))
+
+    def __getitem__(self, key):
+        return self.raw[key]
+
+    def __contains__(self, key):
+        return key in self.raw
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.raw == other.raw
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.raw)
+
+    def get(self, key, default = None):
+        return self.raw.get(key, default)
+
+    def toDict(self):
+        """
+        :return: the decoded JSON object
+        :rtype: dictionary
+
+        """
+        return self.raw
+
+
+transactionFields = {
+    'txHash': 'txHash',
+    'txType': 'txType',
+    'timestamp': 'timestamp',
+    'fee': 'fee',
+    'data': 'data',
+    'signatures': 'signatures',
+    'newBoxes': 'newBoxes',
+    'boxesToRemove': 'boxesToRemove',
+    'sender': 'from',
+    'recipients': 'to'
+}
+
+
+class MempoolEntry(Result):
+    """
+    Unconfirmed transaction, as returned by 'getTransactionFromMempool' and 'getMempool'
+
+    """
+    __slots__ = tuple(transactionFields)
+    fields = transactionFields
+
+
+class Transaction(Result):
+    """
+    Confirmed transaction, as returned by 'getTransactionById' and included in blocks
+
+    """
+    fields = dict(transactionFields, blockNumber = 'blockNumber', blockHash = 'blockHash')
+    __slots__ = tuple(fields)
+
+
+class Block(Result):
+    """
+    Block returned by 'getBlockById'. Its transactions are decoded as `Transaction` objects.
+
+    """
+    fields = {
+        'id': 'id',
+        'parentId': 'parentId',
+        'timestamp': 'timestamp',
+        'height': 'height',
+        'generatorBox': 'generatorBox',
+        'signature': 'signature'
+    }
+    __slots__ = tuple(fields) + ('transactions',)
+
+    def __init__(self, raw):
+        Result.__init__(self, raw)
+        self.transactions = [Transaction(tx) for tx in raw.get('txs') or []]
+
+
+class ChainInfo(Result):
+    """
+    Chain information returned by 'chainInfo'
+
+    """
+    fields = {
+        'height': 'height',
+        'score': 'score',
+        'bestBlockId': 'bestBlockId',
+        'bestBlock': 'bestBlock',
+        'stateVersion': 'stateVersion',
+        'txCount': 'txCount'
+    }
+    __slots__ = tuple(fields)
+
+
+class Balances(Result):
+    """
+    Balances and boxes of one public key, as returned by 'getBalancesByKey'
+
+    """
+    __slots__ = ('publicKey', 'polys', 'arbits', 'boxes')
+
+    def __init__(self, publicKey, raw):
+        self.raw = raw
+        self.publicKey = publicKey
+        balances = raw.get('Balances') or {}
+        self.polys = balances.get('Polys')
+        self.arbits = balances.get('Arbits')
+        self.boxes = raw.get('Boxes')
+
+
+def decodeBalances(result):
+    return {publicKey: Balances(publicKey, balances) for publicKey, balances in result.items()}
+
+
+def decodeMempool(result):
+    return [MempoolEntry(tx) for tx in result]
+
+
+# json-rpc method -> (expected JSON type of the result, decoder)
+resultDecoders = {
+    'balances': (dict, decodeBalances),
+    'transactionById': (dict, Transaction),
+    'transactionFromMempool': (dict, MempoolEntry),
+    'mempool': (list, decodeMempool),
+    'blockById': (dict, Block),
+    'info': (dict, ChainInfo)
+}
+
+
+def decodeResult(method, result):
+    """
+    Turn the result of a json-rpc method into its result object. Results of methods without a result
+    object (or of an unexpected shape) are returned as decoded JSON.
+
+    :param method: json-rpc method the result answers
+    :param result: decoded json-rpc result
+    :type method: string
+    :type result: JSON value
+    :return: result object, or the decoded result
+    :rtype: `Result` instance, dictionary or list
+
+    """
+    decoder = resultDecoders.get(method)
+    if decoder is None or not isinstance(result, decoder[0]):
+        return result
+    return decoder[1](result)
+
+
+def decodeResponse(method, body):
+    """
+    Parse a json-rpc response body once and return its decoded result
+
+    :param method: json-rpc method the response answers
+    :param body: raw response body
+    :type method: string
+    :type body: bytes or string
+    :return: result object, or the decoded result (see `decodeResult`)
+    :rtype: `Result` instance, dictionary or list
+    :raises BramblRpcError: if the response holds a json-rpc error
+
+    """
+    response = loads(body)
+    if not isinstance(response, dict):
+        raise BramblRpcError({'code': -32603, 'message': 'Invalid json-rpc response'})
+    if 'error' in response:
+        raise BramblRpcError(response['error'], response.get('id'))
+    return decodeResult(method, response.get('result'))
+
+
+# structural characters outside of strings, the characters ending or escaping inside a string, and whitespace
+structuralChars = re.compile(r'[\[\]{},:"]')
+stringChars = re.compile(r'["\\]')
+whitespace = re.compile(r'[ \t\n\r]*')
+rawDecode = json.JSONDecoder().raw_decode
+
+
+class ArrayStream():
+    """
+    Incremental decoder yielding the elements of one array of a json-rpc response while the body is
+    still being received, so that only the element being read (and the last chunk) is held in memory.
+    The scanner jumps between structural characters with regular expressions until it reaches the
+    array, whose elements are then decoded one at a time. A json-rpc error object at the top level
+    is raised as `BramblRpcError`.
+
+    Example:
+        stream = ArrayStream(['result', 'txs'])
+        for chunk in chunks:
+            for tx in stream.feed(chunk):
+                print(tx)
+        for tx in stream.close():
+            print(tx)
+
+    :param path: keys of the objects enclosing the array, from the top level object
+    :type path: list
+    :return: `ArrayStream` object
+    :rtype: instance of `ArrayStream`
+
+    """
+    def __init__(self, path):
+        self.path = list(path)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        # one [isObject, key, expectingKey] entry per open container
+        self.stack = []
+        self.stringStart = None
+        self.inArray = False
+        self.found = False
+        self.errorStart = None
+        self.done = False
+        # an incomplete element is decoded again only once this much of it has been received
+        self.retryLength = 0
+
+    def feed(self, chunk):
+        """
+        Add the next chunk of the response body
+
+        :param chunk: next part of the body
+        :type chunk: bytes
+        :return: decoded elements completed by this chunk
+        :rtype: list
+        :raises BramblRpcError: if the response holds a json-rpc error
+
+        """
+        self.buffer += self.decoder.decode(chunk)
+        elements = []
+        buffer = self.buffer
+        stack = self.stack
+        pos = self.pos
+        while True:
+            if self.inArray:
+                pos = self.readElements(pos, elements)
+                if self.inArray:
+                    break
+                continue
+            if self.stringStart is not None:
+                match = stringChars.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                pos = match.start()
+                if buffer[pos] == '\\':
+                    if pos + 1 >= len(buffer):
+                        break
+                    pos += 2
+                    continue
+                pos += 1
+                if stack and stack[-1][0] and stack[-1][2]:
+                    stack[-1][1] = json.loads(buffer[self.stringStart:pos])
+                self.stringStart = None
+                continue
+            match = structuralChars.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            pos = match.start()
+            char = buffer[pos]
+            if char == '"':
+                self.stringStart = pos
+            elif char == '{' or char == '[':
+                if char == '[' and not self.found and self.errorStart is None and self.atPath():
+                    self.inArray = self.found = True
+                stack.append([char == '{', None, True])
+            elif char == '}' or char == ']':
+                stack.pop()
+                self.closed(pos + 1)
+            elif char == ',':
+                if len(stack) == 1 and self.errorStart is not None:
+                    self.raiseError(pos)
+                stack[-1][2] = True
+            elif char == ':':
+                top = stack[-1]
+                top[2] = False
+                if len(stack) == 1 and top[1] == 'error':
+                    self.errorStart = pos + 1
+            pos += 1
+        self.pos = pos
+        self.trim()
+        return elements
+
+    def readElements(self, pos, elements):
+        # decode complete elements of the array, leaving the array when it is closed
+        buffer = self.buffer
+        while True:
+            pos = whitespace.match(buffer, pos).end()
+            if pos >= len(buffer):
+                return pos
+            char = buffer[pos]
+            if char == ']':
+                self.inArray = False
+                self.stack.pop()
+                self.closed(pos + 1)
+                return pos + 1
+            if char == ',':
+                pos += 1
+                continue
+            if len(buffer) - pos < self.retryLength:
+                return pos
+            try:
+                element, end = rawDecode(buffer, pos)
+            except ValueError:
+                # incomplete element, wait until it has doubled in size so large elements are not decoded over and over
+                self.retryLength = 2 * (len(buffer) - pos)
+                return pos
+            self.retryLength = 0
+            if end == len(buffer) or buffer[end] not in ', \t\n\r]':
+                # a number is only complete once the character after it has been received
+                return pos
+            elements.append(element)
+            pos = end
+
+    def closed(self, end):
+        # a container ending at end was closed
+        if self.errorStart is not None and len(self.stack) <= 1:
+            self.raiseError(end if self.stack else end - 1)
+        if not self.stack:
+            self.done = True
+
+    def close(self):
+        """
+        Decode the elements still held back and check that the whole response was received
+
+        :return: remaining decoded elements
+        :rtype: list
+        :raises Exception: if the response ended early or did not hold a JSON object
+
+        """
+        elements = []
+        if not self.done and self.inArray:
+            self.retryLength = 0
+            elements = self.feed(b'')
+        if not self.done:
+            raise Exception('The response ended before it was complete')
+        return elements
+
+    def atPath(self):
+        # whether an array opened now sits at self.path, inside objects only
+        stack = self.stack
+        if len(stack) != len(self.path):
+            return False
+        for entry, key in zip(stack, self.path):
+            if not entry[0] or entry[1] != key:
+                return False
+        return True
+
+    def raiseError(self, end):
+        raise BramblRpcError(loads(self.buffer[self.errorStart:end]))
+
+    def trim(self):
+        # drop everything before the oldest position still needed
+        keep = self.pos
+        for start in (self.stringStart, self.errorStart):
+            if start is not None and start < keep:
+                keep = start
+        if keep:
+            self.buffer = self.buffer[keep:]
+            self.pos -= keep
+            if self.stringStart is not None:
+                self.stringStart -= keep
+            if self.errorStart is not None:
+                self.errorStart -= keep
+
+
+# json-rpc method -> decoder of the streamed array elements
+elementDecoders = {
+    'mempool': MempoolEntry,
+    'blockById': Transaction
+}
+
+
+def decodeElement(method, element):
+    """
+    Turn a streamed array element into its result object (see `decodeResult`)
+
+    :param method: json-rpc method of the streamed response
+    :param element: decoded array element
+    :type method: string
+    :type element: JSON value
+    :return: result object, or the decoded element
+    :rtype: `Result` instance or JSON value
+
+    """
+    decoder = elementDecoders.get(method)
+    if decoder is None or not isinstance(element, dict):
+        return element
+    return decoder(element)
+
@@ -0,0 +1,98 @@
+"""
+Base58.py
+====================================
+
+Base58 codec (bitcoin alphabet) used for keys, signatures and digests throughout the library.
+Output is byte for byte the same as the `base58` package, but encoding emits two characters per
+big integer division and decoding validates and maps the whole input with one `bytes.translate`.
+
+"""
+alphabet = b'123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+# every pair of base58 characters, indexed by its value 0 to 58*58-1
+pairs = [bytes((alphabet[i // 58], alphabet[i % 58])) for i in range(58 * 58)]
+
+# character -> digit value, 255 for characters outside the alphabet
+digits = bytearray(b'\xff' * 256)
+for index, char in enumerate(alphabet):
+    digits[char] = index
+digits = bytes(digits)
+del index, char
+
+
+def encode(value):
+    """
+    Encode bytes to base58
+
+    :param value: input to encode, strings must be ascii
+    :type value: bytes or string
+    :return: base58 encoded input
+    :rtype: bytes
+
+    """
+    if isinstance(value, str):
+        value = value.encode('ascii')
+    stripped = value.lstrip(b'\0')
+    acc = int.from_bytes(stripped, 'big')
+    out = []
+    while acc:
+        acc, pair = divmod(acc, 3364)
+        out.append(pairs[pair])
+    out.reverse()
+    encoded = b''.join(out)
+    # the leading pair may hold a single character padded with a zero digit
+    if encoded[:1] == b'1':
+        encoded = encoded[1:]
+    return b'1' * (len(value) - len(stripped)) + encoded
+
+
+def decode(value):
+    """
+    Decode base58 to bytes. Trailing whitespace is ignored.
+
+    :param value: base58 encoded input
+    :type value: bytes or string
+    :return: decoded input
+    :rtype: bytes
+    :raises ValueError: if the input contains a character outside the base58 alphabet
+
+    """
+    value = value.rstrip()
+    if isinstance(value, str):
+        value = value.encode('ascii')
+    stripped = value.lstrip(b'1')
+    values = stripped.translate(digits)
+    invalid = values.find(b'\xff')
+    if invalid >= 0:
+        raise ValueError('Invalid character {!r}'.format(chr(stripped[invalid])))
+    acc = 0
+    for digit in values:
+        acc = acc * 58 + digit
+    return b'\0' * (len(value) - len(stripped)) + acc.to_bytes((acc.bit_length() + 7) // 8, 'big')
+
+
+def encodeMany(values):
+    """
+    Encode many inputs to base58
+
+    :param values: inputs to encode
+    :type values: iterable
+    :return: base58 encoding of every input, in order
+    :rtype: list
+
+    """
+    return [encode(value) for value in values]
+
+
+def decodeMany(values):
+    """
+    Decode many base58 inputs
+
+    :param values: base58 encoded inputs
+    :type values: iterable
+    :return: decoding of every input, in order
+    :rtype: list
+    :raises ValueError: if an input contains a character outside the base58 alphabet
+
+    """
+    return [decode(value) for value in values]
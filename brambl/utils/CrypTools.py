@@ -1,31 +1,222 @@
 import os
 import sys
 from Crypto.Hash import BLAKE2b
-from Crypto.Cipher import AES
 from Crypto.Protocol.KDF import scrypt
 from Crypto.Random import get_random_bytes
 import axolotl_curve25519 as curve
-import base58
-import pyaes
 from binascii import hexlify
+from concurrent.futures import ProcessPoolExecutor
+
+from . import Base58
+
+# Cipher backends are optional, at least one of them must be installed
+try:
+    from Crypto.Cipher import AES
+except ImportError:
+    AES = None
+
+try:
+    import pyaes
+except ImportError:
+    pyaes = None
 
 #curve25519 Test
 def sigverify(pubKey,message, signature):
-    verified = curve.verifySignature(pubKey,base58.b58encode(message),signature)
+    verified = curve.verifySignature(pubKey,Base58.encode(message),signature)
     if verified == 0:#return 0 if verified
         return True
     else:
         return False
 
+
+# Batch curve25519 verification
+
+# batches smaller than this are verified in the calling process, since starting worker processes costs more
+parallelThreshold = 4096
+
+def decodeRaw(value, rawLength):
+    # values already of the raw length are used as is, anything else is base58 decoded
+    if isinstance(value, (bytes, bytearray)) and len(value) == rawLength:
+        return bytes(value)
+    return Base58.decode(value)
+
+def verifyChunk(chunk):
+    """
+    Verify decoded (publicKey, message, signature) triples. Module level so that it can be run in worker processes.
+
+    :param chunk: decoded triples
+    :type chunk: list
+    :return: one byte per triple, 1 if the signature is valid and 0 otherwise
+    :rtype: bytes
+
+    """
+    verifySignature = curve.verifySignature
+    return bytes(len(publicKey) == 32 and len(signature) == 64 and verifySignature(publicKey, message, signature) == 0
+                 for publicKey, message, signature in chunk)
+
+def sigverifyMany(triples, workers=None, chunkSize=1024):
+    """
+    Verify many curve25519 signatures at once. Inputs are decoded in one pass and large batches are
+    verified in parallel over a pool of worker processes.
+
+    :param triples: (publicKey, message, signature) triples. Public keys and signatures may be raw bytes or
+        base58 encoded, messages are utf-8 encoded if given as strings
+    :param workers: number of worker processes, defaults to the number of CPUs (1 verifies in this process)
+    :param chunkSize: number of signatures sent to a worker at a time
+    :type triples: iterable
+    :type workers: number
+    :type chunkSize: number
+    :return: compact boolean array with one byte per triple, 1 if the signature is valid and 0 otherwise
+    :rtype: bytearray
+
+    """
+    decoded = []
+    for publicKey, message, signature in triples:
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        try:
+            decoded.append((decodeRaw(publicKey, 32), message, decodeRaw(signature, 64)))
+        except ValueError:
+            # undecodable input can never verify
+            decoded.append((b'', message, b''))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(decoded) < parallelThreshold:
+        return bytearray(verifyChunk(decoded))
+
+    chunks = [decoded[i:i + chunkSize] for i in range(0, len(decoded), chunkSize)]
+    result = bytearray()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for verified in pool.map(verifyChunk, chunks):
+            result += verified
+    return result
+
+#AES-CTR cipher backends
+def toBytes(data):
+    # str input is converted the way pyaes does it (one byte per character)
+    if isinstance(data, str):
+        return data.encode('latin-1')
+    return bytes(data)
+
+
+class NativeAESCTR():
+    """
+    AES-CTR backed by the compiled implementation of pycryptodome. The counter is a full 128-bit
+    big-endian block starting at iv, which is the keystore format produced by pyaes.Counter(iv).
+
+    """
+    name = 'native'
+
+    def encrypt(self, plaintext, key, iv):
+        """
+        Encrypt data with AES in counter mode
+
+        :param plaintext: Data to be encrypted
+        :param key: A secret key (16, 24 or 32 bytes)
+        :param iv: initial counter value
+        :type plaintext: bytes or string
+        :type key: bytes
+        :type iv: number
+        :return: encrypted data
+        :rtype: bytes
+
+        """
+        return AES.new(bytes(key), AES.MODE_CTR, nonce=b'', initial_value=iv).encrypt(toBytes(plaintext))
+
+    def decrypt(self, ciphertext, key, iv):
+        """
+        Decrypt data with AES in counter mode
+
+        :param ciphertext: Data to be decrypted
+        :param key: A secret key (16, 24 or 32 bytes)
+        :param iv: initial counter value
+        :type ciphertext: bytes
+        :type key: bytes
+        :type iv: number
+        :return: decrypted data
+        :rtype: bytes
+
+        """
+        return AES.new(bytes(key), AES.MODE_CTR, nonce=b'', initial_value=iv).decrypt(toBytes(ciphertext))
+
+
+class PyaesCTR():
+    """
+    Pure-Python AES-CTR from pyaes, used as a fallback when pycryptodome is not available
+
+    """
+    name = 'pyaes'
+
+    def encrypt(self, plaintext, key, iv):
+        return pyaes.AESModeOfOperationCTR(bytes(key), pyaes.Counter(iv)).encrypt(toBytes(plaintext))
+
+    def decrypt(self, ciphertext, key, iv):
+        return pyaes.AESModeOfOperationCTR(bytes(key), pyaes.Counter(iv)).decrypt(toBytes(ciphertext))
+
+
+cipherBackends = {}
+if AES is not None:
+    cipherBackends['native'] = NativeAESCTR()
+if pyaes is not None:
+    cipherBackends['pyaes'] = PyaesCTR()
+if not cipherBackends:
+    raise ImportError('Either pycryptodome or pyaes must be installed for AES encryption')
+
+# the native backend is preferred whenever it is installed
+cipherBackend = cipherBackends.get('native', cipherBackends.get('pyaes'))
+
+
+def registerCipherBackend(backend):
+    """
+    Make an AES-CTR backend available to `setCipherBackend`. A backend is any object with a `name`
+    attribute and `encrypt(data, key, iv)` and `decrypt(data, key, iv)` methods producing the same
+    output as `NativeAESCTR`.
+
+    :param backend: cipher backend
+    :type backend: object
+
+    """
+    cipherBackends[backend.name] = backend
+
+
+def setCipherBackend(name):
+    """
+    Select the AES-CTR backend used for keystore encryption
+
+    :param name: name of a registered backend ('native' or 'pyaes')
+    :type name: string
+
+    """
+    global cipherBackend
+    if name not in cipherBackends:
+        raise Exception('Cipher backend not available: ' + name)
+    cipherBackend = cipherBackends[name]
+
+
+def getCipherBackend(name=None):
+    """
+    Getter for an AES-CTR backend
+
+    :param name: name of a registered backend, defaults to the selected backend
+    :type name: string
+    :return: cipher backend
+    :rtype: object
+
+    """
+    if name is None:
+        return cipherBackend
+    if name not in cipherBackends:
+        raise Exception('Cipher backend not available: ' + name)
+    return cipherBackends[name]
+
+
 #AES Test
 def aesCipher(algorithm,plaintext, key, iv):
     if algorithm != 'aes-256-ctr':
         raise Exception('Algorithm not supported')
-    aes = pyaes.AESModeOfOperationCTR(key,pyaes.Counter(iv))
-    ciphertext = aes.encrypt(plaintext)
+    ciphertext = cipherBackend.encrypt(plaintext, key, iv)
     return ciphertext
 
     
 def aesDecipher(ciphertext,key,iv):
-    aes = pyaes.AESModeOfOperationCTR(key,pyaes.Counter(iv))
-    return aes.decrypt(ciphertext).decode('utf-8')
+    return cipherBackend.decrypt(ciphertext, key, iv).decode('utf-8')
@@ -6,8 +6,18 @@ Hash.py
 # Dependencies
 from Crypto.Hash import BLAKE2b
 import base64
-import base58
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
 from binascii import hexlify
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from . import Base58
 
 def hashFunc():
     """
@@ -30,15 +40,30 @@ def digestAndEncode(hash,encoding):#switch statement does not exist
     :return: Blake2b-256 hash digest
     :rtype: Blake2b-256 hash
 
+    """
+    return encodeDigest(hash.digest(),encoding)
+
+
+def encodeDigest(digest,encoding):
+    """
+    Encode a raw hash digest
+
+    :param digest: raw digest
+    :param encoding: output encoding
+    :type digest: bytes
+    :type encoding: string
+    :return: encoded digest
+    :rtype: bytes
+
     """
     if encoding == 'hex':
-        return hexlify(hash.digest())
+        return hexlify(digest)
     elif encoding == 'base64':
-        return base64.b64encode(hash.digest())
+        return base64.b64encode(digest)
     elif encoding == 'base58':
-        return base58.b58encode(hash.digest())
+        return Base58.encode(digest)
     else:
-        return hash.digest()
+        return digest
 
 
 def string(message,encoding):
@@ -58,31 +83,314 @@ def string(message,encoding):
     return (digestAndEncode(hash,encoding)).decode('utf-8')
 
 
-def file(filePath,encoding):
+def strings(messages,encoding):
+    """
+    Calculates the Blake2b-256 of many string inputs in one call. Each message is hashed exactly
+    like `string`, but the per-message overhead is kept to a minimum and the digests are encoded in bulk.
+
+    :param messages: input string messages (or bytes) to create the hash digests of
+    :param encoding: output encoding
+    :type messages: iterable
+    :type encoding: string
+    :return: Blake2b-256 hash digest of every message in order, as a list of strings or, for the raw encoding, the 32 byte digests packed into one bytes object
+    :rtype: list or bytes
+
+    """
+    digest = partial(hashlib.blake2b, digest_size=32)
+    digests = [digest(m.encode('utf-8') if isinstance(m, str) else m).digest() for m in messages]
+    if encoding == 'hex':
+        encoded = hexlify(b''.join(digests)).decode('utf-8')
+        return [encoded[i:i + 64] for i in range(0, len(encoded), 64)]
+    elif encoding == 'base64':
+        return [e.decode('utf-8') for e in map(base64.b64encode, digests)]
+    elif encoding == 'base58':
+        return [e.decode('utf-8') for e in Base58.encodeMany(digests)]
+    else:
+        return b''.join(digests)
+
+
+def file(filePath,encoding,blockSize=65536,useMmap=False):
     """
     Reads the file from disk and calculates the Blake2b-256
 
     :param filepath: path to the input file
     :param encoding: output encoding
+    :param blockSize: number of bytes hashed at a time, defaults to 64kb
+    :param useMmap: map the file into memory instead of reading it, which avoids copying large files
     :type filepath: string
     :type encoding: string
+    :type blockSize: number
+    :type useMmap: boolean
     :return: Blake2b-256 hash digest
     :rtype: Blake2b-256 hash
 
     """
-    BLOCK_SIZE = 65536    #64kb
+    return digestAndEncode(fileHash(filePath,blockSize,useMmap),encoding).decode('utf-8')
+
+
+def fileHash(filePath,blockSize=65536,useMmap=False):
+    """
+    Reads the file from disk into a Blake2b-256 hash function (see `file`)
+
+    :param filepath: path to the input file
+    :param blockSize: number of bytes hashed at a time, defaults to 64kb
+    :param useMmap: map the file into memory instead of reading it
+    :type filepath: string
+    :type blockSize: number
+    :type useMmap: boolean
+    :return: hash function updated with the file contents
+    :rtype: Blake2b-256 hash
+
+    """
     hash = hashFunc()
     with open(filePath,'rb') as f:
-        fb = f.read(BLOCK_SIZE)
-        while len(fb) > 0:
-            hash.update(fb)
-            fb = f.read(BLOCK_SIZE)
-    return digestAndEncode(hash,encoding).decode('utf-8')
+        if useMmap:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files cannot be mapped
+                mapped = None
+            if mapped is not None:
+                with mapped:
+                    view = memoryview(mapped)
+                    try:
+                        for start in range(0, len(view), blockSize):
+                            hash.update(view[start:start + blockSize])
+                    finally:
+                        view.release()
+        else:
+            fb = f.read(blockSize)
+            while len(fb) > 0:
+                hash.update(fb)
+                fb = f.read(blockSize)
+    return hash
+
+
+def files(paths,encoding,workers=None,blockSize=65536,useMmap=False):
+    """
+    Calculates the Blake2b-256 of many files concurrently. Hashing releases the GIL, so files are
+    read and hashed in parallel on a pool of threads.
+
+    :param paths: paths to the input files
+    :param encoding: output encoding
+    :param workers: number of threads, defaults to the executor default
+    :param blockSize: number of bytes hashed at a time, defaults to 64kb
+    :param useMmap: map the files into memory instead of reading them
+    :type paths: list
+    :type encoding: string
+    :type workers: number
+    :type blockSize: number
+    :type useMmap: boolean
+    :return: manifest of path to Blake2b-256 hash digest, in the order of paths
+    :rtype: dictionary
+
+    """
+    paths = list(paths)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = pool.map(lambda path: file(path,encoding,blockSize,useMmap), paths)
+        return dict(zip(paths, digests))
+
+
+def manifest(entries,encoding):
+    """
+    Calculates the Blake2b-256 of a manifest produced by `files`. The manifest is serialized as JSON with
+    sorted keys and no whitespace first, so the digest does not depend on the order the files were hashed in.
+
+    :param entries: path to digest mapping
+    :param encoding: output encoding
+    :type entries: dictionary
+    :type encoding: string
+    :return: Blake2b-256 hash digest
+    :rtype: Blake2b-256 hash
+
+    """
+    return string(json.dumps(entries, sort_keys=True, separators=(',',':')),encoding)
+
+
+class DigestCache():
+    """
+    Persistent cache of file digests. A digest is keyed by the path, inode, size and modification time
+    of its file, so an unchanged file is never read again and a changed file is always rehashed.
+
+    The cache is stored in a compact binary file: a 4 byte header followed by one record per file
+    holding the inode, size, modification time (ns), the raw 32 byte digest and the path. `files`
+    saves the cache every `checkpoint` newly hashed files, so an interrupted run over a large store
+    resumes from the last checkpoint. A single file cannot be resumed part way, since the BLAKE2b
+    implementations available do not expose their internal state.
+
+    :param cachePath: path of the cache file (created if missing)
+    :param checkpoint: number of newly hashed files between saves in `files`, defaults to 64
+    :type cachePath: string
+    :type checkpoint: number
+    :return: `DigestCache` object
+    :rtype: instance of `DigestCache`
+
+    """
+    header = b'BDC1'
+    record = struct.Struct('>QQqH32s')
+
+    def __init__(self, cachePath, checkpoint=64):
+        self.cachePath = cachePath
+        self.checkpoint = checkpoint
+        self.entries = {}
+        self.lock = threading.Lock()
+        # serializes saves, so concurrent checkpoints never share the temporary file
+        self.saveLock = threading.Lock()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.save()
+
+    def load(self):
+        try:
+            with open(self.cachePath, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        if data[:4] != self.header:
+            return
+        offset = 4
+        size = self.record.size
+        while offset + size <= len(data):
+            inode, fileSize, mtime, pathLength, digest = self.record.unpack_from(data, offset)
+            offset += size
+            path = data[offset:offset + pathLength].decode('utf-8', 'surrogateescape')
+            offset += pathLength
+            self.entries[path] = (inode, fileSize, mtime, digest)
+
+    def save(self):
+        """
+        Write the cache to disk if it changed. The write is atomic, so an interrupted save leaves the previous cache intact.
+
+        """
+        with self.saveLock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                chunks = [self.header]
+                for path, (inode, fileSize, mtime, digest) in self.entries.items():
+                    encoded = path.encode('utf-8', 'surrogateescape')
+                    chunks.append(self.record.pack(inode, fileSize, mtime, len(encoded), digest))
+                    chunks.append(encoded)
+                self.dirty = False
+            tmpPath = self.cachePath + '.tmp'
+            with open(tmpPath, 'wb') as f:
+                f.write(b''.join(chunks))
+            os.replace(tmpPath, self.cachePath)
+
+    def prune(self):
+        """
+        Remove the entries of files that no longer exist or have changed
+
+        """
+        with self.lock:
+            for path, entry in list(self.entries.items()):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    stat = None
+                if stat is None or entry[:3] != (stat.st_ino, stat.st_size, stat.st_mtime_ns):
+                    del self.entries[path]
+                    self.dirty = True
+
+    def digest(self, filePath, blockSize=65536, useMmap=False):
+        """
+        Raw Blake2b-256 digest of a file, read from the cache if the file is unchanged
+
+        :param filepath: path to the input file
+        :param blockSize: number of bytes hashed at a time, defaults to 64kb
+        :param useMmap: map the file into memory instead of reading it
+        :type filepath: string
+        :type blockSize: number
+        :type useMmap: boolean
+        :return: Blake2b-256 hash digest
+        :rtype: bytes
+
+        """
+        return self.lookup(filePath, blockSize, useMmap)[0]
+
+    def lookup(self, filePath, blockSize=65536, useMmap=False):
+        # returns the raw digest and whether the file had to be read
+        path = os.path.abspath(filePath)
+        stat = os.stat(path)
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[:3] == key:
+                self.hits += 1
+                return entry[3], False
+            self.misses += 1
+        digest = fileHash(path, blockSize, useMmap).digest()
+        after = os.stat(path)
+        # files changed while being hashed, or so recently that a further change may not move their
+        # modification time, are not cached
+        if (after.st_ino, after.st_size, after.st_mtime_ns) == key and time.time() - stat.st_mtime > 2:
+            with self.lock:
+                self.entries[path] = key + (digest,)
+                self.dirty = True
+        return digest, True
+
+    def file(self, filePath, encoding, blockSize=65536, useMmap=False):
+        """
+        Calculates the Blake2b-256 of a file like `Hash.file`, reading it only if it changed since it was last hashed
 
+        :param filepath: path to the input file
+        :param encoding: output encoding
+        :param blockSize: number of bytes hashed at a time, defaults to 64kb
+        :param useMmap: map the file into memory instead of reading it
+        :type filepath: string
+        :type encoding: string
+        :type blockSize: number
+        :type useMmap: boolean
+        :return: Blake2b-256 hash digest
+        :rtype: Blake2b-256 hash
 
+        """
+        return encodeDigest(self.digest(filePath, blockSize, useMmap), encoding).decode('utf-8')
 
+    def files(self, paths, encoding, workers=None, blockSize=65536, useMmap=False):
+        """
+        Calculates the Blake2b-256 of many files concurrently like `Hash.files`, reading only files that
+        changed and saving the cache every `checkpoint` newly hashed files
 
+        :param paths: paths to the input files
+        :param encoding: output encoding
+        :param workers: number of threads, defaults to the executor default
+        :param blockSize: number of bytes hashed at a time, defaults to 64kb
+        :param useMmap: map the files into memory instead of reading them
+        :type paths: list
+        :type encoding: string
+        :type workers: number
+        :type blockSize: number
+        :type useMmap: boolean
+        :return: manifest of path to Blake2b-256 hash digest, in the order of paths
+        :rtype: dictionary
 
+        """
+        paths = list(paths)
+        hashed = [0]
 
+        def hashOne(path):
+            digest, read = self.lookup(path, blockSize, useMmap)
+            if read:
+                with self.lock:
+                    hashed[0] += 1
+                    save = hashed[0] % self.checkpoint == 0
+                if save:
+                    self.save()
+            return encodeDigest(digest, encoding).decode('utf-8')
 
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            manifest = dict(zip(paths, pool.map(hashOne, paths)))
+        self.save()
+        return manifest
 
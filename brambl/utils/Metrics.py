@@ -0,0 +1,148 @@
+"""
+Metrics.py
+====================================
+
+Per json-rpc method instrumentation of the `Requests` layer. A `RpcMetrics` instance passed to `Requests`
+(or `AsyncRequests`, `MultiRequests`) records, for every (route, method), the number of requests, the
+number of failed HTTP exchanges, the bytes sent and received and a histogram of the request latency.
+Instances created without metrics record nothing.
+
+"""
+# Dependencies
+import threading
+from bisect import bisect_left
+
+# upper bounds (in seconds) of the latency histogram buckets
+defaultBuckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def escapeLabel(value):
+    # label values in the Prometheus text format escape backslashes, quotes and newlines
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def formatValue(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class RpcMetrics():
+    """
+    Thread-safe counters and latency histograms of json-rpc requests, keyed by (route, method).
+    Batches are recorded under the method 'batch'.
+
+    :param buckets: upper bounds (in seconds) of the latency histogram buckets, defaults to `defaultBuckets`
+    :type buckets: list
+    :return: `RpcMetrics` object
+    :rtype: instance of `RpcMetrics`
+
+    """
+    def __init__(self, buckets = defaultBuckets):
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def record(self, route, method, latency, bytesOut, bytesIn, error = False):
+        """
+        Record one request
+
+        :param route: request route (i.e. 'nodeView/')
+        :param method: json-rpc method, 'batch' for batches
+        :param latency: time (in seconds) from sending the request to receiving the whole response
+        :param bytesOut: size of the request body
+        :param bytesIn: size of the response body
+        :param error: whether the HTTP exchange failed
+        :type route: string
+        :type method: string
+        :type latency: number
+        :type bytesOut: number
+        :type bytesIn: number
+        :type error: boolean
+
+        """
+        bucket = bisect_left(self.buckets, latency)
+        with self.lock:
+            series = self.series.get((route, method))
+            if series is None:
+                # count, errors, bytesOut, bytesIn, latency sum, then one count per bucket and one for +Inf
+                series = self.series[(route, method)] = [0, 0, 0, 0, 0.0] + [0] * (len(self.buckets) + 1)
+            series[0] += 1
+            if error:
+                series[1] += 1
+            series[2] += bytesOut
+            series[3] += bytesIn
+            series[4] += latency
+            series[5 + bucket] += 1
+
+    def reset(self):
+        """
+        Remove every recorded request
+
+        """
+        with self.lock:
+            self.series = {}
+
+    def snapshot(self):
+        """
+        Copy of the recorded metrics
+
+        :return: for every (route, method), its 'count', 'errors', 'bytesOut', 'bytesIn', 'latencySum' and
+            'buckets', a list of (upper bound, cumulative count) pairs ending with (float('inf'), count)
+        :rtype: dictionary
+
+        """
+        with self.lock:
+            series = {key: list(values) for key, values in self.series.items()}
+        bounds = self.buckets + (float('inf'),)
+        snapshot = {}
+        for key, values in series.items():
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(bounds, values[5:]):
+                cumulative += count
+                buckets.append((bound, cumulative))
+            snapshot[key] = {
+                'count': values[0],
+                'errors': values[1],
+                'bytesOut': values[2],
+                'bytesIn': values[3],
+                'latencySum': values[4],
+                'buckets': buckets
+            }
+        return snapshot
+
+    def prometheus(self, prefix = 'brambl_rpc'):
+        """
+        Export the recorded metrics in the Prometheus text exposition format
+
+        :param prefix: prefix of the metric names, defaults to 'brambl_rpc'
+        :type prefix: string
+        :return: metrics text, ready to be served or written to a file for a node exporter
+        :rtype: string
+
+        """
+        snapshot = sorted(self.snapshot().items())
+        lines = []
+        counters = [
+            ('requests_total', 'count', 'Number of json-rpc requests sent'),
+            ('errors_total', 'errors', 'Number of json-rpc requests whose HTTP exchange failed'),
+            ('request_bytes_total', 'bytesOut', 'Bytes sent in json-rpc request bodies'),
+            ('response_bytes_total', 'bytesIn', 'Bytes received in json-rpc response bodies')
+        ]
+        for name, field, description in counters:
+            lines.append('# HELP %s_%s %s' % (prefix, name, description))
+            lines.append('# TYPE %s_%s counter' % (prefix, name))
+            for (route, method), values in snapshot:
+                lines.append('%s_%s{route="%s",method="%s"} %s' % (prefix, name, escapeLabel(route), escapeLabel(method), formatValue(values[field])))
+        name = prefix + '_latency_seconds'
+        lines.append('# HELP %s Latency of json-rpc requests' % name)
+        lines.append('# TYPE %s histogram' % name)
+        for (route, method), values in snapshot:
+            labels = 'route="%s",method="%s"' % (escapeLabel(route), escapeLabel(method))
+            for bound, count in values['buckets']:
+                le = '+Inf' if bound == float('inf') else formatValue(float(bound))
+                lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, le, count))
+            lines.append('%s_sum{%s} %s' % (name, labels, formatValue(float(values['latencySum']))))
+            lines.append('%s_count{%s} %d' % (name, labels, values['count']))
+        return '\n'.join(lines) + '\n'
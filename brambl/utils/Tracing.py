@@ -0,0 +1,348 @@
+"""
+Tracing.py
+====================================
+
+Lightweight tracing of the transaction lifecycle. Spans are opened around the stages of a transaction
+(prototype request, prototype decoding, signing, broadcast) and around every request and key operation,
+and nest through `contextvars`, so spans opened in coroutines, tasks and threads started with a copied
+context are attached to the span that started them. Finished spans are handed to the exporter set with
+`setExporter`; while no exporter is set, `span` returns a shared no-op span and nothing is recorded.
+
+Example:
+    exporter = Tracing.InMemoryExporter()
+    Tracing.setExporter(exporter)
+    await brambl.transaction('transferAssetsPrototype', params)
+    print(exporter.summary())
+
+"""
+# Dependencies
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+
+# span of the running code, None outside of any span
+currentSpanVar = contextvars.ContextVar('brambl_current_span', default = None)
+
+# exporter receiving finished spans, None while tracing is disabled
+exporter = None
+
+
+class Span():
+    """
+    A timed operation with attributes. Spans are context managers: entering one makes it the current
+    span of the running context, exiting it records its duration (and the type and message of the
+    exception that ended it, if any) and exports it.
+
+    :param name: name of the operation (i.e. 'requests.sendRequest')
+    :param attributes: attributes describing the operation
+    :param exporter: exporter receiving the span once it ends
+    :type name: string
+    :type attributes: dictionary
+    :type exporter: exporter instance
+    :return: `Span` object
+    :rtype: instance of `Span`
+
+    """
+    __slots__ = ('name', 'attributes', 'exporter', 'traceId', 'spanId', 'parentId', 'start', 'duration', 'error', 'startTime', 'token')
+
+    def __init__(self, name, attributes, exporter):
+        self.name = name
+        self.attributes = attributes
+        self.exporter = exporter
+        self.traceId = None
+        self.spanId = os.urandom(8).hex()
+        self.parentId = None
+        self.start = None
+        self.duration = None
+        self.error = None
+        self.startTime = None
+        self.token = None
+
+    def __enter__(self):
+        parent = currentSpanVar.get()
+        if parent is None:
+            self.traceId = os.urandom(16).hex()
+        else:
+            self.traceId = parent.traceId
+            self.parentId = parent.spanId
+        self.token = currentSpanVar.set(self)
+        self.start = time.time()
+        self.startTime = time.perf_counter()
+        return self
+
+    def __exit__(self, errorType, error, traceback):
+        self.duration = time.perf_counter() - self.startTime
+        if errorType is not None:
+            self.error = '%s: %s' % (errorType.__name__, error)
+        currentSpanVar.reset(self.token)
+        self.token = None
+        self.exporter.export(self)
+        return False
+
+    def setAttribute(self, key, value):
+        """
+        Add or replace an attribute of the span
+
+        :param key: attribute name
+        :param value: attribute value, which should be serializable to JSON
+        :type key: string
+
+        """
+        self.attributes[key] = value
+
+    def toDict(self):
+        """
+        :return: 'name', 'traceId', 'spanId', 'parentId', 'start' (epoch seconds), 'duration' (seconds), 'error' and 'attributes' of the span
+        :rtype: dictionary
+
+        """
+        return {
+            'name': self.name,
+            'traceId': self.traceId,
+            'spanId': self.spanId,
+            'parentId': self.parentId,
+            'start': self.start,
+            'duration': self.duration,
+            'error': self.error,
+            'attributes': self.attributes
+        }
+
+
+class NoopSpan():
+    """
+    Span returned while tracing is disabled, which records nothing
+
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, errorType, error, traceback):
+        return False
+
+    def setAttribute(self, key, value):
+        pass
+
+
+noopSpan = NoopSpan()
+
+
+def span(name, **attributes):
+    """
+    Create a span to be used as a context manager around an operation
+
+    Example:
+        with Tracing.span('keyManager.sign', size=len(message)):
+            ...
+
+    :param name: name of the operation
+    :param attributes: attributes describing the operation
+    :type name: string
+    :return: new span, or the shared no-op span if tracing is disabled
+    :rtype: `Span` or `NoopSpan` instance
+
+    """
+    current = exporter
+    if current is None:
+        return noopSpan
+    return Span(name, attributes, current)
+
+
+def enabled():
+    """
+    :return: whether spans are being recorded
+    :rtype: boolean
+
+    """
+    return exporter is not None
+
+
+def currentSpan():
+    """
+    :return: span of the running code, None outside of any span
+    :rtype: `Span` instance
+
+    """
+    return currentSpanVar.get()
+
+
+def setExporter(newExporter):
+    """
+    Set the exporter receiving finished spans, enabling tracing. Spans already open keep the exporter
+    they were created with.
+
+    :param newExporter: object with an export(span) method (i.e. `InMemoryExporter`), None to disable tracing
+    :type newExporter: exporter instance
+    :return: the previous exporter
+    :rtype: exporter instance
+
+    """
+    global exporter
+    previous = exporter
+    exporter = newExporter
+    return previous
+
+
+def percentile(durations, fraction):
+    # nearest-rank percentile of sorted durations; the rank is rounded to absorb float error (0.07 * 100 = 7.000000000000001)
+    index = max(0, min(len(durations) - 1, math.ceil(round(fraction * len(durations), 9)) - 1))
+    return durations[index]
+
+
+def summarize(spans):
+    """
+    Aggregate span durations by span name, to attribute latency to the stages of many transactions
+
+    :param spans: finished spans (or their `toDict` form)
+    :type spans: list
+    :return: for every span name, its 'count', 'errors', 'total', 'mean', 'p50', 'p95', 'p99' and 'max' duration in seconds
+    :rtype: dictionary
+
+    """
+    durations = {}
+    errors = {}
+    for finished in spans:
+        if isinstance(finished, dict):
+            name, duration, error = finished['name'], finished['duration'], finished['error']
+        else:
+            name, duration, error = finished.name, finished.duration, finished.error
+        durations.setdefault(name, []).append(duration)
+        if error is not None:
+            errors[name] = errors.get(name, 0) + 1
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        total = sum(values)
+        summary[name] = {
+            'count': len(values),
+            'errors': errors.get(name, 0),
+            'total': total,
+            'mean': total / len(values),
+            'p50': percentile(values, 0.5),
+            'p95': percentile(values, 0.95),
+            'p99': percentile(values, 0.99),
+            'max': values[-1]
+        }
+    return summary
+
+
+class InMemoryExporter():
+    """
+    Exporter keeping finished spans in a list, optionally bounded to the most recent maxSpans spans
+
+    :param maxSpans: maximum number of spans kept, defaults to no limit
+    :type maxSpans: number
+    :return: `InMemoryExporter` object
+    :rtype: instance of `InMemoryExporter`
+
+    """
+    def __init__(self, maxSpans = None):
+        self.maxSpans = maxSpans
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.spans)
+
+    def export(self, span):
+        with self.lock:
+            self.spans.append(span)
+            if self.maxSpans is not None and len(self.spans) > self.maxSpans:
+                del self.spans[:len(self.spans) - self.maxSpans]
+
+    def clear(self):
+        """
+        Remove every span kept
+
+        """
+        with self.lock:
+            self.spans = []
+
+    def trace(self, traceId):
+        """
+        :param traceId: id of a trace
+        :type traceId: string
+        :return: spans of the trace, in the order they finished
+        :rtype: list
+
+        """
+        with self.lock:
+            return [span for span in self.spans if span.traceId == traceId]
+
+    def summary(self):
+        """
+        Aggregate the spans kept by name (see `summarize`)
+
+        :return: statistics of every span name
+        :rtype: dictionary
+
+        """
+        with self.lock:
+            spans = list(self.spans)
+        return summarize(spans)
+
+
+class JsonLinesExporter():
+    """
+    Exporter appending every finished span as one JSON object per line (see `Span.toDict`) to a file.
+    Attributes that are not serializable to JSON are written as strings.
+
+    :param path: path of the file, created if it does not exist
+    :param flushEvery: number of spans written between flushes to disk, defaults to 100
+    :type path: string
+    :type flushEvery: number
+    :return: `JsonLinesExporter` object
+    :rtype: instance of `JsonLinesExporter`
+
+    """
+    def __init__(self, path, flushEvery = 100):
+        self.path = path
+        self.flushEvery = flushEvery
+        self.file = open(path, 'a', encoding = 'utf-8')
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    def export(self, span):
+        line = json.dumps(span.toDict(), default = str) + '\n'
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(line)
+            self.pending += 1
+            if self.pending >= self.flushEvery:
+                self.file.flush()
+                self.pending = 0
+
+    def close(self):
+        """
+        Flush and close the file. Spans finishing afterwards are dropped.
+
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load(path):
+    """
+    Read the spans written by a `JsonLinesExporter`
+
+    :param path: path of the file
+    :type path: string
+    :return: spans as dictionaries (see `Span.toDict`)
+    :rtype: list
+
+    """
+    with open(path, encoding = 'utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
@@ -1,12 +1,19 @@
 import unittest
 import json
 from brambl.modules import Requests
+from brambl.lib.bifrostStub import BifrostStub
 
 
 class TestIntegrationRequests(unittest.TestCase):
     
     def setUp(self):
-        self.brambl = Requests.Requests()#implement check if local node is running
+        # a local stand-in for Bifrost, so the requests do not depend on a running node
+        self.stub = BifrostStub().start()
+        self.brambl = Requests.Requests(self.stub.url)
+
+    def tearDown(self):
+        self.brambl.close()
+        self.stub.stop()
 
     def testChainInfo(self):
         self.assertEqual(json.loads(self.brambl.chainInfo())['jsonrpc'],'2.0')
@@ -7,7 +7,7 @@ h = key.getKeyStorage()
 print(h)
 
 sig = key.sign('this is a msg')
-print(KeyManager.base58.b58encode(sig))
+print(KeyManager.Base58.encode(sig))
 
 ver = key.verify(h['publicKeyId'],'this is a msg',sig)
 print(ver)
@@ -6,6 +6,7 @@ from brambl.modules import KeyManager
 from brambl.utils import Hash
 from brambl.utils import CrypTools
 from brambl.Brambl import Brambl
+from brambl.Brambl import signPrototype
 import mock
 
 
@@ -135,6 +136,11 @@ class TestAddSigMethods(unittest.IsolatedAsyncioTestCase):
         signatures_list = json.loads(tx_list)['signatures']
         self.assertEqual(signatures_list, {'VerBy9rzEeYCnFihJtefevmwHmx9iUnRrSbeVBWCmiFf': '8y4GPKUx7rYZnLEL6K58wq4k9qokP6axfqQWLXtAk8WBf4VJqwWjcXuMeTKygRfjNSg5FWaGAwhFGsoQ7A9hVYJu', 'PEkXe94z6TafpNLBB7vt2zvwxcbvUUGZvVpnGyDEVPPa': '7ER7z4Kiup5aL2k8ne6wmTLuh1sRMTfrSWW8kK2kDMaTZ1nsx6WAJhpAYyhVqAsF3zvTRSTHSqao2JU1UjLoZyDp'})
 
+        # signing on the calling thread, or from an already decoded prototype, gives the same transaction
+        self.assertEqual(signPrototype(prototypeTx, key_manager_list), tx_list)
+        tx_decoded = await Brambl.addSigToTx(self=self, prototypeTx=json.loads(prototypeTx), userKeys=key_manager_list)
+        self.assertEqual(tx_decoded, tx_list)
+
 
     #concludes the unit tests
 if __name__ == '__main__':
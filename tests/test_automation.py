@@ -1,16 +1,51 @@
-import pytest
-import os
-import sys
+import asyncio
 import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from unittest import mock
+
+import base58
+import pytest
+
+from brambl import loadgen
+from brambl.Brambl import Brambl, signPrototype
+from brambl.lib import bifrostStub
+from brambl.lib import pipeline
+from brambl.lib import polling
+from brambl.lib import singleflight
+from brambl.modules import AsyncRequests
+from brambl.modules import KeyManager
+from brambl.modules import MultiRequests
+from brambl.modules import Requests
+from brambl.modules import ResponseCache
+from brambl.modules import Responses
+from brambl.utils import Base58
+from brambl.utils import CrypTools
+from brambl.utils import Hash
+from brambl.utils import Metrics
+from brambl.utils import Tracing
+
+
+@pytest.fixture
+def startServer():
+    # starts local json-rpc servers with the given handler class, all shut down once the test ends
+    servers = []
+
+    def start(handler, threaded=True):
+        server = (ThreadingHTTPServer if threaded else HTTPServer)(('127.0.0.1', 0), handler)
+        server.url = 'http://127.0.0.1:%d/' % server.server_port
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
 
-path = os.getcwd() + '/brambl/modules/' #update path once directory rename is sorted
-sys.path.insert(1,path)
-import KeyManager
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
 
-path = os.getcwd() + '/brambl/utils/' #update path once directory rename is sorted
-sys.path.insert(1,path)
-import Hash
-import CrypTools
 
 def test_str2pybuf():
     assert KeyManager.str2pybuf('test') == b'\x99\xc7\xb3'
@@ -34,3 +69,1042 @@ def test_string():
     assert Hash.string('message','hex') == '2e7836cc18ab1db2a2e239ebf4043772b3359520198b5fd55443b01a1023a5b0'
     assert Hash.string('message','base64') == 'Lng2zBirHbKi4jnr9AQ3crM1lSAZi1/VVEOwGhAjpbA='
     assert Hash.string('message','base58') == '48Q5BFky1FezpJW7weo6yfhzPfnjTahJ4wT16NdvQC5M'
+
+def test_strings():
+    messages = ['message', '', 'asset code \u00e9', b'message']
+    for encoding in ['hex', 'base64', 'base58']:
+        assert Hash.strings(messages, encoding) == [Hash.string(m if isinstance(m, str) else m.decode('utf-8'), encoding) for m in messages]
+    packed = Hash.strings(iter(messages), 'raw')
+    assert len(packed) == 32 * len(messages)
+    assert packed[:32] == Hash.hashFunc().update(b'message').digest() == packed[96:]
+    assert Hash.strings([], 'hex') == [] and Hash.strings([], 'raw') == b''
+
+
+class ChainInfoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+
+    requestCount = 0
+
+    @staticmethod
+    def answer(body):
+        if body['method'] == 'info':
+            return {'jsonrpc': '2.0', 'id': body['id'], 'result': {'height': 1}}
+        if body['params'].get('transactionId') == 'unknown':
+            return {'jsonrpc': '2.0', 'id': body['id'], 'error': {'code': 500, 'message': 'Unable to find transaction'}}
+        return {'jsonrpc': '2.0', 'id': body['id'], 'result': body['params']}
+
+    def do_POST(self):
+        ChainInfoHandler.connections.add(self.client_address)
+        ChainInfoHandler.requestCount += 1
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if isinstance(body, list):
+            reply = json.dumps([self.answer(b) for b in body]).encode('utf-8')
+        else:
+            reply = json.dumps(self.answer(body)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+def test_requestsKeepAlive(startServer):
+    server = startServer(ChainInfoHandler, threaded=False)
+    with Requests.Requests(server.url) as client:
+        for i in range(5):
+            assert json.loads(client.chainInfo())['result'] == {'height': 1}
+    assert len(ChainInfoHandler.connections) == 1
+
+def test_requestsPoolConfig():
+    client = Requests.Requests(poolConnections=2, poolMaxSize=4, maxRetries=5, backoffFactor=0.1)
+    adapter = client.session.get_adapter('http://localhost:9085/')
+    assert adapter._pool_maxsize == 4
+    assert adapter._pool_block
+    assert adapter.max_retries.total == 5
+    assert adapter.max_retries.backoff_factor == 0.1
+
+
+class SlowChainInfoHandler(ChainInfoHandler):
+    inFlight = 0
+    maxInFlight = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        with SlowChainInfoHandler.lock:
+            SlowChainInfoHandler.inFlight += 1
+            SlowChainInfoHandler.maxInFlight = max(SlowChainInfoHandler.maxInFlight, SlowChainInfoHandler.inFlight)
+        time.sleep(0.05)
+        with SlowChainInfoHandler.lock:
+            SlowChainInfoHandler.inFlight -= 1
+        ChainInfoHandler.do_POST(self)
+
+def test_asyncRequestsConcurrency(startServer):
+    server = startServer(SlowChainInfoHandler)
+
+    async def run():
+        async with AsyncRequests.AsyncRequests(server.url, concurrency=8) as client:
+            return await asyncio.gather(*[client.chainInfo() for i in range(40)])
+
+    responses = asyncio.run(run())
+    assert [json.loads(r)['result'] for r in responses] == [{'height': 1}] * 40
+    assert 1 < SlowChainInfoHandler.maxInFlight <= 8
+    # an instance can be used from one event loop after another
+    client = AsyncRequests.AsyncRequests(server.url, concurrency=2)
+    for i in range(2):
+        assert json.loads(asyncio.run(client.chainInfo()))['result'] == {'height': 1}
+    asyncio.run(client.close())
+    # the aiohttp session can only be closed by "async with"
+    with pytest.raises(Exception, match='async with'):
+        with AsyncRequests.AsyncRequests(server.url):
+            pass
+
+class GatewayErrorHandler(ChainInfoHandler):
+    attempts = {}
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        method = 'batch' if isinstance(body, list) else body['method']
+        GatewayErrorHandler.attempts[method] = GatewayErrorHandler.attempts.get(method, 0) + 1
+        self.send_response(504)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+def test_gatewayRetries(startServer):
+    server = startServer(GatewayErrorHandler)
+    url = server.url
+    calls = [('getMempool', ()), ('transferPolys', ({'recipient': 'key', 'amount': 1, 'fee': 0},)), ('generateKeyfile', ({'password': 'password'},))]
+
+    async def run():
+        async with AsyncRequests.AsyncRequests(url, maxRetries=2, backoffFactor=0) as client:
+            for name, args in calls:
+                with pytest.raises(Exception):
+                    await getattr(client, name)(*args)
+
+    # read-only requests are retried on gateway errors, requests changing the node state are sent once
+    with Requests.Requests(url, maxRetries=2, backoffFactor=0) as client:
+        for name, args in calls:
+            with pytest.raises(Exception):
+                getattr(client, name)(*args)
+        with pytest.raises(Exception):
+            list(client.streamMempool())
+    assert GatewayErrorHandler.attempts == {'mempool': 6, 'transferPolys': 1, 'generateKeyfile': 1}
+    GatewayErrorHandler.attempts = {}
+    asyncio.run(run())
+    assert GatewayErrorHandler.attempts == {'mempool': 3, 'transferPolys': 1, 'generateKeyfile': 1}
+
+    # the concurrency slot is free while a request waits to be retried
+    sleep = asyncio.sleep
+    slotHeld = []
+    async def backoff(delay):
+        slotHeld.append(client.getSemaphore().locked())
+        await sleep(0)
+
+    client = AsyncRequests.AsyncRequests(url, concurrency=1, maxRetries=2, backoffFactor=0)
+    async def retry():
+        with mock.patch.object(AsyncRequests.asyncio, 'sleep', backoff):
+            with pytest.raises(Exception):
+                await client.getMempool()
+        await client.close()
+
+    asyncio.run(retry())
+    assert slotHeld == [False, False]
+
+def test_batchRequests(startServer):
+    server = startServer(ChainInfoHandler)
+    client = Requests.Requests(server.url, maxBatchSize=4)
+    batch = client.batch()
+    for i in range(10):
+        batch.getTransactionById({'transactionId': 'tx%d' % i})
+    assert batch.chainInfo() == 10
+    batch.getTransactionById({'transactionId': 'unknown'})
+    count = ChainInfoHandler.requestCount
+    responses = batch.execute()
+    # three batches for the 11 nodeView/ calls and one for debug/
+    assert ChainInfoHandler.requestCount - count == 4
+    assert [r['result']['transactionId'] for r in responses[:10]] == ['tx%d' % i for i in range(10)]
+    assert responses[10]['result'] == {'height': 1}
+    assert responses[11]['error']['message'] == 'Unable to find transaction'
+    assert len(set(r['id'] for r in responses)) == 12
+    assert len(batch) == 0
+    for unsupported, message in ((batch.close, 'holds no connections'), (batch.batch, 'can not be nested'), (batch.__enter__, 'with execute')):
+        with pytest.raises(Exception, match=message):
+            unsupported()
+    client.close()
+    # responses stay raw json-rpc objects in decoded mode
+    with Requests.Requests(server.url, decode=True) as decodingClient:
+        batch = decodingClient.batch()
+        batch.getTransactionById({'transactionId': 'tx0'})
+        assert batch.execute()[0]['result']['transactionId'] == 'tx0'
+
+    async def run():
+        async with AsyncRequests.AsyncRequests(server.url, maxBatchSize=2) as asyncClient:
+            asyncBatch = asyncClient.batch()
+            for i in range(5):
+                asyncBatch.getBlockById({'blockId': 'block%d' % i})
+            return await asyncBatch.execute()
+
+    assert [r['result']['blockId'] for r in asyncio.run(run())] == ['block%d' % i for i in range(5)]
+
+
+class PollingHandler(ChainInfoHandler):
+    # pending transactions are confirmed after being seen in the mempool three times
+    mempoolHits = {}
+
+    @staticmethod
+    def answer(body):
+        txId = body['params']['transactionId']
+        found = False
+        if body['method'] == 'transactionById':
+            found = txId.startswith('confirmed') or PollingHandler.mempoolHits.get(txId, 0) >= 3
+        elif txId.startswith('pending'):
+            PollingHandler.mempoolHits[txId] = PollingHandler.mempoolHits.get(txId, 0) + 1
+            found = True
+        if found:
+            return {'jsonrpc': '2.0', 'id': body['id'], 'result': {'txId': txId}}
+        return {'jsonrpc': '2.0', 'id': body['id'], 'error': {'code': 500, 'message': 'Unable to find transaction'}}
+
+    def do_POST(self):
+        ChainInfoHandler.requestCount += 1
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        reply = json.dumps([PollingHandler.answer(b) for b in body]).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+def test_pollingTxWatcher(startServer):
+    server = startServer(PollingHandler)
+
+    async def run():
+        async with AsyncRequests.AsyncRequests(server.url) as client:
+            single = json.loads(await polling.pollingTx(client, 'confirmed', {'interval': 0.01}).combined())
+            watcher = polling.TxWatcher(client, interval=0.01)
+            txIds = ['confirmed%d' % i for i in range(300)] + ['pending%d' % i for i in range(300)] + ['dropped']
+            count = ChainInfoHandler.requestCount
+            results = await asyncio.gather(*[watcher.watch(txId, timeout=5, maxFailedQueries=2) for txId in txIds], return_exceptions=True)
+            await watcher.close()
+            return single, results, ChainInfoHandler.requestCount - count
+
+    single, results, requestCount = asyncio.run(run())
+    assert single['result'] == {'txId': 'confirmed'}
+    assert [r['result']['txId'] for r in results[:600]] == ['confirmed%d' % i for i in range(300)] + ['pending%d' % i for i in range(300)]
+    assert str(results[600]) == 'Unable to find the transaction in the mempool'
+    # four ticks of at most two batches each, every batch split into 100 lookups
+    assert requestCount <= 4 * 2 * 6
+
+def test_pollingTimeout(startServer):
+    server = startServer(PollingHandler)
+
+    async def run():
+        with Requests.Requests(server.url) as client:
+            try:
+                await polling.pollingTx(client, 'pending-forever', {'timeout': 0.2, 'interval': 0.05}).combined()
+            except Exception as e:
+                return str(e)
+
+    PollingHandler.mempoolHits['pending-forever'] = -10**6
+    assert asyncio.run(run()) == 'Request timed out, transaction was not included in a block before expiration'
+
+
+def test_derivedKeyCache(tmp_path):
+    KeyManager.derivedKeyCache.clear()
+    with mock.patch.object(KeyManager, 'scrypt', wraps=KeyManager.scrypt) as kdf:
+        key = KeyManager.KeyManager('password')
+        assert kdf.call_count == 1
+        keyPath = key.exportToFile(str(tmp_path))
+        reopened = KeyManager.KeyManager('password', {'keyPath': keyPath})
+        assert kdf.call_count == 1
+        assert reopened.pk == key.pk
+
+    cache = KeyManager.DerivedKeyCache(maxSize=2)
+    params = {'dkLen': 32, 'n': 2, 'r': 8, 'p': 1}
+    for salt in [b'a', b'b', b'c']:
+        cache.put(cache.cacheKey('password', salt, params), b'\x01' * 32)
+    assert len(cache) == 2
+    assert cache.get(cache.cacheKey('password', b'a', params)) is None
+    assert cache.get(cache.cacheKey('password', b'c', params)) == b'\x01' * 32
+    assert cache.get(cache.cacheKey('other', b'c', params)) is None
+    stored = cache.entries[cache.cacheKey('password', b'b', params)]
+    cache.evict('password', b'b', params)
+    assert stored == bytearray(32)
+    cache.clear()
+    assert len(cache) == 0
+
+def test_cipherBackends():
+    native = CrypTools.getCipherBackend('native')
+    fallback = CrypTools.getCipherBackend('pyaes')
+    assert CrypTools.getCipherBackend() is native
+    key = bytes(range(32))
+    for iv in [0, 1, 2**64 - 1, 2**128 - 2]:
+        for plaintext in [b'', b'x' * 32, bytes(range(256)) * 5]:
+            ciphertext = native.encrypt(plaintext, key, iv)
+            assert ciphertext == fallback.encrypt(plaintext, key, iv)
+            assert native.decrypt(ciphertext, key, iv) == plaintext
+    assert CrypTools.aesDecipher(CrypTools.aesCipher('aes-256-ctr', 'test', key, 7), key, 7) == 'test'
+    CrypTools.setCipherBackend('pyaes')
+    try:
+        assert KeyManager.encrypt('test',b'1111111111111111',bytes(b'iv'),'aes-256-ctr') == b'\x03~r\xa5'
+    finally:
+        CrypTools.setCipherBackend('native')
+
+def test_generateMany(tmp_path):
+    constants = dict(KeyManager.defaultOptions, scrypt={'dkLen': 32, 'n': 2**4, 'r': 8, 'p': 1})
+    keyStorages = list(KeyManager.KeyManager.generateMany(5, 'password', workers=2, constants=constants))
+    assert len(set(k['publicKeyId'] for k in keyStorages)) == 5
+    paths = list(KeyManager.KeyManager.generateMany(3, 'password', workers=2, keyPath=str(tmp_path), constants=constants))
+    assert sorted(paths) == sorted(str(p) for p in tmp_path.iterdir())
+    for path in paths:
+        key = KeyManager.KeyManager('password', {'keyPath': path, 'constants': constants})
+        assert path.endswith(key.pk.decode('utf-8') + '.json')
+
+def test_keystoreDirectory(tmp_path):
+    constants = dict(KeyManager.defaultOptions, scrypt={'dkLen': 32, 'n': 2**4, 'r': 8, 'p': 1})
+    paths = list(KeyManager.KeyManager.generateMany(4, 'password', workers=2, keyPath=str(tmp_path), constants=constants))
+    (tmp_path / 'notes.json').write_text('[]')
+    with KeyManager.KeystoreDirectory(str(tmp_path)) as keystore:
+        assert len(keystore) == 4
+        publicKeyId = keystore.list()[0]
+        assert keystore.find(publicKeyId).endswith(publicKeyId + '.json')
+        assert keystore.importKey(publicKeyId, 'password', constants).pk.decode('utf-8') == publicKeyId
+        assert keystore.find('unknown') is None
+
+    with mock.patch.object(KeyManager.KeystoreDirectory, 'indexKeyfile', side_effect=KeyManager.KeystoreDirectory.indexKeyfile, autospec=True) as parse:
+        keystore = KeyManager.KeystoreDirectory(str(tmp_path))
+        assert parse.call_count == 0
+        assert all(keystore.find(k) for k in keystore.list())
+        # reopening only looks at new keyfiles
+        added = keystore.add(KeyManager.generateKeyStorage('password', constants))
+        os.remove(paths[0])
+        parsedBefore = parse.call_count
+        reopened = KeyManager.KeystoreDirectory(str(tmp_path))
+        assert len(reopened) == 4
+        assert parse.call_count - parsedBefore <= 1
+        assert reopened.find(json.loads(open(added).read())['publicKeyId']) == added
+
+    # writing the index does not change the directory, so an unchanged directory is never rescanned
+    past = time.time_ns() - 60 * 10**9
+    os.utime(str(tmp_path), ns=(past, past))
+    KeyManager.KeystoreDirectory(str(tmp_path))
+    with mock.patch.object(KeyManager.os, 'scandir', wraps=os.scandir) as scandir:
+        keystore = KeyManager.KeystoreDirectory(str(tmp_path))
+        for _ in range(3):
+            assert len(keystore.list()) == 4 and len(keystore) == 4
+            assert keystore.find('unknown') is None
+        KeyManager.KeystoreDirectory(str(tmp_path)).list()
+        assert scandir.call_count == 0
+
+def test_sigverifyMany():
+    key = KeyManager.KeyManager('password')
+    messages = ['message %d' % i for i in range(20)]
+    signatures = [key.sign(m.encode('utf-8')) for m in messages]
+    triples = [(key.pk, m, s) for m, s in zip(messages, signatures)]
+    triples[3] = (key.pk, 'another message', signatures[3])
+    triples[5] = (key.pk, messages[5], KeyManager.Base58.encode(signatures[5]))
+    triples[7] = (key.pk, messages[7], 'not base58!')
+    expected = [0 if i in (3, 7) else 1 for i in range(20)]
+    assert KeyManager.KeyManager.verifyMany(triples) == bytearray(expected)
+    with mock.patch.object(CrypTools, 'parallelThreshold', 0):
+        assert CrypTools.sigverifyMany(triples * 3, workers=2, chunkSize=16) == bytearray(expected * 3)
+    assert key.verify(key.pk, 'another message', signatures[3]) is False
+
+
+class TransactionHandler(ChainInfoHandler):
+    @staticmethod
+    def answer(body):
+        if body['method'] == 'broadcastTx':
+            return {'jsonrpc': '2.0', 'id': body['id'], 'result': json.loads(body['params']['tx'])}
+        if body['params']['assetCode'] == 'invalid':
+            return {'jsonrpc': '2.0', 'id': body['id'], 'error': {'code': 500, 'message': 'Invalid asset code'}}
+        return {'jsonrpc': '2.0', 'id': body['id'], 'result': {
+            'rawTx': {'txType': 'AssetTransfer', 'data': body['params']['assetCode'], 'signatures': {}},
+            'messageToSign': KeyManager.Base58.encode(body['params']['assetCode'].encode('utf-8')).decode('utf-8')
+        }}
+
+def test_transactionStream(startServer):
+    server = startServer(TransactionHandler)
+    key = KeyManager.KeyManager('password')
+
+    async def transfers():
+        for i in range(30):
+            yield 'transferAssetsPrototype', {'issuer': 'issuer', 'recipient': 'recipient', 'sender': ['sender'], 'amount': 1, 'fee': 0,
+                                              'assetCode': 'invalid' if i == 7 else 'asset%d' % i}
+        yield 'unknownPrototype', {}
+
+    async def run():
+        async with AsyncRequests.AsyncRequests(server.url) as client:
+            brambl = Brambl({'KeyManager': {'password': 'password', 'instance': key}, 'Requests': {'instance': client}})
+            return [r async for r in brambl.transactionStream(transfers(), prototypeConcurrency=4, broadcastConcurrency=4, maxInFlight=8)]
+
+    results = sorted(asyncio.run(run()), key=lambda r: r['index'])
+    assert len(results) == 31
+    assert results[7]['stage'] == 'prototype' and str(results[7]['error']) == 'Invalid asset code'
+    assert results[30]['stage'] == 'prototype' and str(results[30]['error']) == 'Invalid transaction method'
+    for result in results[:7] + results[8:30]:
+        tx = json.loads(result['response'])['result']
+        assert tx['data'] == result['params']['assetCode']
+        assert key.verify(key.pk, tx['data'], KeyManager.Base58.decode(tx['signatures'][key.proposition])[1:])
+
+def test_pipelineBroadcastErrors():
+    key = KeyManager.KeyManager('password')
+    publicKey = key.pk.decode('utf-8')
+
+    def signer(prototypeTx):
+        # every other transaction is broadcast without signatures and rejected by the node
+        rawTx = prototypeTx['result']['rawTx']
+        return json.dumps(rawTx) if rawTx['data'].endswith('unsigned') else signPrototype(prototypeTx, key)
+
+    transactions = [('transferAssetsPrototype', {'issuer': publicKey, 'recipient': publicKey, 'sender': [publicKey], 'amount': 1, 'fee': 0, 'assetCode': 'a',
+                                                 'data': '%d-%s' % (i, 'unsigned' if i % 2 else 'signed')}) for i in range(6)]
+
+    async def run():
+        async with AsyncRequests.AsyncRequests(stub.url, maxRetries=0) as client:
+            transactionPipeline = pipeline.TransactionPipeline(client, signer, ['transferAssetsPrototype'])
+            return [r async for r in transactionPipeline.run(transactions)]
+
+    with bifrostStub.BifrostStub(blockInterval=None) as stub:
+        results = sorted(asyncio.run(run()), key=lambda r: r['index'])
+    for result in results:
+        if result['index'] % 2:
+            assert result['stage'] == 'broadcast' and str(result['error']) == 'The transaction is not signed' and 'response' not in result
+        else:
+            assert 'error' not in result and 'result' in json.loads(result['response'])
+
+def test_hashFiles(tmp_path):
+    contents = [b'', b'asset payload', os.urandom(300000)]
+    paths = []
+    for i, content in enumerate(contents):
+        path = tmp_path / ('asset%d.bin' % i)
+        path.write_bytes(content)
+        paths.append(str(path))
+    expected = {path: Hash.file(path, 'base58') for path in paths}
+    assert Hash.files(paths, 'base58', workers=3) == expected
+    assert Hash.files(paths, 'base58', useMmap=True, blockSize=4096) == expected
+    assert list(Hash.files(reversed(paths), 'hex')) == list(reversed(paths))
+    reordered = dict(reversed(list(expected.items())))
+    assert Hash.manifest(reordered, 'base58') == Hash.manifest(expected, 'base58')
+    assert Hash.manifest(expected, 'hex') == Hash.string(json.dumps(expected, sort_keys=True, separators=(',', ':')), 'hex')
+
+
+def test_digestCache(tmp_path):
+    paths = []
+    for i in range(5):
+        path = tmp_path / ('asset%d.bin' % i)
+        path.write_bytes(os.urandom(1000 + i))
+        # cache only files whose modification time is settled
+        os.utime(path, ns=(10**18, 10**18 + i))
+        paths.append(str(path))
+    cachePath = str(tmp_path / 'digests.bin')
+    expected = Hash.files(paths, 'base58')
+    cache = Hash.DigestCache(cachePath, checkpoint=2)
+    assert cache.files(paths, 'base58', workers=2) == expected
+    assert (cache.hits, cache.misses, len(cache)) == (0, 5, 5)
+
+    cache = Hash.DigestCache(cachePath)
+    assert len(cache) == 5
+    expectedHex = Hash.file(paths[0], 'hex')
+    with mock.patch.object(Hash, 'fileHash', side_effect=AssertionError('file was read')):
+        assert cache.files(paths, 'base58') == expected
+        assert cache.file(paths[0], 'hex') == expectedHex
+    assert cache.misses == 0
+
+    with open(paths[1], 'ab') as f:
+        f.write(b'changed')
+    os.utime(paths[1], ns=(10**18, 10**18 + 99))
+    os.remove(paths[4])
+    assert cache.file(paths[1], 'base58') == Hash.file(paths[1], 'base58') != expected[paths[1]]
+    cache.prune()
+    assert len(cache) == 4
+    cache.save()
+    assert len(Hash.DigestCache(cachePath)) == 4
+
+    # concurrent checkpoints of the worker threads do not race on the temporary file
+    for i in range(5, 80):
+        path = tmp_path / ('asset%d.bin' % i)
+        path.write_bytes(os.urandom(100))
+        os.utime(path, ns=(10**18, 10**18 + i))
+        paths.append(str(path))
+    del paths[4]
+    cache = Hash.DigestCache(cachePath, checkpoint=1)
+    assert cache.files(paths, 'base58', workers=16) == Hash.files(paths, 'base58')
+    cache.save()
+    assert len(Hash.DigestCache(cachePath)) == len(paths)
+
+
+def test_base58Codec():
+    values = [b'', b'\0', b'\0\0\x01', b'\xff' * 64, bytes(32), b'\0\0' + os.urandom(30), 'ascii text'] + [os.urandom(n) for n in range(1, 70)]
+    for value in values:
+        assert Base58.encode(value) == base58.b58encode(value)
+        encoded = base58.b58encode(value)
+        assert Base58.decode(encoded) == base58.b58decode(encoded)
+        assert Base58.decode(encoded.decode('utf-8') + ' \n') == base58.b58decode(encoded.decode('utf-8') + ' \n')
+    assert Base58.encodeMany(values) == [base58.b58encode(v) for v in values]
+    assert Base58.decodeMany(Base58.encodeMany(values[:6])) == values[:6]
+    assert Base58.decode('111') == b'\0\0\0'
+    for invalid in ['0abc', 'ab l', '1O', ' 2']:
+        with pytest.raises(ValueError) as error:
+            Base58.decode(invalid)
+        with pytest.raises(ValueError) as expected:
+            base58.b58decode(invalid)
+        assert str(error.value) == str(expected.value)
+
+
+class DecodingHandler(ChainInfoHandler):
+    @staticmethod
+    def answer(body):
+        if body['method'] == 'mempool':
+            return {'jsonrpc': '2.0', 'id': body['id'], 'result': [{'txHash': 'tx%d' % i, 'fee': 0, 'from': [], 'to': []} for i in range(3)]}
+        if body['method'] == 'blockById':
+            return {'jsonrpc': '2.0', 'id': body['id'], 'result': {'id': body['params']['blockId'], 'parentId': 'parent', 'txs': [{'txHash': 'tx0', 'blockNumber': 7}]}}
+        if body['method'] == 'balances':
+            return {'jsonrpc': '2.0', 'id': body['id'], 'result': {key: {'Balances': {'Polys': '10', 'Arbits': '20'}, 'Boxes': {}} for key in body['params']['publicKeys']}}
+        return ChainInfoHandler.answer(body)
+
+def test_decodedResponses(startServer):
+    server = startServer(DecodingHandler)
+    url = server.url
+    with Requests.Requests(url, decode=True) as client:
+        info = client.chainInfo()
+        assert isinstance(info, Responses.ChainInfo) and info.height == 1 and info.bestBlockId is None
+        assert info['height'] == 1 and info.toDict() == {'height': 1}
+        mempool = client.getMempool()
+        assert [tx.txHash for tx in mempool] == ['tx0', 'tx1', 'tx2']
+        assert isinstance(mempool[0], Responses.MempoolEntry) and mempool[0].sender == []
+        block = client.getBlockById({'blockId': 'b1'})
+        assert (block.id, block.parentId) == ('b1', 'parent')
+        assert block.transactions[0].blockNumber == 7 and isinstance(block.transactions[0], Responses.Transaction)
+        balances = client.getBalancesByKey({'publicKeys': ['pk1', 'pk2']})
+        assert balances['pk2'].polys == '10' and balances['pk2'].arbits == '20' and balances['pk2'].publicKey == 'pk2'
+        # methods without a result object return the decoded result
+        assert client.getTransactionById({'transactionId': 'tx0'}) == Responses.Transaction({'transactionId': 'tx0'})
+        assert client.calcDelay({'blockId': 'b1', 'numBlocks': 2}) == {'blockId': 'b1', 'numBlocks': 2}
+        with pytest.raises(Responses.BramblRpcError) as error:
+            client.getTransactionById({'transactionId': 'unknown'})
+        assert (error.value.code, str(error.value), error.value.id) == (500, 'Unable to find transaction', '1')
+        with pytest.raises(AttributeError):
+            info.unknownField = 1
+
+    async def run():
+        async with AsyncRequests.AsyncRequests(url, decode=True) as asyncClient:
+            return await asyncClient.chainInfo()
+
+    assert asyncio.run(run()) == Responses.ChainInfo({'height': 1})
+
+
+class LargeMempoolHandler(ChainInfoHandler):
+    @staticmethod
+    def answer(body):
+        if body['method'] == 'mempool':
+            return {'jsonrpc': '2.0', 'id': body['id'], 'result': [{'txHash': 'tx%d' % i, 'data': 'a "quoted" [x]'} for i in range(5000)]}
+        if body['method'] == 'blockById' and body['params']['blockId'] == 'missing':
+            return {'jsonrpc': '2.0', 'id': body['id'], 'error': {'code': -32000, 'message': 'Block not found'}}
+        return DecodingHandler.answer(body)
+
+def test_streamingResponses(startServer):
+    server = startServer(LargeMempoolHandler)
+    url = server.url
+    with Requests.Requests(url) as client:
+        txs = list(client.streamMempool(chunkSize=4096))
+        assert [tx['txHash'] for tx in txs] == ['tx%d' % i for i in range(5000)]
+        assert txs[0]['data'] == 'a "quoted" [x]'
+        assert [tx['txHash'] for tx in client.streamBlockTransactions({'blockId': 'b1'})] == ['tx0']
+        with pytest.raises(Responses.BramblRpcError) as error:
+            list(client.streamBlockTransactions({'blockId': 'missing'}))
+        assert error.value.code == -32000
+        with pytest.raises(Exception):
+            client.batch().streamMempool()
+    with Requests.Requests(url, decode=True) as client:
+        tx = next(iter(client.streamBlockTransactions({'blockId': 'b1'})))
+        assert isinstance(tx, Responses.Transaction) and tx.blockNumber == 7
+
+    async def run():
+        async with AsyncRequests.AsyncRequests(url, decode=True) as asyncClient:
+            return [tx async for tx in asyncClient.streamMempool(chunkSize=1024)]
+
+    txs = asyncio.run(run())
+    assert len(txs) == 5000 and isinstance(txs[-1], Responses.MempoolEntry) and txs[-1].txHash == 'tx4999'
+
+def test_arrayStreamMemory():
+    element = {'txHash': 'x' * 100, 'to': [['a', '1']], 'escaped': '\\"}]'}
+    body = json.dumps({'jsonrpc': '2.0', 'id': '1', 'result': [element] * 10000}).encode('utf-8')
+    stream = Responses.ArrayStream(['result'])
+    count = 0
+    largest = 0
+    for i in range(0, len(body), 1000):
+        count += len(stream.feed(body[i:i + 1000]))
+        largest = max(largest, len(stream.buffer))
+    count += len(stream.close())
+    assert count == 10000
+    # never more than one chunk plus one element is held
+    assert largest < 1000 + len(json.dumps(element))
+
+
+def test_responseCache(startServer):
+    server = startServer(DecodingHandler)
+    url = server.url
+    with Requests.Requests(url, cache=True) as client:
+        count = ChainInfoHandler.requestCount
+        assert client.chainInfo() == client.chainInfo()
+        for i in range(3):
+            client.getBlockById({'blockId': 'b1'})
+            client.getTransactionById({'transactionId': 'tx0'})
+            client.getTransactionById({'transactionId': 'unknown'})
+            client.getMempool()
+        # errors (unconfirmed transactions) and uncached methods always reach the node
+        assert ChainInfoHandler.requestCount - count == 1 + 1 + 1 + 3 + 3
+        stats = client.cache.stats()
+        assert (stats['hits'], stats['misses'], stats['size']) == (5, 6, 3)
+        assert stats['methods']['transactionById'] == {'hits': 2, 'misses': 4}
+        assert 'mempool' not in stats['methods']
+
+    cache = ResponseCache.ResponseCache(maxSize=2, policies={'info': 0.5, 'blockById': None})
+    with Requests.Requests(url, decode=True, cache=cache) as client:
+        count = ChainInfoHandler.requestCount
+        assert client.chainInfo().height == 1
+        assert client.chainInfo().height == 1
+        time.sleep(0.6)
+        assert client.chainInfo().height == 1
+        assert ChainInfoHandler.requestCount - count == 2
+        block = client.getBlockById({'blockId': 'b1'})
+        assert client.getBlockById({'blockId': 'b1'}) == block and block.id == 'b1'
+        client.getBlockById({'blockId': 'b2'})
+        # the least recently used response (chain info) was evicted
+        assert len(cache) == 2 and cache.hits == 2
+    # a shared cache hands every instance text, carrying the id of its own request
+    with Requests.Requests(url, cache=cache) as textClient:
+        body = textClient.getBlockById({'blockId': 'b1'}, ID='7')
+        assert cache.hits == 3 and isinstance(body, str)
+        assert json.loads(body)['id'] == '7' and json.loads(body)['result']['id'] == 'b1'
+        assert json.loads(textClient.getBlockById({'blockId': 'b1'}))['id'] == '1'
+    # the url is part of the key, so the cache can be shared between instances
+    with Requests.Requests(server.url + 'other/', cache=cache) as other:
+        misses = cache.misses
+        other.getBlockById({'blockId': 'b1'})
+        assert cache.misses == misses + 1
+
+    async def run():
+        async with AsyncRequests.AsyncRequests(url, cache=True) as asyncClient:
+            first = await asyncClient.getBlockById({'blockId': 'b1'})
+            assert await asyncClient.getBlockById({'blockId': 'b1'}) == first
+            return asyncClient.cache.stats()
+
+    assert asyncio.run(run())['hits'] == 1
+
+
+def test_requestCoalescing(startServer):
+    server = startServer(SlowChainInfoHandler)
+    url = server.url
+    with Requests.Requests(url, coalesce=True, poolMaxSize=20) as client:
+        barrier = threading.Barrier(20)
+        results = []
+
+        def poll():
+            barrier.wait()
+            results.append(client.getTransactionById({'transactionId': 'tx0'}))
+
+        count = ChainInfoHandler.requestCount
+        threads = [threading.Thread(target=poll) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 20 and len(set(results)) == 1
+        assert ChainInfoHandler.requestCount - count < 5
+        assert client.flights.shared > 15 and len(client.flights) == 0
+
+        # calls that change the node state are never coalesced
+        count = ChainInfoHandler.requestCount
+        threads = [threading.Thread(target=client.broadcastTx, args=({'tx': 'signed'},)) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert ChainInfoHandler.requestCount - count == 5
+
+    async def run():
+        async with AsyncRequests.AsyncRequests(url, coalesce=True) as asyncClient:
+            count = ChainInfoHandler.requestCount
+            polls = [asyncio.ensure_future(asyncClient.getTransactionById({'transactionId': 'tx1'})) for i in range(30)]
+            await asyncio.sleep(0)
+            # cancelling the first caller does not cancel the shared request
+            polls[0].cancel()
+            responses = await asyncio.gather(*polls[1:])
+            assert ChainInfoHandler.requestCount - count == 1
+            assert asyncClient.flights.shared == 29
+            return responses
+
+    assert [json.loads(r)['result'] for r in asyncio.run(run())] == [{'transactionId': 'tx1'}] * 29
+
+def test_singleFlightErrors():
+    flights = singleflight.SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait()
+        raise Exception('node unavailable')
+
+    def call():
+        try:
+            flights.do('key', failing)
+        except Exception as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=call) for i in range(3)]
+    for thread in followers:
+        thread.start()
+    while flights.shared < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert errors == ['node unavailable'] * 4
+    assert (flights.calls, flights.shared, len(flights)) == (1, 3, 0)
+    assert flights.do('key', lambda: 'recovered') == 'recovered'
+
+
+class NodeHandler(ChainInfoHandler):
+    failing = False
+    delay = 0
+    methods = []
+
+    def do_POST(self):
+        if self.failing:
+            self.rfile.read(int(self.headers['Content-Length']))
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.delay:
+            time.sleep(self.delay)
+        ChainInfoHandler.do_POST(self)
+
+    @classmethod
+    def answer(cls, body):
+        cls.methods.append(body['method'])
+        return ChainInfoHandler.answer(body)
+
+def startNodes(startServer, count):
+    # every node gets its own handler class, so the methods each node received are recorded apart
+    servers = [startServer(type('NodeHandler%d' % i, (NodeHandler,), {'methods': []})) for i in range(count)]
+    return servers, [server.url for server in servers]
+
+def test_multiRequests(startServer):
+    servers, urls = startNodes(startServer, 3)
+    handlers = [server.RequestHandlerClass for server in servers]
+    with MultiRequests.MultiRequests(urls, maxFailures=2, ejectTime=60) as client:
+        for i in range(30):
+            assert json.loads(client.getTransactionById({'transactionId': 'tx%d' % i}))['result'] == {'transactionId': 'tx%d' % i}
+        assert all(handler.methods.count('transactionById') > 0 for handler in handlers)
+
+        # writes and node local requests go to the preferred node
+        client.broadcastTx({'tx': 'signed'})
+        client.listOpenKeyfiles()
+        assert handlers[0].methods.count('broadcastTx') == 1 and handlers[0].methods.count('listOpenKeyfiles') == 1
+        assert 'broadcastTx' not in handlers[1].methods + handlers[2].methods
+
+        # a failing node is ejected and its requests are answered by the others
+        handlers[1].failing = True
+        for i in range(30):
+            assert json.loads(client.chainInfo())['result'] == {'height': 1}
+        stats = client.stats()
+        assert not stats[1]['available'] and stats[1]['errors'] == 2
+        assert client.checkHealth() == [True, False, True]
+        handlers[1].failing = False
+        assert client.checkHealth() == [True, True, True]
+        assert client.stats()[1]['available']
+
+        # the preferred node failing sends writes to the next node
+        handlers[0].failing = True
+        client.broadcastTx({'tx': 'signed'})
+        assert handlers[1].methods.count('broadcastTx') == 1
+        handlers[0].failing = False
+
+        batch = client.batch()
+        for i in range(4):
+            batch.getTransactionById({'transactionId': 'tx%d' % i})
+        assert [r['result']['transactionId'] for r in batch.execute()] == ['tx%d' % i for i in range(4)]
+
+    with MultiRequests.MultiRequests(urls, writeMode='all', strategy='latency') as client:
+        counts = [handler.methods.count('broadcastTx') for handler in handlers]
+        client.broadcastTx({'tx': 'signed'})
+        assert [handler.methods.count('broadcastTx') - count for handler, count in zip(handlers, counts)] == [1, 1, 1]
+
+        # latency weighted selection favours the fast node
+        handlers[1].delay = handlers[2].delay = 0.3
+        client.checkHealth()
+        counts = [handler.methods.count('info') for handler in handlers]
+        for i in range(20):
+            client.chainInfo()
+        received = [handler.methods.count('info') - count for handler, count in zip(handlers, counts)]
+        assert received[0] > received[1] + received[2]
+
+    with pytest.raises(Exception):
+        MultiRequests.MultiRequests(urls, strategy='random')
+
+def test_multiRequestsHealthThread(startServer):
+    servers, urls = startNodes(startServer, 2)
+    client = MultiRequests.MultiRequests(urls, healthInterval=0.05, maxFailures=1)
+    servers[1].RequestHandlerClass.failing = True
+    deadline = time.time() + 5
+    while client.stats()[1]['available'] and time.time() < deadline:
+        time.sleep(0.02)
+    assert not client.stats()[1]['available']
+    servers[1].RequestHandlerClass.failing = False
+    while not client.stats()[1]['available'] and time.time() < deadline:
+        time.sleep(0.02)
+    assert client.stats()[1]['available']
+    client.close()
+    assert client.healthThread is None
+
+
+def test_multiRequestsTimeouts():
+    # a node accepting connections but never answering fails its health checks once healthTimeout expires
+    with socket.socket() as hung:
+        hung.bind(('127.0.0.1', 0))
+        hung.listen(8)
+        client = MultiRequests.MultiRequests(['http://127.0.0.1:%d/' % hung.getsockname()[1]], healthTimeout=0.2, maxFailures=1)
+        start = time.time()
+        assert client.checkHealth() == [False]
+        assert not client.stats()[0]['available'] and time.time() - start < 2
+        client.close()
+
+    # streams abandoned by the caller are no longer outstanding, and are not counted as failures
+    with bifrostStub.BifrostStub(blockInterval=None, mempoolSize=50) as first, bifrostStub.BifrostStub(blockInterval=None, mempoolSize=50) as second:
+        with MultiRequests.MultiRequests([first.url, second.url]) as client:
+            for i in range(3):
+                stream = client.streamMempool()
+                next(stream)
+                stream.close()
+            assert [node['outstanding'] for node in client.stats()] == [0, 0]
+            assert [node['errors'] for node in client.stats()] == [0, 0]
+            assert len(list(client.streamMempool())) == 50
+
+
+def test_requestMetrics(startServer):
+    server = startServer(LargeMempoolHandler)
+    url = server.url
+    with Requests.Requests(url) as client:
+        assert client.metrics is None
+    metrics = Metrics.RpcMetrics(buckets=[0.5, 0.001])
+    with Requests.Requests(url, metrics=metrics) as client:
+        info = client.chainInfo()
+        client.chainInfo()
+        batch = client.batch()
+        batch.chainInfo()
+        batch.getMempool()
+        batch.execute()
+        assert len(list(client.streamMempool())) == 5000
+    with Requests.Requests('http://127.0.0.1:1/', maxRetries=0, metrics=metrics) as client:
+        with pytest.raises(Exception):
+            client.chainInfo()
+    snapshot = metrics.snapshot()
+    # batches are recorded once per route they were split into
+    assert set(snapshot) == {('debug/', 'info'), ('debug/', 'batch'), ('nodeView/', 'batch'), ('nodeView/', 'mempool')}
+    info = snapshot[('debug/', 'info')]
+    assert (info['count'], info['errors']) == (3, 1)
+    assert info['bytesIn'] == 2 * len(json.dumps({'jsonrpc': '2.0', 'id': '1', 'result': {'height': 1}}))
+    assert info['bytesOut'] > 0 and info['latencySum'] > 0
+    assert [bound for bound, count in info['buckets']] == [0.001, 0.5, float('inf')]
+    assert info['buckets'][-1][1] == 3
+    mempool = snapshot[('nodeView/', 'mempool')]
+    assert (mempool['count'], mempool['errors']) == (1, 0) and mempool['bytesIn'] > 5000 * 40
+
+    text = metrics.prometheus()
+    assert '# TYPE brambl_rpc_latency_seconds histogram' in text
+    assert 'brambl_rpc_requests_total{route="debug/",method="info"} 3\n' in text
+    assert 'brambl_rpc_errors_total{route="debug/",method="info"} 1\n' in text
+    assert 'brambl_rpc_latency_seconds_bucket{route="debug/",method="batch",le="+Inf"} 1\n' in text
+    assert 'brambl_rpc_latency_seconds_count{route="nodeView/",method="mempool"} 1\n' in text
+    metrics.record('a"b\\', 'x\ny', 0.1, 1, 2)
+    assert 'route="a\\"b\\\\",method="x\\ny"' in metrics.prometheus()
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+    async def run():
+        async with AsyncRequests.AsyncRequests(url, metrics=True) as asyncClient:
+            await asyncClient.chainInfo()
+            assert len([tx async for tx in asyncClient.streamMempool()]) == 5000
+            return asyncClient.metrics.snapshot()
+
+    snapshot = asyncio.run(run())
+    assert snapshot[('debug/', 'info')]['count'] == 1 and snapshot[('debug/', 'info')]['bytesOut'] > 0
+    assert snapshot[('nodeView/', 'mempool')]['bytesIn'] == mempool['bytesIn']
+
+    with MultiRequests.MultiRequests([url, url], metrics=True) as multi:
+        multi.chainInfo()
+        multi.chainInfo()
+        assert multi.nodes[0].requests.metrics is multi.metrics
+        assert multi.metrics.snapshot()[('debug/', 'info')]['count'] == 2
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert [Tracing.percentile(values, f) for f in (0.5, 0.95, 0.99, 1.0)] == [50, 95, 99, 100]
+    assert [Tracing.percentile(list(range(1, 11)), f) for f in (0, 0.5, 0.95)] == [1, 5, 10]
+    assert Tracing.percentile(values, 0.07) == 7 and Tracing.percentile([3], 0.99) == 3
+
+def test_tracing(tmp_path, startServer):
+    server = startServer(TransactionHandler)
+    url = server.url
+    key = KeyManager.KeyManager('password')
+    params = {'issuer': 'issuer', 'recipient': 'recipient', 'sender': ['sender'], 'amount': 1, 'fee': 0, 'assetCode': 'asset'}
+    assert Tracing.span('disabled') is Tracing.noopSpan and not Tracing.enabled()
+    exporter = Tracing.InMemoryExporter()
+    Tracing.setExporter(exporter)
+    try:
+        with Requests.Requests(url) as client:
+            brambl = Brambl({'KeyManager': {'password': 'password', 'instance': key}, 'Requests': {'instance': client}})
+            asyncio.run(brambl.transaction('transferAssetsPrototype', params))
+            root = [span for span in exporter.spans if span.name == 'brambl.transaction'][0]
+            spans = {span.name: span for span in exporter.trace(root.traceId)}
+            assert set(spans) == {'brambl.transaction', 'brambl.signAndBroadcast', 'brambl.addSigToTx', 'brambl.decodePrototype',
+                                  'keyManager.sign', 'brambl.encodeTx', 'requests.sendRequest'}
+            assert root.parentId is None and root.attributes == {'method': 'transferAssetsPrototype'}
+            assert spans['brambl.signAndBroadcast'].parentId == root.spanId
+            assert spans['keyManager.sign'].parentId == spans['brambl.addSigToTx'].spanId
+            requests = [span for span in exporter.trace(root.traceId) if span.name == 'requests.sendRequest']
+            # the prototype request (run on an executor thread) and the broadcast both belong to the trace
+            assert [(span.attributes['method'], span.parentId) for span in requests] == [
+                ('transferAssetsPrototype', root.spanId), ('broadcastTx', spans['brambl.signAndBroadcast'].spanId)]
+            assert all(span.duration >= 0 and span.error is None for span in spans.values())
+            assert root.duration >= spans['brambl.signAndBroadcast'].duration
+
+            exporter.clear()
+            with pytest.raises(KeyError):
+                asyncio.run(brambl.transaction('transferAssetsPrototype', dict(params, assetCode='invalid')))
+            failed = [span for span in exporter.spans if span.name == 'brambl.transaction'][0]
+            assert failed.error.startswith('KeyError')
+            summary = exporter.summary()
+            assert summary['requests.sendRequest']['count'] == 1 and summary['brambl.transaction']['errors'] == 1
+
+        KeyManager.deriveKey('password', b'salt', {'dkLen': 32, 'n': 2 ** 4, 'r': 8, 'p': 1})
+        KeyManager.deriveKey('password', b'salt', {'dkLen': 32, 'n': 2 ** 4, 'r': 8, 'p': 1})
+        assert [span.attributes['cached'] for span in exporter.spans if span.name == 'keyManager.deriveKey'][-2:] == [False, True]
+
+        path = str(tmp_path / 'spans.jsonl')
+        with Tracing.JsonLinesExporter(path) as fileExporter:
+            Tracing.setExporter(fileExporter)
+
+            async def run():
+                async with AsyncRequests.AsyncRequests(url) as asyncClient:
+                    brambl = Brambl({'KeyManager': {'password': 'password', 'instance': key}, 'Requests': {'instance': asyncClient}})
+                    return [r async for r in brambl.transactionStream([('transferAssetsPrototype', params)] * 3)]
+
+            assert len(asyncio.run(run())) == 3
+        spans = Tracing.load(path)
+        transactions = [span for span in spans if span['name'] == 'pipeline.transaction']
+        assert sorted(span['attributes']['index'] for span in transactions) == [0, 1, 2]
+        for transaction in transactions:
+            names = sorted(span['name'] for span in spans if span['traceId'] == transaction['traceId'])
+            # signing runs on the pipeline's thread pool, in the context of its transaction
+            assert names == ['brambl.decodePrototype', 'brambl.encodeTx', 'keyManager.sign', 'pipeline.transaction',
+                             'requests.sendRequest', 'requests.sendRequest']
+        assert Tracing.summarize(spans)['pipeline.transaction']['count'] == 3
+    finally:
+        Tracing.setExporter(None)
+
+
+def test_bifrostStub():
+    with bifrostStub.BifrostStub(blockInterval=None, verifySignatures=True, seed=7, mempoolSize=5, blocks=3, blockTxs=4, txBoxes=3, dataSize=100) as stub:
+        with Requests.Requests(stub.url, maxRetries=0) as client:
+            info = json.loads(client.chainInfo())['result']
+            assert (info['height'], info['txCount']) == (3, 12)
+            block = json.loads(client.getBlockById({'blockId': info['bestBlockId']}))['result']
+            assert len(block['txs']) == 4 and len(block['txs'][0]['newBoxes']) == 3 and block['txs'][0]['blockNumber'] == 3
+            mempool = json.loads(client.getMempool())['result']
+            assert len(mempool) == 5 and len(mempool[0]['data']) == 100
+            publicKey = json.loads(client.listOpenKeyfiles())['result'][0]
+            # every route method gets a result
+            calls = [
+                (client.getBalancesByKey, {'publicKeys': [publicKey]}),
+                (client.generateKeyfile, {'password': 'password'}),
+                (client.lockKeyfile, {'publicKey': publicKey, 'password': 'password'}),
+                (client.unlockKeyfile, {'publicKey': publicKey, 'password': 'password'}),
+                (client.signTransaction, {'publicKey': publicKey, 'signingKeys': [publicKey], 'tx': mempool[0]}),
+                (client.transferPolys, {'recipient': publicKey, 'amount': 1, 'fee': 0}),
+                (client.transferArbits, {'recipient': publicKey, 'amount': 1, 'fee': 0}),
+                (client.createAssets, {'issuer': publicKey, 'assetCode': 'a', 'recipient': publicKey, 'amount': 1, 'fee': 0}),
+                (client.createAssetsPrototype, {'issuer': publicKey, 'assetCode': 'a', 'recipient': publicKey, 'amount': 1, 'fee': 0}),
+                (client.transferAssets, {'issuer': publicKey, 'assetCode': 'a', 'recipient': publicKey, 'amount': 1, 'fee': 0}),
+                (client.transferAssetsPrototype, {'issuer': publicKey, 'assetCode': 'a', 'recipient': publicKey, 'sender': [publicKey], 'amount': 1, 'fee': 0}),
+                (client.transferTargetAssets, {'recipient': publicKey, 'assetId': 'box', 'amount': 1, 'fee': 0}),
+                (client.transferTargetAssetsPrototype, {'recipient': publicKey, 'sender': [publicKey], 'assetId': 'box', 'amount': 1, 'fee': 0}),
+                (client.getTransactionById, {'transactionId': block['txs'][0]['txHash']}),
+                (client.getTransactionFromMempool, {'transactionId': mempool[0]['txHash']}),
+                (client.calcDelay, {'blockId': info['bestBlockId'], 'numBlocks': 2})
+            ]
+            for method, params in calls:
+                assert 'result' in json.loads(method(params)), method.__name__
+            assert 'result' in json.loads(client.myBlocks()) and 'result' in json.loads(client.blockGenerators())
+            assert json.loads(client.sendRequest({'route': 'debug/', 'method': 'mempool', 'id': '1'}, {}))['error']['code'] == -32601
+            assert json.loads(client.getTransactionById({'transactionId': 'unknown'}))['error']['code'] == 500
+
+            key = KeyManager.KeyManager('password')
+            brambl = Brambl({'KeyManager': {'password': 'password', 'instance': key}, 'Requests': {'instance': client}})
+            params = {'issuer': publicKey, 'assetCode': 'a', 'recipient': publicKey, 'sender': [key.pk.decode('utf-8')], 'amount': 1, 'fee': 0}
+            txHash = json.loads(asyncio.run(brambl.transaction('transferAssetsPrototype', params)))['result']['txHash']
+            assert stub.chain.forge() and json.loads(client.getTransactionById({'transactionId': txHash}))['result']['blockNumber'] == 4
+            # the signatures of broadcast transactions are checked against their prototype
+            prototype = json.loads(client.transferAssetsPrototype(params))['result']
+            forged = dict(prototype['rawTx'], signatures={key.proposition: KeyManager.Base58.encode(KeyManager.propositionPrefix + bytes(64)).decode('utf-8')})
+            assert json.loads(client.broadcastTx({'tx': json.dumps(forged)}))['error']['message'].startswith('Invalid signature')
+
+            batch = client.batch()
+            batch.chainInfo()
+            batch.getBlockById({'blockId': 'unknown'})
+            first, second = batch.execute()
+            assert first['result']['height'] == 4 and second['error']['message'] == 'Unable to find block'
+            assert stub.stats()['requests']['info'] == 2
+
+    with bifrostStub.BifrostStub(latency=0.05, errorRate=1, apiKey='secret') as stub:
+        with Requests.Requests(stub.url, apiKey='secret') as client:
+            start = time.perf_counter()
+            assert json.loads(client.chainInfo())['error']['message'] == 'Injected error'
+            assert time.perf_counter() - start >= 0.05
+            assert stub.stats()['errors'] == {'info': 1}
+        with Requests.Requests(stub.url, apiKey='wrong', maxRetries=0) as client:
+            with pytest.raises(Exception):
+                client.chainInfo()
+    with bifrostStub.BifrostStub(httpErrorRate=1) as stub:
+        with Requests.Requests(stub.url, maxRetries=0) as client:
+            with pytest.raises(Exception):
+                client.chainInfo()
+
+
+def test_loadgen(tmp_path, capsys):
+    assert loadgen.parseMix('balances=2, mempool') == {'balances': 2.0, 'mempool': 1.0}
+    for mix in ('unknown=1', 'balances=x', 'balances=0'):
+        with pytest.raises(Exception):
+            loadgen.parseMix(mix)
+    # closed loop, with injected errors counted per operation
+    with bifrostStub.BifrostStub(blockInterval=None, errorRate=0.2, seed=3) as stub:
+        report = asyncio.run(loadgen.run(stub.url, 0.5, concurrency=4, seed=1))
+    assert set(report['methods']) == set(loadgen.defaultMix)
+    total = report['total']
+    assert total['requests'] == sum(summary['requests'] for summary in report['methods'].values()) > 0
+    assert 0 < total['errors'] < total['requests'] and 'BramblRpcError' in list(total['messages'])[0]
+    assert total['p50'] <= total['p95'] <= total['p99'] <= total['max']
+    # open loop starts rate * duration requests, whatever the response times
+    path = str(tmp_path / 'report.json')
+    signingThreads = set()
+    def sign(*args):
+        signingThreads.add(threading.get_ident())
+        return signPrototype(*args)
+    with mock.patch.object(loadgen, 'signPrototype', side_effect=sign):
+        assert loadgen.main(['--stub', '--rate', '40', '--duration', '0.5', '--mix', 'blockById=1,transaction=1', '--json', path]) == 0
+    # transactions are signed off the event loop
+    assert signingThreads and threading.get_ident() not in signingThreads
+    assert 'blockById' in capsys.readouterr().out
+    with open(path) as file:
+        report = json.load(file)
+    assert report['total']['requests'] == 20 and report['total']['errors'] == 0
+    assert set(report['methods']) == {'blockById', 'transaction'}